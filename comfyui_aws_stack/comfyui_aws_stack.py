@@ -10,8 +10,15 @@ from comfyui_aws_stack.construct.asg_construct import AsgConstruct
 from comfyui_aws_stack.construct.ecs_construct import EcsConstruct
 from comfyui_aws_stack.construct.admin_construct import AdminConstruct
 from comfyui_aws_stack.construct.auth_construct import AuthConstruct
+from comfyui_aws_stack.construct.cdn_construct import CdnConstruct
+from comfyui_aws_stack.construct.dashboard_construct import DashboardConstruct
+from comfyui_aws_stack.construct.golden_ami_construct import GoldenAmiConstruct
+from comfyui_aws_stack.construct.worker_scaling_construct import WorkerScalingConstruct
+from comfyui_aws_stack.construct.model_store_construct import ModelStoreConstruct
+from comfyui_aws_stack.construct.output_store_construct import OutputStoreConstruct
 from aws_cdk import (
     aws_chatbot as chatbot,
+    aws_cloudwatch_actions as cloudwatch_actions,
     aws_iam as iam
 )
 
@@ -30,14 +37,46 @@ class ComfyUIStack(Stack):
                  # Spot
                  use_spot: bool = True,
                  spot_price: str = "0.752",
+                 spot_interruption_handling: bool = False,
+                 spot_allocation_strategy: str = "lowest-price",
+                 spot_instance_pools: int = 1,
+                 spot_fallback_failures: int = 0,
+                 spot_fallback_window_minutes: int = 10,
+                 spot_fallback_minutes: int = 60,
+                 spot_fallback_instance_types: List[str] = None,
                  # Instance Types
                  instance_types: List[str] = ["g4dn.xlarge", "g5.xlarge", "g6.xlarge"],
+                 # Models
+                 model_cache: bool = False,
+                 download_models: bool = False,
+                 model_store: str = "ebs",
+                 model_index: bool = False,
+                 model_profiler: bool = False,
+                 model_bucket_name: str = None,
+                 # Custom Nodes
+                 custom_node_wheelhouse: bool = False,
+                 # Outputs
+                 output_offload: bool = False,
+                 output_retention_hours: float = 168,
+                 output_local_max_gb: float = 0,
+                 output_expiration_days: int = None,
                  # Auto Scaling
                  auto_scale_down: bool = True,
+                 idle_scale_down_minutes: int = 15,
+                 # Workers
+                 max_workers: int = 1,
+                 worker_queue_target: int = 2,
                  schedule_auto_scaling: bool = False,
                  timezone: str = "UTC",
                  schedule_scale_up: str = "0 9 * * 1-5",
                  schedule_scale_down: str = "0 18 * * *",
+                 # Warm Pool
+                 warm_pool: bool = False,
+                 warm_pool_state: str = "Stopped",
+                 # Lazy Image Loading
+                 soci_index: bool = False,
+                 # Golden AMI
+                 golden_ami: bool = False,
                  # Sign up
                  self_sign_up_enabled: bool = False,
                  allowed_sign_up_email_domains: List[str] = None,
@@ -54,10 +93,23 @@ class ComfyUIStack(Stack):
                  host_name: str = None,
                  domain_name: str = None,
                  hosted_zone_id: str = None,
+                 # CloudFront
+                 cdn: bool = False,
                  # Slack
                  slack_workspace_id: str = None,
                  slack_channel_id: str = None,
+                 # Admin Lambda
+                 admin_lambda_arm64: bool = False,
+                 admin_lambda_provisioned_concurrency: int = 0,
+                 # Scale-up monitoring
+                 scale_up_alarm_seconds: int = 600,
+                 # GPU Monitoring
+                 gpu_metrics: bool = False,
+                 # Prompt Buffer
+                 prompt_buffer: bool = False,
                  **kwargs) -> None:
+        # The certificate of the distribution is in us-east-1
+        kwargs.setdefault("cross_region_references", cdn)
         super().__init__(scope, construct_id, **kwargs)
 
         # Setting
@@ -67,6 +119,9 @@ class ComfyUIStack(Stack):
             unique_input.encode('utf-8')).hexdigest()[:10]
         suffix = unique_hash.lower()
 
+        # Launch template parameter holding the newest golden AMI
+        golden_ami_parameter_name = f"/ComfyUI/{suffix}/GoldenAmi" if golden_ami else None
+
         # Check host
         is_sagemaker_studio = "SAGEMAKER_APP_TYPE_LOWERCASE" in os.environ
 
@@ -91,8 +146,19 @@ class ComfyUIStack(Stack):
             host_name=host_name,
             domain_name=domain_name,
             hosted_zone_id=hosted_zone_id,
+            cdn=cdn,
         )
 
+        # CDN
+
+        cdn_construct = CdnConstruct(
+            self, "CdnConstruct",
+            host_name=host_name,
+            domain_name=domain_name,
+            hosted_zone=alb_construct.hosted_zone,
+            origin_dns_name=alb_construct.origin_dns_name,
+        ) if cdn else None
+
         # Auth
 
         auth_construct = AuthConstruct(
@@ -107,6 +173,23 @@ class ComfyUIStack(Stack):
             allowed_sign_up_email_domains=allowed_sign_up_email_domains,
         )
 
+        # Model Store
+
+        model_store_construct = ModelStoreConstruct(
+            self, "ModelStoreConstruct",
+            model_bucket_name=model_bucket_name,
+        ) if model_store == "s3" else None
+
+        # Output Store
+
+        output_store_construct = OutputStoreConstruct(
+            self, "OutputStoreConstruct",
+            app_origin="https://" + (f"{host_name}.{domain_name}" if host_name and domain_name
+                                     else alb_construct.alb.load_balancer_dns_name),
+            output_expiration_days=output_expiration_days,
+        ) if output_offload else None
+        output_bucket = output_store_construct.output_bucket if output_store_construct else None
+
         # ASG
 
         asg_construct = AsgConstruct(
@@ -116,12 +199,27 @@ class ComfyUIStack(Stack):
             spot_price=spot_price,
             instance_types=instance_types,
             auto_scale_down=auto_scale_down,
+            idle_scale_down_minutes=idle_scale_down_minutes,
             schedule_auto_scaling=schedule_auto_scaling,
             timezone=timezone,
             schedule_scale_down=schedule_scale_down,
             schedule_scale_up=schedule_scale_up,
             slack_workspace_id=slack_workspace_id,
             slack_channel_id=slack_channel_id,
+            warm_pool=warm_pool,
+            warm_pool_state=warm_pool_state,
+            max_workers=max_workers,
+            spot_interruption_handling=spot_interruption_handling,
+            spot_allocation_strategy=spot_allocation_strategy,
+            spot_instance_pools=spot_instance_pools,
+            spot_fallback_failures=spot_fallback_failures,
+            spot_fallback_window_minutes=spot_fallback_window_minutes,
+            spot_fallback_minutes=spot_fallback_minutes,
+            spot_fallback_instance_types=spot_fallback_instance_types,
+            model_cache=model_cache,
+            model_bucket=model_store_construct.model_bucket if model_store_construct else None,
+            soci_snapshotter=soci_index,
+            golden_ami_parameter_name=golden_ami_parameter_name,
         )
 
         # ECS
@@ -136,11 +234,71 @@ class ComfyUIStack(Stack):
             region=region,
             user_pool=auth_construct.user_pool,
             user_pool_client=auth_construct.user_pool_client,
-            instance_types=instance_types,
+            # The task must also fit the Spot fallback instance types
+            instance_types=instance_types + (spot_fallback_instance_types or []),
             slack_workspace_id=slack_workspace_id,
             slack_channel_id=slack_channel_id,
+            gpu_metrics=gpu_metrics,
+            max_workers=max_workers,
+            model_cache=model_cache,
+            download_models=download_models,
+            model_store=model_store,
+            model_index=model_index,
+            model_profiler=model_profiler,
+            custom_node_wheelhouse=custom_node_wheelhouse,
+            output_bucket=output_bucket,
+            output_retention_hours=output_retention_hours,
+            output_local_max_gb=output_local_max_gb,
+            soci_index=soci_index,
         )
 
+        if max_workers > 1:
+            WorkerScalingConstruct(
+                self, "WorkerScalingConstruct",
+                service=ecs_construct.service,
+                auto_scaling_group=asg_construct.auto_scaling_group,
+                max_workers=max_workers,
+                worker_queue_target=worker_queue_target,
+                auto_scale_down=auto_scale_down,
+                idle_scale_down_minutes=idle_scale_down_minutes,
+                schedule_auto_scaling=schedule_auto_scaling,
+                timezone=timezone,
+                schedule_scale_down=schedule_scale_down,
+                schedule_scale_up=schedule_scale_up,
+            )
+
+        if soci_index:
+            # The SOCI snapshotter fetches the layers from ECR itself
+            asg_construct.grant_image_pull(ecs_construct.docker_image_asset)
+
+        # Golden AMI
+
+        if golden_ami:
+            golden_ami_construct = GoldenAmiConstruct(
+                self, "GoldenAmiConstruct",
+                vpc=vpc_construct.vpc,
+                docker_image_asset=ecs_construct.docker_image_asset,
+                ami_parameter_name=golden_ami_parameter_name,
+                region=region,
+            )
+            # Instances are launched once the first AMI is built
+            asg_construct.auto_scaling_group.node.add_dependency(
+                golden_ami_construct.ami_parameter)
+
+        if asg_construct.warm_pool:
+            asg_construct.add_warm_pool_image(
+                ecs_construct.docker_image_asset, ecs_construct.image_uri)
+
+        # Dashboard
+
+        if gpu_metrics:
+            DashboardConstruct(
+                self, "DashboardConstruct",
+                auto_scaling_group=asg_construct.auto_scaling_group,
+                cluster=ecs_construct.cluster,
+                service=ecs_construct.service,
+            )
+
         # Slack
 
         if slack_workspace_id and slack_channel_id:
@@ -170,25 +328,42 @@ class ComfyUIStack(Stack):
             vpc=vpc_construct.vpc,
             cluster=ecs_construct.cluster,
             service=ecs_construct.service,
+            service_security_group=ecs_construct.service_security_group,
             auto_scaling_group=asg_construct.auto_scaling_group,
             user_pool_logout_url=auth_construct.user_pool_logout_url,
+            lambda_arm64=admin_lambda_arm64,
+            lambda_provisioned_concurrency=admin_lambda_provisioned_concurrency,
+            scale_up_alarm_seconds=scale_up_alarm_seconds,
+            max_workers=max_workers,
+            prompt_buffer=prompt_buffer,
+            spot_interruption_handling=spot_interruption_handling,
+            output_bucket=output_bucket,
+            model_load_log_group=ecs_construct.log_group if model_profiler else None,
         )
 
+        if asg_construct.asg_events_topic:
+            admin_construct.scale_up_duration_alarm.add_alarm_action(
+                cloudwatch_actions.SnsAction(asg_construct.asg_events_topic)
+            )
+
         # Associate resources to ALB
 
         alb_construct.associate_resources(
             ecs_target_group=ecs_construct.ecs_target_group,
             lambda_admin_target_group=admin_construct.lambda_admin_target_group,
+            lambda_status_target_group=admin_construct.lambda_status_target_group,
             lambda_restart_docker_target_group=admin_construct.lambda_restart_docker_target_group,
+            lambda_models_target_group=admin_construct.lambda_models_target_group,
             lambda_shutdown_target_group=admin_construct.lambda_shutdown_target_group,
             lambda_scaleup_target_group=admin_construct.lambda_scaleup_target_group,
             lambda_signout_target_group=admin_construct.lambda_signout_target_group,
             user_pool=auth_construct.user_pool,
             user_pool_client=auth_construct.user_pool_client,
             user_pool_custom_domain=auth_construct.user_pool_custom_domain,
+            lambda_view_target_group=admin_construct.lambda_view_target_group,
         )
 
-        # Add env variables to lambda
+        # Share the admin listener rule with the admin lambda
 
         admin_construct.add_environments(
             lambda_admin_rule=alb_construct.lambda_admin_rule,
@@ -201,3 +376,12 @@ class ComfyUIStack(Stack):
                   value=auth_construct.user_pool.user_pool_id)
         CfnOutput(self, "CognitoDomainName",
                   value=auth_construct.user_pool_custom_domain.domain_name)
+        if model_store_construct:
+            CfnOutput(self, "ModelBucketName",
+                      value=model_store_construct.model_bucket.bucket_name)
+        if output_store_construct:
+            CfnOutput(self, "OutputBucketName",
+                      value=output_bucket.bucket_name)
+        if cdn_construct:
+            CfnOutput(self, "DistributionDomainName",
+                      value=cdn_construct.distribution.distribution_domain_name)
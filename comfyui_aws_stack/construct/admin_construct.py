@@ -7,21 +7,37 @@ from aws_cdk import (
     aws_elasticloadbalancingv2_targets as targets,
     aws_events as events,
     aws_events_targets as event_targets,
+    aws_cloudwatch as cloudwatch,
+    aws_dynamodb as dynamodb,
+    aws_ssm as ssm,
+    aws_sqs as sqs,
+    aws_s3 as s3,
+    aws_logs as logs,
     Duration,
+    RemovalPolicy,
+    Stack,
     aws_lambda as lambda_,
 )
 from constructs import Construct
+from cdk_nag import NagSuppressions
 
 
 class AdminConstruct(Construct):
-    restart_docker_lambda: lambda_.Function
-    scalein_listener_lambda: lambda_.Function
-    scaleup_listener_lambda: lambda_.Function
+    cluster_state_table: dynamodb.Table
+    router_lambda: lambda_.Function
+    listener_rule_arn_parameter_name: str
+    prompt_queue: sqs.Queue
+    prompt_replay_lambda: lambda_.Function
+    spot_drain_lambda: lambda_.Function
+    scale_up_duration_alarm: cloudwatch.Alarm
     lambda_admin_target_group: elbv2.ApplicationTargetGroup
+    lambda_status_target_group: elbv2.ApplicationTargetGroup
     lambda_restart_docker_target_group: elbv2.ApplicationTargetGroup
+    lambda_models_target_group: elbv2.ApplicationTargetGroup
     lambda_shutdown_target_group: elbv2.ApplicationTargetGroup
     lambda_scaleup_target_group: elbv2.ApplicationTargetGroup
     lambda_signout_target_group: elbv2.ApplicationTargetGroup
+    lambda_view_target_group: elbv2.ApplicationTargetGroup
 
     def __init__(
             self,
@@ -30,8 +46,17 @@ class AdminConstruct(Construct):
             vpc: ec2.Vpc,
             cluster: ecs.Cluster,
             service: ecs.IService,
+            service_security_group: ec2.SecurityGroup,
             auto_scaling_group: autoscaling.AutoScalingGroup,
             user_pool_logout_url: str,
+            lambda_arm64: bool = False,
+            lambda_provisioned_concurrency: int = 0,
+            scale_up_alarm_seconds: int = 600,
+            max_workers: int = 1,
+            prompt_buffer: bool = False,
+            spot_interruption_handling: bool = False,
+            output_bucket: s3.IBucket = None,
+            model_load_log_group: logs.ILogGroup = None,
             **kwargs) -> None:
         super().__init__(scope, construct_id, **kwargs)
 
@@ -48,128 +73,220 @@ class AdminConstruct(Construct):
         lambda_role.add_to_policy(iam.PolicyStatement(
             actions=["ecs:DescribeServices",
                      "ecs:ListTasks",
+                     "ecs:DescribeTasks",
+                     "ecs:ListContainerInstances",
+                     "ecs:UpdateContainerInstancesState",
                      "elasticloadbalancing:ModifyListener",
                      "elasticloadbalancing:ModifyRule",
                      "elasticloadbalancing:DescribeRules",
                      "elasticloadbalancing:DescribeListeners",
                      "ecs:DescribeServices",
                      "ecs:UpdateService",
-                     "ssm:SendCommand"],
+                     "ssm:SendCommand",
+                     "application-autoscaling:DescribeScalableTargets",
+                     "application-autoscaling:RegisterScalableTarget"],
             resources=["*"]
         ))
 
-        admin_lambda = lambda_.Function(
+        # Cluster state cache shared by all admin handlers. It is refreshed by
+        # the ASG / ECS event listeners below and falls back to the describe
+        # APIs once older than CLUSTER_STATE_TTL_SECONDS.
+        cluster_state_table = dynamodb.Table(
             scope,
-            "AdminFunction",
-            handler="admin.handler",
-            code=lambda_.Code.from_asset(
-                "./comfyui_aws_stack/lambda/admin_lambda"),
-            role=lambda_role,
-            runtime=lambda_.Runtime.PYTHON_3_12,
-            timeout=Duration.seconds(amount=60),
-            environment={
-                "ASG_NAME": auto_scaling_group.auto_scaling_group_name,
-                "ECS_CLUSTER_NAME": cluster.cluster_name,
-                "ECS_SERVICE_NAME": service.service_name
-            }
+            "ClusterStateTable",
+            partition_key=dynamodb.Attribute(
+                name="id", type=dynamodb.AttributeType.STRING),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            removal_policy=RemovalPolicy.DESTROY,
         )
+        cluster_state_table.grant_read_write_data(lambda_role)
 
-        restart_docker_lambda = lambda_.Function(
-            scope,
-            "RestartDockerFunction",
-            handler="restart_docker.handler",
-            code=lambda_.Code.from_asset(
-                "./comfyui_aws_stack/lambda/admin_lambda"),
-            role=lambda_role,
-            runtime=lambda_.Runtime.PYTHON_3_12,
-            timeout=Duration.seconds(amount=60),
-            environment={
-                "ASG_NAME": auto_scaling_group.auto_scaling_group_name,
-                "ECS_CLUSTER_NAME": cluster.cluster_name,
-                "ECS_SERVICE_NAME": service.service_name
-            }
-        )
+        # The admin listener rule forwards to the router, so its ARN is handed
+        # over through SSM instead of an environment variable (which would
+        # create a dependency cycle)
+        listener_rule_arn_parameter_name = f"/{Stack.of(self).stack_name}/admin/listener-rule-arn"
+        lambda_role.add_to_policy(iam.PolicyStatement(
+            actions=["ssm:GetParameter"],
+            resources=[Stack.of(self).format_arn(
+                service="ssm",
+                resource="parameter",
+                resource_name=listener_rule_arn_parameter_name.lstrip("/"),
+            )]
+        ))
+
+        cluster_state_environment = {
+            "ASG_NAME": auto_scaling_group.auto_scaling_group_name,
+            "ECS_CLUSTER_NAME": cluster.cluster_name,
+            "ECS_SERVICE_NAME": service.service_name,
+            "MAX_WORKERS": str(max_workers),
+            "CLUSTER_STATE_TABLE_NAME": cluster_state_table.table_name,
+            "CLUSTER_STATE_TTL_SECONDS": "60",
+        }
+
+        # Prompts submitted while ComfyUI is scaled down, and the queue of an
+        # interrupted Spot instance, are buffered in a FIFO queue and replayed
+        # in order once a task is healthy
+        prompt_queue = None
+        if prompt_buffer or spot_interruption_handling:
+            prompt_queue = sqs.Queue(
+                scope,
+                "PromptQueue",
+                fifo=True,
+                content_based_deduplication=False,
+                retention_period=Duration.days(4),
+                visibility_timeout=Duration.minutes(5),
+                enforce_ssl=True,
+            )
+            prompt_queue.grant_send_messages(lambda_role)
+            prompt_queue.grant_consume_messages(lambda_role)
+            cluster_state_environment["PROMPT_QUEUE_URL"] = prompt_queue.queue_url
+
+        # Offloaded outputs are served on /view with presigned URLs
+        if output_bucket:
+            output_bucket.grant_read(lambda_role)
+            cluster_state_environment["OUTPUT_BUCKET_NAME"] = output_bucket.bucket_name
 
-        shutdown_lambda = lambda_.Function(
+        # The admin page summarizes the model load profiler events
+        if model_load_log_group:
+            lambda_role.add_to_policy(iam.PolicyStatement(
+                actions=["logs:FilterLogEvents"],
+                resources=[model_load_log_group.log_group_arn],
+            ))
+            cluster_state_environment["MODEL_LOAD_LOG_GROUP"] = model_load_log_group.log_group_name
+
+        # A single router function serves every admin path and event listener
+        # so that warm containers (and their boto3 clients) are shared
+        router_lambda = lambda_.Function(
             scope,
-            "ShutdownFunction",
-            handler="shutdown.handler",
+            "AdminRouterFunction",
+            handler="router.handler",
             code=lambda_.Code.from_asset(
                 "./comfyui_aws_stack/lambda/admin_lambda"),
             role=lambda_role,
             runtime=lambda_.Runtime.PYTHON_3_12,
+            architecture=lambda_.Architecture.ARM_64 if lambda_arm64 else lambda_.Architecture.X86_64,
             timeout=Duration.seconds(amount=60),
             environment={
-                "ASG_NAME": auto_scaling_group.auto_scaling_group_name,
+                **cluster_state_environment,
+                "LISTENER_RULE_ARN_PARAMETER": listener_rule_arn_parameter_name,
+                "REDIRECT_URL": user_pool_logout_url
             }
         )
 
-        scaleup_trigger_lambda = lambda_.Function(
-            scope,
-            "ScaleUpTriggerFunction",
-            runtime=lambda_.Runtime.PYTHON_3_12,
-            role=lambda_role,
-            handler="scaleup_trigger.handler",
-            code=lambda_.Code.from_asset(
-                "./comfyui_aws_stack/lambda/admin_lambda"),
-            timeout=Duration.seconds(amount=60),
-            environment={
-                "ASG_NAME": auto_scaling_group.auto_scaling_group_name,
-                "ECS_CLUSTER_NAME": cluster.cluster_name,
-                "ECS_SERVICE_NAME": service.service_name
-            }
-        )
+        # Provisioned concurrency has to be attached to an alias
+        router_target = router_lambda
+        if lambda_provisioned_concurrency > 0:
+            router_target = router_lambda.add_alias(
+                "live",
+                provisioned_concurrent_executions=lambda_provisioned_concurrency
+            )
 
-        scalein_listener_lambda = lambda_.Function(
-            scope,
-            "ScaleinListenerFunction",
-            runtime=lambda_.Runtime.PYTHON_3_12,
-            role=lambda_role,
-            handler="scalein_listener.handler",
-            code=lambda_.Code.from_asset(
-                "./comfyui_aws_stack/lambda/admin_lambda"),
-            timeout=Duration.seconds(amount=60),
-            environment={
-                "ASG_NAME": auto_scaling_group.auto_scaling_group_name,
-            }
-        )
+        # The replay function runs in the VPC to reach the ComfyUI task, the
+        # router stays outside so that the admin page does not depend on it
+        prompt_replay_lambda = None
+        spot_drain_lambda = None
+        if prompt_queue:
+            prompt_replay_security_group = ec2.SecurityGroup(
+                scope,
+                "PromptReplaySecurityGroup",
+                vpc=vpc,
+                description="Security Group for the prompt replay and Spot drain Lambdas",
+                allow_all_outbound=True,
+            )
+            service_security_group.add_ingress_rule(
+                ec2.Peer.security_group_id(
+                    prompt_replay_security_group.security_group_id),
+                ec2.Port.tcp(8181),
+                "Allow buffered prompts to be replayed and saved",
+            )
+            lambda_role.add_managed_policy(
+                iam.ManagedPolicy.from_aws_managed_policy_name(
+                    "service-role/AWSLambdaVPCAccessExecutionRole"))
 
-        scaleup_listener_lambda = lambda_.Function(
-            scope,
-            "ScaleupListenerFunction",
-            runtime=lambda_.Runtime.PYTHON_3_12,
-            role=lambda_role,
-            handler="scaleup_listener.handler",
-            code=lambda_.Code.from_asset(
-                "./comfyui_aws_stack/lambda/admin_lambda"),
-            timeout=Duration.seconds(amount=60),
-            environment={
-                "ASG_NAME": auto_scaling_group.auto_scaling_group_name,
-                "ECS_CLUSTER_NAME": cluster.cluster_name,
-                "ECS_SERVICE_NAME": service.service_name
-            }
-        )
+            prompt_replay_lambda = lambda_.Function(
+                scope,
+                "PromptReplayFunction",
+                handler="prompt_replay.handler",
+                code=lambda_.Code.from_asset(
+                    "./comfyui_aws_stack/lambda/admin_lambda"),
+                role=lambda_role,
+                runtime=lambda_.Runtime.PYTHON_3_12,
+                architecture=lambda_.Architecture.ARM_64 if lambda_arm64 else lambda_.Architecture.X86_64,
+                timeout=Duration.minutes(5),
+                vpc=vpc,
+                vpc_subnets=ec2.SubnetSelection(
+                    subnet_type=ec2.SubnetType.PRIVATE_WITH_EGRESS),
+                security_groups=[prompt_replay_security_group],
+                environment={
+                    **cluster_state_environment,
+                    "LISTENER_RULE_ARN_PARAMETER": listener_rule_arn_parameter_name,
+                }
+            )
 
-        signout_lambda = lambda_.Function(
-            scope,
-            "SignoutFunction",
-            runtime=lambda_.Runtime.PYTHON_3_12,
-            role=lambda_role,
-            handler="signout.handler",
-            code=lambda_.Code.from_asset(
-                "./comfyui_aws_stack/lambda/admin_lambda"),
-            timeout=Duration.seconds(amount=60),
-            environment={
-                "REDIRECT_URL": user_pool_logout_url
-            }
-        )
+            events.Rule(
+                scope,
+                "PromptReplayRule",
+                event_pattern=events.EventPattern(
+                    source=["aws.ecs"],
+                    detail_type=["ECS Task State Change"],
+                    detail={
+                        "clusterArn": [cluster.cluster_arn],
+                        "lastStatus": ["RUNNING"],
+                        "healthStatus": ["HEALTHY"],
+                    }
+                ),
+                targets=[event_targets.LambdaFunction(prompt_replay_lambda)]
+            )
+
+        # Spot interruption warnings move the ComfyUI queue to the prompt
+        # buffer and drain the instance, rebalance recommendations only move
+        # the pending prompts
+        if spot_interruption_handling:
+            spot_drain_lambda = lambda_.Function(
+                scope,
+                "SpotDrainFunction",
+                handler="spot_drain.handler",
+                code=lambda_.Code.from_asset(
+                    "./comfyui_aws_stack/lambda/admin_lambda"),
+                role=lambda_role,
+                runtime=lambda_.Runtime.PYTHON_3_12,
+                architecture=lambda_.Architecture.ARM_64 if lambda_arm64 else lambda_.Architecture.X86_64,
+                timeout=Duration.seconds(60),
+                vpc=vpc,
+                vpc_subnets=ec2.SubnetSelection(
+                    subnet_type=ec2.SubnetType.PRIVATE_WITH_EGRESS),
+                security_groups=[prompt_replay_security_group],
+                environment={
+                    **cluster_state_environment,
+                    "LISTENER_RULE_ARN_PARAMETER": listener_rule_arn_parameter_name,
+                }
+            )
+
+            events.Rule(
+                scope,
+                "SpotInterruptionRule",
+                event_pattern=events.EventPattern(
+                    source=["aws.ec2"],
+                    detail_type=["EC2 Spot Instance Interruption Warning",
+                                 "EC2 Instance Rebalance Recommendation"],
+                ),
+                targets=[event_targets.LambdaFunction(spot_drain_lambda)]
+            )
 
         lambda_admin_target_group = elbv2.ApplicationTargetGroup(
             scope,
             "LambdaAdminTargetGroup",
             vpc=vpc,
             target_type=elbv2.TargetType.LAMBDA,
-            targets=[targets.LambdaTarget(admin_lambda)]
+            targets=[targets.LambdaTarget(router_target)]
+        )
+
+        lambda_status_target_group = elbv2.ApplicationTargetGroup(
+            scope,
+            "LambdaStatusTargetGroup",
+            vpc=vpc,
+            target_type=elbv2.TargetType.LAMBDA,
+            targets=[targets.LambdaTarget(router_target)]
         )
 
         lambda_restart_docker_target_group = elbv2.ApplicationTargetGroup(
@@ -177,7 +294,15 @@ class AdminConstruct(Construct):
             "LambdaRestartDockerTargetGroup",
             vpc=vpc,
             target_type=elbv2.TargetType.LAMBDA,
-            targets=[targets.LambdaTarget(restart_docker_lambda)]
+            targets=[targets.LambdaTarget(router_target)]
+        )
+
+        lambda_models_target_group = elbv2.ApplicationTargetGroup(
+            scope,
+            "LambdaModelsTargetGroup",
+            vpc=vpc,
+            target_type=elbv2.TargetType.LAMBDA,
+            targets=[targets.LambdaTarget(router_target)]
         )
 
         lambda_shutdown_target_group = elbv2.ApplicationTargetGroup(
@@ -185,7 +310,7 @@ class AdminConstruct(Construct):
             "LambdaShutdownTargetGroup",
             vpc=vpc,
             target_type=elbv2.TargetType.LAMBDA,
-            targets=[targets.LambdaTarget(shutdown_lambda)]
+            targets=[targets.LambdaTarget(router_target)]
         )
 
         lambda_scaleup_target_group = elbv2.ApplicationTargetGroup(
@@ -193,7 +318,7 @@ class AdminConstruct(Construct):
             "LambdaScaleupTargetGroup",
             vpc=vpc,
             target_type=elbv2.TargetType.LAMBDA,
-            targets=[targets.LambdaTarget(scaleup_trigger_lambda)]
+            targets=[targets.LambdaTarget(router_target)]
         )
 
         lambda_signout_target_group = elbv2.ApplicationTargetGroup(
@@ -201,9 +326,17 @@ class AdminConstruct(Construct):
             "LambdaSignoutTargetGroup",
             vpc=vpc,
             target_type=elbv2.TargetType.LAMBDA,
-            targets=[targets.LambdaTarget(signout_lambda)]
+            targets=[targets.LambdaTarget(router_target)]
         )
 
+        lambda_view_target_group = elbv2.ApplicationTargetGroup(
+            scope,
+            "LambdaViewTargetGroup",
+            vpc=vpc,
+            target_type=elbv2.TargetType.LAMBDA,
+            targets=[targets.LambdaTarget(router_target)]
+        ) if output_bucket else None
+
         # CloudWatch Event Rule for ASG scale-in events
         scale_in_event_pattern = events.EventPattern(
             source=["aws.autoscaling"],
@@ -217,9 +350,12 @@ class AdminConstruct(Construct):
             scope,
             "ScaleInEventRule",
             event_pattern=scale_in_event_pattern,
-            targets=[event_targets.LambdaFunction(scalein_listener_lambda)]
+            targets=[event_targets.LambdaFunction(router_target)]
         )
 
+        # PENDING / RUNNING record the scale-up phase and RUNNING flips the
+        # listener rule, STOPPED keeps the state cache current when the task
+        # goes away
         ecs_task_state_change_event_rule = events.Rule(
             scope,
             "EcsTaskStateChangeRule",
@@ -228,29 +364,104 @@ class AdminConstruct(Construct):
                 detail_type=["ECS Task State Change"],
                 detail={
                     "clusterArn": [cluster.cluster_arn],
-                    "lastStatus": ["RUNNING"],
+                    "lastStatus": ["PENDING", "RUNNING", "STOPPED"],
                 }
             ),
-            targets=[event_targets.LambdaFunction(scaleup_listener_lambda)]
+            targets=[event_targets.LambdaFunction(router_target)]
         )
 
+        # Scale-up phase timing: ASG launches, container instance registration
+        # and service steady state complete the milestones recorded by the
+        # scale-up trigger and listener (see scaleup_trace.py)
+        scale_up_trace_asg_rule = events.Rule(
+            scope,
+            "ScaleUpTraceAsgRule",
+            event_pattern=events.EventPattern(
+                source=["aws.autoscaling"],
+                detail_type=["EC2 Instance Launch Successful"],
+                detail={
+                    "AutoScalingGroupName": [auto_scaling_group.auto_scaling_group_name]
+                }
+            ),
+            targets=[event_targets.LambdaFunction(router_target)]
+        )
+
+        scale_up_trace_ecs_rule = events.Rule(
+            scope,
+            "ScaleUpTraceEcsRule",
+            event_pattern=events.EventPattern(
+                source=["aws.ecs"],
+                detail_type=["ECS Container Instance State Change",
+                             "ECS Service Action"],
+                detail={
+                    "clusterArn": [cluster.cluster_arn],
+                }
+            ),
+            targets=[event_targets.LambdaFunction(router_target)]
+        )
+
+        # Alarm when a scale-up takes longer than expected
+        scale_up_duration_alarm = cloudwatch.Alarm(
+            scope,
+            "ScaleUpDurationAlarm",
+            metric=cloudwatch.Metric(
+                namespace="ComfyUI/ScaleUp",
+                metric_name="TimeToReady",
+                statistic="Maximum",
+                period=Duration.hours(1),
+            ),
+            threshold=scale_up_alarm_seconds,
+            evaluation_periods=1,
+            comparison_operator=cloudwatch.ComparisonOperator.GREATER_THAN_THRESHOLD,
+            alarm_description="Scale-up from the admin page to a healthy ComfyUI target took longer than expected",
+            treat_missing_data=cloudwatch.TreatMissingData.NOT_BREACHING
+        )
+
+        # Nag
+
+        NagSuppressions.add_resource_suppressions(
+            [cluster_state_table],
+            suppressions=[
+                {"id": "AwsSolutions-DDB3",
+                 "reason": "The table only caches cluster state that is rebuilt from the describe APIs, so point-in-time recovery is not needed."
+                 },
+            ],
+        )
+
+        if prompt_queue:
+            NagSuppressions.add_resource_suppressions(
+                [prompt_queue],
+                suppressions=[
+                    {"id": "AwsSolutions-SQS3",
+                     "reason": "Prompts that cannot be replayed stay in the queue until the next scale-up, a dead-letter queue is not needed."
+                     },
+                ],
+            )
+
         # Output
 
-        self.restart_docker_lambda = restart_docker_lambda
-        self.scalein_listener_lambda = scalein_listener_lambda
-        self.scaleup_listener_lambda = scaleup_listener_lambda
+        self.cluster_state_table = cluster_state_table
+        self.router_lambda = router_lambda
+        self.scale_up_duration_alarm = scale_up_duration_alarm
+        self.listener_rule_arn_parameter_name = listener_rule_arn_parameter_name
+        self.prompt_queue = prompt_queue
+        self.prompt_replay_lambda = prompt_replay_lambda
+        self.spot_drain_lambda = spot_drain_lambda
         self.lambda_admin_target_group = lambda_admin_target_group
+        self.lambda_status_target_group = lambda_status_target_group
         self.lambda_restart_docker_target_group = lambda_restart_docker_target_group
+        self.lambda_models_target_group = lambda_models_target_group
         self.lambda_shutdown_target_group = lambda_shutdown_target_group
         self.lambda_scaleup_target_group = lambda_scaleup_target_group
         self.lambda_signout_target_group = lambda_signout_target_group
+        self.lambda_view_target_group = lambda_view_target_group
 
     def add_environments(self,
                          lambda_admin_rule: elbv2.ApplicationListenerRule,
                          ):
-        self.restart_docker_lambda.add_environment(
-            "LISTENER_RULE_ARN", lambda_admin_rule.listener_rule_arn)
-        self.scalein_listener_lambda.add_environment(
-            "LISTENER_RULE_ARN", lambda_admin_rule.listener_rule_arn)
-        self.scaleup_listener_lambda.add_environment(
-            "LISTENER_RULE_ARN", lambda_admin_rule.listener_rule_arn)
+        ssm.StringParameter(
+            self,
+            "ListenerRuleArnParameter",
+            parameter_name=self.listener_rule_arn_parameter_name,
+            string_value=lambda_admin_rule.listener_rule_arn,
+        )
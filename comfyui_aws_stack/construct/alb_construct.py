@@ -17,6 +17,7 @@ from aws_cdk import (
 from constructs import Construct
 from cdk_nag import NagSuppressions
 
+from comfyui_aws_stack.construct.cdn_construct import VIEWER_IP_HEADER
 from typing import List
 
 
@@ -39,6 +40,8 @@ class AlbConstruct(Construct):
     alb: elbv2.ApplicationLoadBalancer
     alb_security_group: ec2.SecurityGroup
     certificate: acm.Certificate
+    hosted_zone: route53.IHostedZone
+    origin_dns_name: str
     listener: elbv2.ApplicationListener
     lambdaAdminRule: elbv2.ApplicationListenerRule
 
@@ -56,9 +59,14 @@ class AlbConstruct(Construct):
             host_name: str,
             domain_name: str,
             hosted_zone_id: str,
+            cdn: bool = False,
             **kwargs) -> None:
         super().__init__(scope, construct_id, **kwargs)
 
+        if cdn and not (host_name and domain_name and hosted_zone_id):
+            raise ValueError(
+                "cdn requires a custom domain (host_name, domain_name and hosted_zone_id)")
+
         # Create ALB Security Group
         alb_security_group = ec2.SecurityGroup(
             scope,
@@ -67,11 +75,40 @@ class AlbConstruct(Construct):
             description="Security Group for ALB",
             allow_all_outbound=True,
         )
-        alb_security_group.add_ingress_rule(
-            ec2.Peer.any_ipv4(),
-            ec2.Port.tcp(443),
-            "Allow inbound traffic on port 443",
-        )
+        if cdn:
+            # Only CloudFront reaches the ALB, so that the WAF can trust the
+            # client address CloudFront appends to X-Forwarded-For
+            cloudfront_prefix_list = cr.AwsCustomResource(
+                scope,
+                "CloudFrontPrefixList",
+                on_update=cr.AwsSdkCall(
+                    service="EC2",
+                    action="describeManagedPrefixLists",
+                    parameters={
+                        "Filters": [{
+                            "Name": "prefix-list-name",
+                            "Values": ["com.amazonaws.global.cloudfront.origin-facing"],
+                        }]
+                    },
+                    physical_resource_id=cr.PhysicalResourceId.of(
+                        "CloudFrontPrefixList"),
+                    output_paths=["PrefixLists.0.PrefixListId"],
+                ),
+                policy=cr.AwsCustomResourcePolicy.from_sdk_calls(
+                    resources=cr.AwsCustomResourcePolicy.ANY_RESOURCE),
+            )
+            alb_security_group.add_ingress_rule(
+                ec2.Peer.prefix_list(
+                    cloudfront_prefix_list.get_response_field("PrefixLists.0.PrefixListId")),
+                ec2.Port.tcp(443),
+                "Allow inbound traffic on port 443 from CloudFront",
+            )
+        else:
+            alb_security_group.add_ingress_rule(
+                ec2.Peer.any_ipv4(),
+                ec2.Port.tcp(443),
+                "Allow inbound traffic on port 443",
+            )
 
         # Application Load Balancer
         alb = elbv2.ApplicationLoadBalancer(
@@ -86,10 +123,15 @@ class AlbConstruct(Construct):
             source_protocol=elbv2.ApplicationProtocol.HTTP,
             source_port=80,
             target_protocol=elbv2.ApplicationProtocol.HTTPS,
-            target_port=443
+            target_port=443,
+            # The listeners open the ALB to 0.0.0.0/0 unless it is behind
+            # CloudFront
+            open=not cdn,
         )
 
         # Certificate
+        hostedZone = None
+        origin_dns_name = None
         if host_name and domain_name and hosted_zone_id:
             hostedZone = route53.HostedZone.from_hosted_zone_attributes(
                 scope,
@@ -97,19 +139,35 @@ class AlbConstruct(Construct):
                 hosted_zone_id=hosted_zone_id,
                 zone_name=domain_name
             )
-            route53.ARecord(
-                scope,
-                "AliasRecord",
-                zone=hostedZone,
-                target=route53.RecordTarget.from_alias(
-                    route53_targets.LoadBalancerTarget(alb)
-                ),
-                record_name=f"{host_name}.{domain_name}",
-            )
+            if cdn:
+                # The application name points to CloudFront (CdnConstruct),
+                # CloudFront reaches the ALB on its own name
+                origin_dns_name = f"{host_name}-origin.{domain_name}"
+                route53.ARecord(
+                    scope,
+                    "OriginAliasRecord",
+                    zone=hostedZone,
+                    target=route53.RecordTarget.from_alias(
+                        route53_targets.LoadBalancerTarget(alb)
+                    ),
+                    record_name=origin_dns_name,
+                )
+            else:
+                route53.ARecord(
+                    scope,
+                    "AliasRecord",
+                    zone=hostedZone,
+                    target=route53.RecordTarget.from_alias(
+                        route53_targets.LoadBalancerTarget(alb)
+                    ),
+                    record_name=f"{host_name}.{domain_name}",
+                )
             certificate = acm.Certificate(
                 scope,
                 "Certificate",
                 domain_name=f"{host_name}.{domain_name}",
+                subject_alternative_names=[
+                    origin_dns_name] if origin_dns_name else None,
                 validation=acm.CertificateValidation.from_dns(hostedZone),
             )
         else:
@@ -178,6 +236,20 @@ class AlbConstruct(Construct):
             wafRules = []
             rule_priority = 1
 
+            # Behind CloudFront the client address is the last address of
+            # X-Forwarded-For, appended by CloudFront
+            def ip_set_reference(ip_set):
+                if not cdn:
+                    return {"arn": ip_set.attr_arn}
+                return wafv2.CfnWebACL.IPSetReferenceStatementProperty(
+                    arn=ip_set.attr_arn,
+                    ip_set_forwarded_ip_config=wafv2.CfnWebACL.IPSetForwardedIPConfigurationProperty(
+                        header_name="X-Forwarded-For",
+                        fallback_behavior="NO_MATCH",
+                        position="LAST",
+                    ),
+                )
+
             if allowed_ip_v4_address_ranges:
                 ipv4 = wafv2.CfnIPSet(
                     scope,
@@ -196,7 +268,7 @@ class AlbConstruct(Construct):
                             sampled_requests_enabled=True,
                         ),
                         statement=wafv2.CfnWebACL.StatementProperty(
-                            ip_set_reference_statement={"arn": ipv4.attr_arn}
+                            ip_set_reference_statement=ip_set_reference(ipv4)
                         ),
                         action=wafv2.CfnWebACL.RuleActionProperty(
                             allow=wafv2.CfnWebACL.AllowActionProperty(),
@@ -223,7 +295,7 @@ class AlbConstruct(Construct):
                             sampled_requests_enabled=True,
                         ),
                         statement=wafv2.CfnWebACL.StatementProperty(
-                            ip_set_reference_statement={"arn": ipv6.attr_arn}
+                            ip_set_reference_statement=ip_set_reference(ipv6)
                         ),
                         action=wafv2.CfnWebACL.RuleActionProperty(
                             allow=wafv2.CfnWebACL.AllowActionProperty(),
@@ -246,7 +318,23 @@ class AlbConstruct(Construct):
                         statement=wafv2.CfnWebACL.StatementProperty(
                             rate_based_statement=wafv2.CfnWebACL.RateBasedStatementProperty(
                                 limit=waf_rate_limit_requests,
-                                aggregate_key_type="IP",
+                                # Behind CloudFront, the viewer address set by
+                                # CloudFront (the first address of
+                                # X-Forwarded-For is set by the client)
+                                aggregate_key_type="CUSTOM_KEYS" if cdn else "IP",
+                                custom_keys=[
+                                    wafv2.CfnWebACL.RateBasedStatementCustomKeyProperty(
+                                        header=wafv2.CfnWebACL.RateLimitHeaderProperty(
+                                            name=VIEWER_IP_HEADER,
+                                            text_transformations=[
+                                                wafv2.CfnWebACL.TextTransformationProperty(
+                                                    priority=0,
+                                                    type="NONE"
+                                                )
+                                            ]
+                                        )
+                                    )
+                                ] if cdn else None,
                                 evaluation_window_sec=waf_rate_limit_interval,
                                 scope_down_statement=wafv2.CfnWebACL.StatementProperty(
                                     byte_match_statement=wafv2.CfnWebACL.ByteMatchStatementProperty(
@@ -301,18 +389,23 @@ class AlbConstruct(Construct):
         self.alb = alb
         self.alb_security_group = alb_security_group
         self.certificate = certificate
+        self.hosted_zone = hostedZone
+        self.origin_dns_name = origin_dns_name
 
     def associate_resources(
             self,
             ecs_target_group: elbv2.ApplicationTargetGroup,
             lambda_admin_target_group: elbv2.ApplicationTargetGroup,
+            lambda_status_target_group: elbv2.ApplicationTargetGroup,
             lambda_restart_docker_target_group: elbv2.ApplicationTargetGroup,
+            lambda_models_target_group: elbv2.ApplicationTargetGroup,
             lambda_shutdown_target_group: elbv2.ApplicationTargetGroup,
             lambda_scaleup_target_group: elbv2.ApplicationTargetGroup,
             lambda_signout_target_group: elbv2.ApplicationTargetGroup,
             user_pool: cognito.UserPool,
             user_pool_client: cognito.UserPoolClient,
             user_pool_custom_domain: cognito.UserPoolDomain,
+            lambda_view_target_group: elbv2.ApplicationTargetGroup = None,
     ):
         scope = self.scope
         alb = self.alb
@@ -324,6 +417,7 @@ class AlbConstruct(Construct):
             certificates=[certificate],
             port=443,
             protocol=elbv2.ApplicationProtocol.HTTPS,
+            open=self.origin_dns_name is None,
             default_action=elbv2.ListenerAction.forward([ecs_target_group])
         )
 
@@ -358,6 +452,22 @@ class AlbConstruct(Construct):
             ),
         )
 
+        lambda_models_rule = elbv2.ApplicationListenerRule(
+            scope,
+            "LambdaModelsRule",
+            listener=listener,
+            priority=12,
+            conditions=[elbv2.ListenerCondition.path_patterns(
+                ["/admin/models"])],
+            action=elb_actions.AuthenticateCognitoAction(
+                next=elbv2.ListenerAction.forward(
+                    [lambda_models_target_group]),
+                user_pool=user_pool,
+                user_pool_client=user_pool_client,
+                user_pool_domain=user_pool_custom_domain,
+            ),
+        )
+
         lambda_shutdown_rule = elbv2.ApplicationListenerRule(
             scope,
             "LambdaShutdownRule",
@@ -390,6 +500,22 @@ class AlbConstruct(Construct):
             ),
         )
 
+        lambda_status_rule = elbv2.ApplicationListenerRule(
+            scope,
+            "LambdaStatusRule",
+            listener=listener,
+            priority=22,
+            conditions=[elbv2.ListenerCondition.path_patterns(
+                ["/admin/status"])],
+            action=elb_actions.AuthenticateCognitoAction(
+                next=elbv2.ListenerAction.forward(
+                    [lambda_status_target_group]),
+                user_pool=user_pool,
+                user_pool_client=user_pool_client,
+                user_pool_domain=user_pool_custom_domain,
+            ),
+        )
+
         lambda_signout_rule = elbv2.ApplicationListenerRule(
             scope,
             "LambdaSignoutRule",
@@ -405,7 +531,46 @@ class AlbConstruct(Construct):
             ),
         )
 
-        # Add authentication action as the first priority rule
+        # Offloaded outputs are redirected to S3 by the view Lambda, which
+        # sends the files not uploaded yet back with local=1
+        if lambda_view_target_group:
+            elbv2.ApplicationListenerRule(
+                scope,
+                "ViewLocalRule",
+                listener=listener,
+                priority=26,
+                conditions=[
+                    elbv2.ListenerCondition.path_patterns(["/view", "/api/view"]),
+                    elbv2.ListenerCondition.query_strings([
+                        elbv2.QueryStringCondition(key="local", value="1")]),
+                ],
+                action=elb_actions.AuthenticateCognitoAction(
+                    next=elbv2.ListenerAction.forward([ecs_target_group]),
+                    user_pool=user_pool,
+                    user_pool_client=user_pool_client,
+                    user_pool_domain=user_pool_custom_domain,
+                ),
+            )
+
+            elbv2.ApplicationListenerRule(
+                scope,
+                "LambdaViewRule",
+                listener=listener,
+                priority=27,
+                conditions=[
+                    elbv2.ListenerCondition.path_patterns(["/view", "/api/view"]),
+                    elbv2.ListenerCondition.query_strings([
+                        elbv2.QueryStringCondition(key="type", value="output")]),
+                ],
+                action=elb_actions.AuthenticateCognitoAction(
+                    next=elbv2.ListenerAction.forward(
+                        [lambda_view_target_group]),
+                    user_pool=user_pool,
+                    user_pool_client=user_pool_client,
+                    user_pool_domain=user_pool_custom_domain,
+                ),
+            )
+
         auth_rule = listener.add_action(
             "AuthenticateRule",
             priority=30,
@@ -1,3 +1,5 @@
+import textwrap
+
 from aws_cdk import (
     aws_ecs as ecs,
     aws_ec2 as ec2,
@@ -12,12 +14,47 @@ from aws_cdk import (
     aws_events_targets as events_targets,
     aws_lambda as lambda_,
     aws_kms as kms,
+    aws_ecr_assets as ecr_assets,
+    aws_s3 as s3,
     Duration,
+    Fn,
     RemovalPolicy,
 )
 from constructs import Construct
 from cdk_nag import NagSuppressions
 
+from comfyui_aws_stack.construct.model_store_construct import MODEL_STORE_PREFIX
+from comfyui_aws_stack.construct.soci_index_construct import SOCI_RELEASE
+from comfyui_aws_stack.instance_capabilities import comfyui_settings, instance_capabilities
+
+
+# Launch lifecycle hook held until a warm pool instance has pulled the image
+WARM_POOL_HOOK_NAME = "WarmPoolLaunch"
+WARM_POOL_HOOK_SCRIPT = "/var/lib/cloud/scripts/per-boot/complete-warm-pool-hook.sh"
+
+# Instance store is erased when an instance is stopped (warm pool), the
+# model cache volume is created on every boot
+MODEL_CACHE_MOUNT_SCRIPT = "/var/lib/cloud/scripts/per-boot/mount-model-cache.sh"
+MODEL_CACHE_HOST_PATH = "/mnt/model-cache"
+
+# S3 model store mounted with Mountpoint for Amazon S3 (runs after the cache
+# mount script, per-boot scripts run in name order)
+MODEL_STORE_MOUNT_SCRIPT = "/var/lib/cloud/scripts/per-boot/mount-model-store.sh"
+MODEL_STORE_HOST_PATH = "/mnt/model-store"
+MOUNTPOINT_S3_RPM = "https://s3.amazonaws.com/mountpoint-s3-release/latest/x86_64/mount-s3.rpm"
+
+# SOCI snapshotter, used by containerd (and Docker through it) to lazily
+# pull the images that have a SOCI index
+SOCI_SNAPSHOTTER_SOCKET = "/run/soci-snapshotter-grpc/soci-snapshotter-grpc.sock"
+
+SPOT_ALLOCATION_STRATEGIES = {
+    "lowest-price": autoscaling.SpotAllocationStrategy.LOWEST_PRICE,
+    "price-capacity-optimized": autoscaling.SpotAllocationStrategy.PRICE_CAPACITY_OPTIMIZED,
+    "capacity-optimized": autoscaling.SpotAllocationStrategy.CAPACITY_OPTIMIZED,
+    # Priority follows the order of instance_types
+    "capacity-optimized-prioritized": autoscaling.SpotAllocationStrategy.CAPACITY_OPTIMIZED_PRIORITIZED,
+}
+
 
 class AsgConstruct(Construct):
     auto_scaling_group: autoscaling.AutoScalingGroup
@@ -38,9 +75,48 @@ class AsgConstruct(Construct):
             schedule_scale_up: str,
             slack_workspace_id: str = None,
             slack_channel_id: str = None,
+            warm_pool: bool = False,
+            warm_pool_state: str = "Stopped",
+            idle_scale_down_minutes: int = 15,
+            max_workers: int = 1,
+            spot_interruption_handling: bool = False,
+            spot_allocation_strategy: str = "lowest-price",
+            spot_instance_pools: int = 1,
+            spot_fallback_failures: int = 0,
+            spot_fallback_window_minutes: int = 10,
+            spot_fallback_minutes: int = 60,
+            spot_fallback_instance_types: list = None,
+            model_cache: bool = False,
+            model_bucket: s3.IBucket = None,
+            soci_snapshotter: bool = False,
+            golden_ami_parameter_name: str = None,
             **kwargs) -> None:
         super().__init__(scope, construct_id, **kwargs)
 
+        # Warm pools cannot be combined with Spot or a mixed instances policy
+        if warm_pool and use_spot:
+            raise ValueError(
+                "warm_pool requires use_spot=False: EC2 Auto Scaling warm pools do not support Spot Instances")
+        if spot_interruption_handling and not use_spot:
+            raise ValueError(
+                "spot_interruption_handling requires use_spot=True")
+        if spot_fallback_failures and not use_spot:
+            raise ValueError(
+                "spot_fallback_failures requires use_spot=True")
+        if spot_allocation_strategy not in SPOT_ALLOCATION_STRATEGIES:
+            raise ValueError(
+                f"spot_allocation_strategy must be one of {', '.join(SPOT_ALLOCATION_STRATEGIES)}")
+        if soci_snapshotter and golden_ami_parameter_name:
+            raise ValueError(
+                "golden_ami cannot be combined with soci_index: the AMI holds the ComfyUI image in the Docker image store that soci_index replaces")
+        if model_cache:
+            without_instance_store = [
+                instance_type for instance_type in instance_types + (spot_fallback_instance_types or [])
+                if not instance_capabilities(instance_type)["instance_storage_gb"]]
+            if without_instance_store:
+                raise ValueError(
+                    f"model_cache requires NVMe instance store, not available on {', '.join(without_instance_store)}")
+
         # Create Auto Scaling Group Security Group
         asg_security_group = ec2.SecurityGroup(
             scope,
@@ -64,23 +140,182 @@ class AsgConstruct(Construct):
         )
 
         user_data_script = ec2.UserData.for_linux()
-        user_data_script.add_commands("""
+        if golden_ami_parameter_name:
+            # The golden AMI has the rexray plugin, the NVIDIA and ECS agent
+            # settings and the ComfyUI image: Docker is not restarted while
+            # the ECS agent starts
+            user_data_script.add_commands("""
+            #!/bin/bash
+            REGION=$(curl -s http://169.254.169.254/latest/meta-data/placement/region)
+            # Report user data completion to the scale-up trace via an ECS attribute
+            echo "ECS_INSTANCE_ATTRIBUTES={\\"comfyui.userdata-completed-at\\":\\"$(date +%s)\\"}" >> /etc/ecs/ecs.config
+        """)
+        else:
+            user_data_script.add_commands("""
             #!/bin/bash
             REGION=$(curl -s http://169.254.169.254/latest/meta-data/placement/region) 
             docker plugin install public.ecr.aws/j1l5j1d1/rexray-ebs --grant-all-permissions REXRAY_PREEMPT=true EBS_REGION=$REGION
             systemctl restart docker
+            # Report user data completion to the scale-up trace via an ECS attribute
+            echo "ECS_INSTANCE_ATTRIBUTES={\\"comfyui.userdata-completed-at\\":\\"$(date +%s)\\"}" >> /etc/ecs/ecs.config
         """)
 
+        if soci_snapshotter:
+            # Docker keeps its images in containerd (containerd image store)
+            # and mounts them with the SOCI snapshotter: layers with a SOCI
+            # index are fetched from ECR as the container reads their files,
+            # other images are pulled in full. The snapshotter gets the ECR
+            # credentials from the credential helper. The ECS agent starts
+            # after the user data, with Docker already switched.
+            user_data_script.add_commands(textwrap.dedent(f"""
+                yum install -y jq amazon-ecr-credential-helper
+                curl -sSfL {SOCI_RELEASE} | tar -xz -C /usr/local/bin soci-snapshotter-grpc soci
+                mkdir -p /root/.docker
+                echo '{{"credsStore": "ecr-login"}}' > /root/.docker/config.json
+                cat > /etc/systemd/system/soci-snapshotter.service <<'EOF'
+                [Unit]
+                Description=SOCI snapshotter
+                After=network-online.target
+                Before=containerd.service
+
+                [Service]
+                Environment=HOME=/root
+                ExecStart=/usr/local/bin/soci-snapshotter-grpc
+                Restart=always
+
+                [Install]
+                WantedBy=multi-user.target
+                EOF
+                cat >> /etc/containerd/config.toml <<'EOF'
+                [proxy_plugins.soci]
+                  type = "snapshot"
+                  address = "{SOCI_SNAPSHOTTER_SOCKET}"
+                  [proxy_plugins.soci.exports]
+                    root = "/var/lib/soci-snapshotter-grpc"
+                    enable_remote_snapshot_annotations = "true"
+                EOF
+                [ -f /etc/docker/daemon.json ] || echo '{{}}' > /etc/docker/daemon.json
+                jq '. + {{"features": {{"containerd-snapshotter": true}}, "storage-driver": "soci"}}' /etc/docker/daemon.json > /tmp/daemon.json
+                mv /tmp/daemon.json /etc/docker/daemon.json
+                systemctl daemon-reload
+                systemctl enable --now soci-snapshotter
+                systemctl restart containerd docker
+            """))
+
+        # ComfyUI settings of the instance type the ASG launched (RAM, VRAM
+        # and vCPUs from instance_types.json), sourced by the container
+        # command, and the host swap used by the task
+        settings_cases = []
+        for instance_type in dict.fromkeys(instance_types + (spot_fallback_instance_types or [])):
+            settings = comfyui_settings(instance_type)
+            settings_cases.append(
+                f'    {instance_type}) SWAP_MIB={settings["swap_mib"]}; '
+                f'COMFYUI_ARGS="{" ".join(settings["args"])}"; THREADS={settings["threads"]} ;;')
+        user_data_script.add_commands(textwrap.dedent("""
+            INSTANCE_TYPE=$(curl -s http://169.254.169.254/latest/meta-data/instance-type)
+            case $INSTANCE_TYPE in
+            {cases}
+            esac
+            mkdir -p /etc/comfyui
+            cat > /etc/comfyui/comfyui.env <<EOF
+            export COMFYUI_ARGS="$COMFYUI_ARGS"
+            export OMP_NUM_THREADS=$THREADS
+            EOF
+            if [ -n "$SWAP_MIB" ] && [ ! -f /swapfile ]; then
+                fallocate -l ${{SWAP_MIB}}M /swapfile
+                chmod 600 /swapfile
+                mkswap /swapfile
+                echo "/swapfile none swap sw 0 0" >> /etc/fstab
+            fi
+            swapon -a
+        """).format(cases="\n".join(settings_cases)))
+
+        if model_cache:
+            # RAID 0 over the NVMe instance store volumes, the marker file
+            # tells the model cache launcher the volume is mounted
+            user_data_script.add_commands(textwrap.dedent(f"""
+                cat > {MODEL_CACHE_MOUNT_SCRIPT} <<'EOF'
+                #!/bin/bash
+                mountpoint -q {MODEL_CACHE_HOST_PATH} && exit 0
+                DEVICES=$(for DEVICE in /sys/block/nvme*n1; do grep -qs "Instance Storage" $DEVICE/device/model && echo /dev/$(basename $DEVICE); done)
+                [ -z "$DEVICES" ] && exit 0
+                if [ $(echo $DEVICES | wc -w) -gt 1 ]; then
+                    # Reassembled after a reboot, the cache is recreated
+                    mdadm --stop --scan
+                    mdadm --create /dev/md0 --run --level=0 --raid-devices=$(echo $DEVICES | wc -w) $DEVICES
+                    DEVICES=/dev/md0
+                fi
+                mkfs.xfs -f $DEVICES
+                mkdir -p {MODEL_CACHE_HOST_PATH}
+                mount -o noatime $DEVICES {MODEL_CACHE_HOST_PATH}
+                touch {MODEL_CACHE_HOST_PATH}/.model-cache
+                chown -R 1000:1000 {MODEL_CACHE_HOST_PATH}
+                EOF
+                chmod +x {MODEL_CACHE_MOUNT_SCRIPT}
+                {MODEL_CACHE_MOUNT_SCRIPT}
+            """))
+
+        if model_bucket:
+            # Read-only, lazily fetched view of the model folders: files are
+            # read with parallel ranged GETs as ComfyUI (mmap) touches them
+            model_bucket.grant_read(ec2_role, f"{MODEL_STORE_PREFIX}*")
+            user_data_script.add_commands(textwrap.dedent(f"""
+                yum install -y {MOUNTPOINT_S3_RPM}
+                cat > {MODEL_STORE_MOUNT_SCRIPT} <<'EOF'
+                #!/bin/bash
+                mountpoint -q {MODEL_STORE_HOST_PATH} && exit 0
+                mkdir -p {MODEL_STORE_HOST_PATH}
+                REGION=$(curl -s http://169.254.169.254/latest/meta-data/placement/region)
+                mount-s3 {model_bucket.bucket_name} {MODEL_STORE_HOST_PATH} --prefix {MODEL_STORE_PREFIX} --region $REGION --read-only --allow-other --uid 1000 --gid 1000
+                EOF
+                chmod +x {MODEL_STORE_MOUNT_SCRIPT}
+                {MODEL_STORE_MOUNT_SCRIPT}
+            """))
+
+        if spot_interruption_handling:
+            # Drain the container instance on the two-minute interruption
+            # notice (also done by the Spot drain Lambda, which saves the queue)
+            user_data_script.add_commands(
+                'echo "ECS_ENABLE_SPOT_INSTANCE_DRAINING=true" >> /etc/ecs/ecs.config')
+
+        if warm_pool:
+            # The hook script is written with dedent, a heredoc needs its
+            # terminator and shebang at the start of the line
+            user_data_script.add_commands(textwrap.dedent(f"""
+                # Warm pool: do not register with ECS while the instance is warmed,
+                # and start the task from the image pulled during warm-up
+                echo "ECS_WARM_POOLS_CHECK=true" >> /etc/ecs/ecs.config
+                echo "ECS_IMAGE_PULL_BEHAVIOR=prefer-cached" >> /etc/ecs/ecs.config
+                command -v aws || yum install -y awscli
+                cat > {WARM_POOL_HOOK_SCRIPT} <<'EOF'
+                #!/bin/bash
+                # Let the ASG continue once the instance is ready. Runs on every
+                # boot, instances leaving the warm pool do not run the user data again.
+                REGION=$(curl -s http://169.254.169.254/latest/meta-data/placement/region)
+                INSTANCE_ID=$(curl -s http://169.254.169.254/latest/meta-data/instance-id)
+                ASG_NAME=$(aws autoscaling describe-auto-scaling-instances --region $REGION --instance-ids $INSTANCE_ID --query 'AutoScalingInstances[0].AutoScalingGroupName' --output text)
+                aws autoscaling complete-lifecycle-action --region $REGION --auto-scaling-group-name $ASG_NAME --lifecycle-hook-name {WARM_POOL_HOOK_NAME} --instance-id $INSTANCE_ID --lifecycle-action-result CONTINUE
+                EOF
+                chmod +x {WARM_POOL_HOOK_SCRIPT}
+            """))
+
         # Create an Auto Scaling Group with two EBS volumes
         launchTemplate = ec2.LaunchTemplate(
             scope,
             "Host",
-            machine_image=ecs.EcsOptimizedImage.amazon_linux2(
+            # The newest golden AMI at every launch, or the ECS GPU AMI
+            machine_image=ec2.MachineImage.resolve_ssm_parameter_at_launch(
+                golden_ami_parameter_name
+            ) if golden_ami_parameter_name else ecs.EcsOptimizedImage.amazon_linux2(
                 hardware_type=ecs.AmiHardwareType.GPU
             ),
             role=ec2_role,
             security_group=asg_security_group,
             user_data=user_data_script,
+            # Warm pools need a single instance type in the launch template
+            instance_type=ec2.InstanceType(
+                instance_types[0]) if warm_pool else None,
+            hibernation_configured=True if warm_pool and warm_pool_state == "Hibernated" else None,
             block_devices=[
                 ec2.BlockDevice(
                     device_name="/dev/xvda",
@@ -97,52 +332,94 @@ class AsgConstruct(Construct):
             ) for instance_type in instance_types
         ]
         
-        auto_scaling_group = autoscaling.AutoScalingGroup(
-            scope,
-            "ASG",
-            vpc=vpc,
+        if warm_pool:
+            mixed_instances_policy = None
+        else:
             # Use Mixed Instance Policy to increase availability in case capacity is not available.
-            mixed_instances_policy=autoscaling.MixedInstancesPolicy(
+            mixed_instances_policy = autoscaling.MixedInstancesPolicy(
                 instances_distribution=autoscaling.InstancesDistribution(
                     on_demand_base_capacity=0,
                     on_demand_percentage_above_base_capacity=0 if use_spot else 100,
                     on_demand_allocation_strategy=autoscaling.OnDemandAllocationStrategy.LOWEST_PRICE,
-                    spot_allocation_strategy=autoscaling.SpotAllocationStrategy.LOWEST_PRICE,
-                    spot_instance_pools=1,
-                    spot_max_price=spot_price,
+                    spot_allocation_strategy=SPOT_ALLOCATION_STRATEGIES[spot_allocation_strategy],
+                    # Only used by the lowest-price strategy
+                    spot_instance_pools=spot_instance_pools
+                    if spot_allocation_strategy == "lowest-price" else None,
+                    # Empty: capped at the on-demand price
+                    spot_max_price=spot_price or None,
                 ),
                 launch_template=launchTemplate,
                 launch_template_overrides=launch_template_overrides,
-            ),
+            )
+
+        auto_scaling_group = autoscaling.AutoScalingGroup(
+            scope,
+            "ASG",
+            vpc=vpc,
+            mixed_instances_policy=mixed_instances_policy,
+            launch_template=launchTemplate if warm_pool else None,
             min_capacity=0,
-            max_capacity=1,
+            max_capacity=max_workers,
             desired_capacity=1,
-            new_instances_protected_from_scale_in=False,
+            # Required by managed termination protection in N-worker mode
+            new_instances_protected_from_scale_in=max_workers > 1,
+            # Launch a replacement as soon as a Spot instance receives a
+            # rebalance recommendation, before it is interrupted
+            capacity_rebalance=True if spot_interruption_handling else None,
         )
 
         auto_scaling_group.apply_removal_policy(RemovalPolicy.DESTROY)
 
-        cpu_utilization_metric = cloudwatch.Metric(
-            namespace='AWS/EC2',
-            metric_name='CPUUtilization',
+        # Warm Pool:
+        # Keep a stopped (or hibernated) instance that has already run the user
+        # data and pulled the ComfyUI image, to be started on scale-up. The pool
+        # only holds an instance while the group is scaled in (max - desired),
+        # and instances are not reused on scale-in so the pool is refilled with
+        # a freshly prepared one.
+        if warm_pool:
+            auto_scaling_group.add_warm_pool(
+                pool_state=autoscaling.PoolState.HIBERNATED
+                if warm_pool_state == "Hibernated" else autoscaling.PoolState.STOPPED,
+                min_size=0,
+                reuse_on_scale_in=False,
+            )
+            # Held by the user data until the image is pulled, then by the
+            # per-boot script until the instance is started again
+            auto_scaling_group.add_lifecycle_hook(
+                "WarmPoolLaunchHook",
+                lifecycle_hook_name=WARM_POOL_HOOK_NAME,
+                lifecycle_transition=autoscaling.LifecycleTransition.INSTANCE_LAUNCHING,
+                default_result=autoscaling.DefaultResult.CONTINUE,
+                heartbeat_timeout=Duration.minutes(20),
+            )
+
+        # Published every minute by the metrics sidecar of the ComfyUI task,
+        # 0 while a prompt is queued or running
+        idle_seconds_metric = cloudwatch.Metric(
+            namespace='ComfyUI/Activity',
+            metric_name='IdleSeconds',
             dimensions_map={
                 'AutoScalingGroupName': auto_scaling_group.auto_scaling_group_name
             },
-            statistic='Average',
+            statistic='Minimum',
             period=Duration.minutes(1)
         )
 
-        # Scale down to zero if no activity for an hour
-        if auto_scale_down:
-            # create a CloudWatch alarm to track the CPU utilization
-            cpu_alarm = cloudwatch.Alarm(
+        # Scale down to zero once ComfyUI has been idle for the idle window
+        # (in N-worker mode the ECS service is scaled instead, see
+        # WorkerScalingConstruct)
+        if auto_scale_down and max_workers == 1:
+            # Missing data (sidecar not running yet, instance stopped) never
+            # scales in, so a running prompt cannot be interrupted
+            idle_alarm = cloudwatch.Alarm(
                 scope,
-                "CPUUtilizationAlarm",
-                metric=cpu_utilization_metric,
-                threshold=1,
-                evaluation_periods=60,
-                datapoints_to_alarm=60,
-                comparison_operator=cloudwatch.ComparisonOperator.LESS_THAN_THRESHOLD
+                "IdleAlarm",
+                metric=idle_seconds_metric,
+                threshold=idle_scale_down_minutes * 60,
+                evaluation_periods=1,
+                comparison_operator=cloudwatch.ComparisonOperator.GREATER_THAN_OR_EQUAL_TO_THRESHOLD,
+                treat_missing_data=cloudwatch.TreatMissingData.NOT_BREACHING,
+                alarm_description=f"ComfyUI has had no queued or running prompt for {idle_scale_down_minutes} minutes",
             )
             scaling_action = autoscaling.StepScalingAction(
                 scope,
@@ -153,23 +430,68 @@ class AsgConstruct(Construct):
             )
             # Add scaling adjustments
             scaling_action.add_adjustment(
-                # scaling adjustment (reduce instance count by 1)
+                # scaling adjustment (reduce instance count by 1) for any
+                # breach of the idle alarm
                 adjustment=-1,
-                upper_bound=1   # upper threshold for CPU utilization
-            )
-            scaling_action.add_adjustment(
-                adjustment=0,   # No change in instance count
-                lower_bound=1   # Apply this when the metric is above 2%
+                lower_bound=0
             )
             # Link the StepScalingAction to the CloudWatch alarm
-            cpu_alarm.add_alarm_action(
+            idle_alarm.add_alarm_action(
                 cw_actions.AutoScalingAction(scaling_action)
             )
 
+            # Fallback when the sidecar publishes nothing (sidecar or
+            # ComfyUI down): scale in after an hour of host CPU below 1%.
+            # Only minutes without IdleSeconds count (FILL marks them -1),
+            # so a GPU-bound prompt with an idle host CPU is never
+            # interrupted.
+            cpu_utilization_metric = cloudwatch.Metric(
+                namespace='AWS/EC2',
+                metric_name='CPUUtilization',
+                dimensions_map={
+                    'AutoScalingGroupName': auto_scaling_group.auto_scaling_group_name
+                },
+                statistic='Average',
+                period=Duration.minutes(1)
+            )
+            cpu_alarm = cloudwatch.Alarm(
+                scope,
+                "CPUUtilizationAlarm",
+                metric=cloudwatch.MathExpression(
+                    expression="IF(FILL(idle, -1) == -1 AND cpu < 1, 1, 0)",
+                    using_metrics={
+                        "idle": idle_seconds_metric,
+                        "cpu": cpu_utilization_metric,
+                    },
+                    label="IdleHostWithoutActivityMetrics",
+                    period=Duration.minutes(1),
+                ),
+                threshold=1,
+                evaluation_periods=60,
+                datapoints_to_alarm=60,
+                comparison_operator=cloudwatch.ComparisonOperator.GREATER_THAN_OR_EQUAL_TO_THRESHOLD,
+                treat_missing_data=cloudwatch.TreatMissingData.NOT_BREACHING,
+                alarm_description="The GPU host has been below 1% CPU for an hour without ComfyUI activity metrics",
+            )
+            cpu_scaling_action = autoscaling.StepScalingAction(
+                scope,
+                "CpuScalingAction",
+                auto_scaling_group=auto_scaling_group,
+                adjustment_type=autoscaling.AdjustmentType.CHANGE_IN_CAPACITY,
+                cooldown=Duration.seconds(120)
+            )
+            cpu_scaling_action.add_adjustment(
+                adjustment=-1,
+                lower_bound=0
+            )
+            cpu_alarm.add_alarm_action(
+                cw_actions.AutoScalingAction(cpu_scaling_action)
+            )
+
         # Scheduled Scaling:
         # (default) set desired capacity to 0 after work hour and 1 on start of work hour (only mon-fri)
         # Use TZ identifier for timezone https://en.wikipedia.org/wiki/List_of_tz_database_time_zones
-        if schedule_auto_scaling:
+        if schedule_auto_scaling and max_workers == 1:
             # Create a scheduled action to set the desired capacity to 0
             after_work_hours_action = autoscaling.ScheduledAction(
                 scope,
@@ -242,6 +564,60 @@ class AsgConstruct(Construct):
                 targets=[events_targets.LambdaFunction(asg_monitor_lambda)]
             )
 
+        # Spot Fallback:
+        # After spot_fallback_failures failed launches within the window, launch
+        # on-demand instances (or add spot_fallback_instance_types) for
+        # spot_fallback_minutes, then revert to the configured Spot pools
+        if spot_fallback_failures:
+            spot_fallback_lambda = lambda_.Function(
+                self, "SpotFallbackLambda",
+                runtime=lambda_.Runtime.PYTHON_3_12,
+                handler="spot_fallback.handler",
+                code=lambda_.Code.from_asset(
+                    "./comfyui_aws_stack/lambda/monitor_lambda"),
+                environment={
+                    "ASG_NAME": auto_scaling_group.auto_scaling_group_name,
+                    "FALLBACK_FAILURES": str(spot_fallback_failures),
+                    "FALLBACK_WINDOW_MINUTES": str(spot_fallback_window_minutes),
+                    "FALLBACK_MINUTES": str(spot_fallback_minutes),
+                    "FALLBACK_INSTANCE_TYPES": ",".join(spot_fallback_instance_types or []),
+                    **({"SNS_TOPIC_ARN": asg_events_topic.topic_arn} if asg_events_topic else {}),
+                },
+                timeout=Duration.seconds(30)
+            )
+            if asg_events_topic:
+                asg_events_topic.grant_publish(spot_fallback_lambda)
+            spot_fallback_lambda.add_to_role_policy(
+                iam.PolicyStatement(
+                    actions=["autoscaling:DescribeScalingActivities",
+                             "autoscaling:DescribeAutoScalingGroups",
+                             "autoscaling:UpdateAutoScalingGroup",
+                             "autoscaling:CreateOrUpdateTags",
+                             "autoscaling:DeleteTags",
+                             # Validated when the launch template overrides change
+                             "ec2:RunInstances",
+                             "ec2:CreateTags",
+                             "ec2:DescribeLaunchTemplateVersions"],
+                    resources=["*"]
+                )
+            )
+            ec2_role.grant_pass_role(spot_fallback_lambda)
+
+            events.Rule(
+                self, "SpotFallbackRule",
+                event_pattern=events.EventPattern(
+                    source=["aws.autoscaling"],
+                    detail_type=["EC2 Instance Launch Unsuccessful"],
+                    resources=[auto_scaling_group.auto_scaling_group_arn]
+                ),
+                targets=[events_targets.LambdaFunction(spot_fallback_lambda)]
+            )
+            events.Rule(
+                self, "SpotFallbackRevertRule",
+                schedule=events.Schedule.rate(Duration.minutes(5)),
+                targets=[events_targets.LambdaFunction(spot_fallback_lambda)]
+            )
+
         # Nag
 
         NagSuppressions.add_resource_suppressions(
@@ -292,3 +668,23 @@ class AsgConstruct(Construct):
 
         self.auto_scaling_group = auto_scaling_group
         self.asg_events_topic = asg_events_topic
+        self.warm_pool = warm_pool
+        self._ec2_role = ec2_role
+        self._user_data_script = user_data_script
+
+    def grant_image_pull(self, docker_image_asset: ecr_assets.DockerImageAsset):
+        docker_image_asset.repository.grant_pull(self._ec2_role)
+
+    def add_warm_pool_image(self, docker_image_asset: ecr_assets.DockerImageAsset, image_uri: str = None):
+        # Pull the image during warm-up, then release the launch hook so the
+        # instance is stopped (or put in service on a cold launch)
+        self.grant_image_pull(docker_image_asset)
+        registry = Fn.select(0, Fn.split("/", docker_image_asset.repository.repository_uri))
+        self._user_data_script.add_commands(f"""
+            TARGET_STATE=$(curl -s http://169.254.169.254/latest/meta-data/autoscaling/target-lifecycle-state)
+            if [[ "$TARGET_STATE" == Warmed:* ]]; then
+                aws ecr get-login-password --region $REGION | docker login --username AWS --password-stdin {registry}
+                docker pull {image_uri or docker_image_asset.image_uri}
+            fi
+            {WARM_POOL_HOOK_SCRIPT}
+        """)
@@ -0,0 +1,207 @@
+from aws_cdk import (
+    aws_certificatemanager as acm,
+    aws_cloudfront as cloudfront,
+    aws_cloudfront_origins as origins,
+    aws_route53 as route53,
+    aws_route53_targets as route53_targets,
+    Duration,
+    Environment,
+    Stack,
+    Token,
+)
+from constructs import Construct
+from cdk_nag import NagSuppressions
+
+# ALB session cookies, sharded when the session is large
+ALB_SESSION_COOKIES = ["AWSELBAuthSessionCookie-0", "AWSELBAuthSessionCookie-1"]
+
+# Viewer address set by CloudFront on every request, for the rate limiting
+# of the ALB WAF (X-Forwarded-For starts with whatever the client sent)
+VIEWER_IP_HEADER = "x-viewer-ip"
+
+VIEWER_IP_FUNCTION = f"""
+function handler(event) {{
+    event.request.headers['{VIEWER_IP_HEADER}'] = {{value: event.viewer.ip}};
+    return event.request;
+}}
+"""
+
+
+class CdnConstruct(Construct):
+    distribution: cloudfront.Distribution
+
+    def __init__(
+            self,
+            scope: Construct,
+            construct_id: str,
+            host_name: str,
+            domain_name: str,
+            hosted_zone: route53.IHostedZone,
+            origin_dns_name: str,
+            **kwargs) -> None:
+        super().__init__(scope, construct_id, **kwargs)
+
+        application_dns_name = f"{host_name}.{domain_name}"
+
+        # CloudFront certificates must be in us-east-1. In other regions the
+        # certificate is in a us-east-1 stack, referenced across regions
+        # (the stack is created with cross_region_references).
+        stack = Stack.of(scope)
+        if Token.is_unresolved(stack.region):
+            raise ValueError(
+                "cdn requires the region of the stack (env): the certificate of the distribution must be in us-east-1")
+        certificate_scope = scope
+        if stack.region != "us-east-1":
+            certificate_scope = Stack(
+                stack.node.scope,
+                f"{stack.node.id}CdnCertificate",
+                env=Environment(account=stack.account, region="us-east-1"),
+                cross_region_references=True,
+            )
+            hosted_zone = route53.HostedZone.from_hosted_zone_attributes(
+                certificate_scope,
+                "HostedZone",
+                hosted_zone_id=hosted_zone.hosted_zone_id,
+                zone_name=hosted_zone.zone_name,
+            )
+            NagSuppressions.add_stack_suppressions(certificate_scope, suppressions=[
+                {"id": "AwsSolutions-L1",
+                 "reason": "Lambda runtime of the cross-region reference provider is managed by the CDK"},
+                {"id": "AwsSolutions-IAM4",
+                 "reason": "The cross-region reference provider uses the managed Lambda execution policy"},
+                {"id": "AwsSolutions-IAM5",
+                 "reason": "The cross-region reference provider manages SSM parameters under a prefix"},
+            ])
+        certificate = acm.Certificate(
+            certificate_scope,
+            "CdnCertificate",
+            domain_name=application_dns_name,
+            validation=acm.CertificateValidation.from_dns(hosted_zone),
+        )
+
+        # The ALB authenticates with Cognito on the application name, and
+        # its certificate covers both names
+        origin = origins.HttpOrigin(
+            origin_dns_name,
+            protocol_policy=cloudfront.OriginProtocolPolicy.HTTPS_ONLY,
+            origin_ssl_protocols=[cloudfront.OriginSslPolicy.TLS_V1_2],
+        )
+
+        # Frontend bundles have content hashes in their names. The ALB
+        # authenticates them like every other path, so the session is part
+        # of the key: a user only hits the bundles they were served.
+        static_assets_cache_policy = cloudfront.CachePolicy(
+            scope,
+            "StaticAssetsCachePolicy",
+            default_ttl=Duration.days(365),
+            max_ttl=Duration.days(365),
+            min_ttl=Duration.seconds(0),
+            query_string_behavior=cloudfront.CacheQueryStringBehavior.none(),
+            cookie_behavior=cloudfront.CacheCookieBehavior.allow_list(
+                *ALB_SESSION_COOKIES),
+            header_behavior=cloudfront.CacheHeaderBehavior.none(),
+            enable_accept_encoding_gzip=True,
+            enable_accept_encoding_brotli=True,
+        )
+
+        # /view files are private: the session is part of the key, so a
+        # user only hits the files they already fetched. Only responses
+        # with a Cache-Control max-age are cached (the output offload
+        # redirects): temp and input previews reuse their file names.
+        view_cache_policy = cloudfront.CachePolicy(
+            scope,
+            "ViewCachePolicy",
+            default_ttl=Duration.seconds(0),
+            max_ttl=Duration.days(7),
+            min_ttl=Duration.seconds(0),
+            query_string_behavior=cloudfront.CacheQueryStringBehavior.all(),
+            cookie_behavior=cloudfront.CacheCookieBehavior.allow_list(
+                *ALB_SESSION_COOKIES),
+            header_behavior=cloudfront.CacheHeaderBehavior.none(),
+            enable_accept_encoding_gzip=True,
+            enable_accept_encoding_brotli=True,
+        )
+
+        # On every behavior, so that no request reaches the ALB with the
+        # header set by the client
+        viewer_ip_function = cloudfront.Function(
+            scope,
+            "ViewerIpFunction",
+            code=cloudfront.FunctionCode.from_inline(VIEWER_IP_FUNCTION),
+            runtime=cloudfront.FunctionRuntime.JS_2_0,
+        )
+        function_associations = [
+            cloudfront.FunctionAssociation(
+                function=viewer_ip_function,
+                event_type=cloudfront.FunctionEventType.VIEWER_REQUEST,
+            ),
+        ]
+
+        view_behavior = cloudfront.BehaviorOptions(
+            origin=origin,
+            viewer_protocol_policy=cloudfront.ViewerProtocolPolicy.REDIRECT_TO_HTTPS,
+            cache_policy=view_cache_policy,
+            origin_request_policy=cloudfront.OriginRequestPolicy.ALL_VIEWER,
+            function_associations=function_associations,
+        )
+
+        distribution = cloudfront.Distribution(
+            scope,
+            "Distribution",
+            domain_names=[application_dns_name],
+            certificate=certificate,
+            minimum_protocol_version=cloudfront.SecurityPolicyProtocol.TLS_V1_2_2021,
+            http_version=cloudfront.HttpVersion.HTTP2_AND_3,
+            # Everything else, including the API and the websocket, is
+            # passed through with the Cognito session
+            default_behavior=cloudfront.BehaviorOptions(
+                origin=origin,
+                viewer_protocol_policy=cloudfront.ViewerProtocolPolicy.REDIRECT_TO_HTTPS,
+                allowed_methods=cloudfront.AllowedMethods.ALLOW_ALL,
+                cache_policy=cloudfront.CachePolicy.CACHING_DISABLED,
+                origin_request_policy=cloudfront.OriginRequestPolicy.ALL_VIEWER,
+                function_associations=function_associations,
+            ),
+            additional_behaviors={
+                "/assets/*": cloudfront.BehaviorOptions(
+                    origin=origin,
+                    viewer_protocol_policy=cloudfront.ViewerProtocolPolicy.REDIRECT_TO_HTTPS,
+                    cache_policy=static_assets_cache_policy,
+                    origin_request_policy=cloudfront.OriginRequestPolicy.ALL_VIEWER,
+                    function_associations=function_associations,
+                ),
+                "/view": view_behavior,
+                "/api/view": view_behavior,
+            },
+        )
+
+        route53.ARecord(
+            scope,
+            "AliasRecord",
+            zone=hosted_zone,
+            target=route53.RecordTarget.from_alias(
+                route53_targets.CloudFrontTarget(distribution)
+            ),
+            record_name=application_dns_name,
+        )
+
+        # Nag
+
+        NagSuppressions.add_resource_suppressions(
+            distribution,
+            suppressions=[
+                {"id": "AwsSolutions-CFR1",
+                 "reason": "Access is restricted by Cognito authentication, and by the ALB WAF when configured"
+                 },
+                {"id": "AwsSolutions-CFR2",
+                 "reason": "The WAF is associated with the ALB, which only accepts CloudFront"
+                 },
+                {"id": "AwsSolutions-CFR3",
+                 "reason": "Adding access logs requires extra S3 bucket so removing it for sample purposes."
+                 },
+            ]
+        )
+
+        # Output
+
+        self.distribution = distribution
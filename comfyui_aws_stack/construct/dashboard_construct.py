@@ -0,0 +1,132 @@
+from aws_cdk import (
+    aws_autoscaling as autoscaling,
+    aws_cloudwatch as cloudwatch,
+    aws_ecs as ecs,
+    Duration,
+)
+from constructs import Construct
+
+
+class DashboardConstruct(Construct):
+    dashboard: cloudwatch.Dashboard
+
+    def __init__(
+            self,
+            scope: Construct,
+            construct_id: str,
+            auto_scaling_group: autoscaling.AutoScalingGroup,
+            cluster: ecs.Cluster,
+            service: ecs.IService,
+            **kwargs) -> None:
+        super().__init__(scope, construct_id, **kwargs)
+
+        asg_name = auto_scaling_group.auto_scaling_group_name
+
+        def gpu_graph(title, metric_name, statistic="Maximum", left_y_axis=None):
+            # One line per instance and GPU, whichever instances are running
+            return cloudwatch.GraphWidget(
+                title=title,
+                width=12,
+                left=[cloudwatch.MathExpression(
+                    expression=f"SEARCH('{{ComfyUI/GPU,AutoScalingGroupName,InstanceId,InstanceType,GPU}} "
+                               f"MetricName=\"{metric_name}\" AutoScalingGroupName=\"{asg_name}\"', "
+                               f"'{statistic}', 10)",
+                    label="",
+                    period=Duration.seconds(10),
+                )],
+                left_y_axis=left_y_axis,
+            )
+
+        def activity_metric(metric_name, statistic="Maximum"):
+            return cloudwatch.Metric(
+                namespace="ComfyUI/Activity",
+                metric_name=metric_name,
+                dimensions_map={"AutoScalingGroupName": asg_name},
+                statistic=statistic,
+                period=Duration.minutes(1),
+            )
+
+        percent_axis = cloudwatch.YAxisProps(min=0, max=100)
+
+        dashboard = cloudwatch.Dashboard(
+            self, "Dashboard",
+            widgets=[
+                [
+                    cloudwatch.TextWidget(
+                        markdown="## GPU\nPer instance and GPU, sampled every 10 seconds. "
+                                 "VRAM used close to the total together with low GPU utilization "
+                                 "points to models being swapped in and out of VRAM.",
+                        width=24,
+                        height=2,
+                    ),
+                ],
+                [
+                    gpu_graph("GPU utilization (%)", "GPUUtilization",
+                              left_y_axis=percent_axis),
+                    gpu_graph("GPU memory controller utilization (%)", "GPUMemoryUtilization",
+                              left_y_axis=percent_axis),
+                ],
+                [
+                    gpu_graph("VRAM used (MiB)", "VRAMUsed"),
+                    gpu_graph("VRAM free (MiB)", "VRAMFree", statistic="Minimum"),
+                ],
+                [
+                    gpu_graph("GPU temperature (C)", "GPUTemperature"),
+                    gpu_graph("Power draw (W)", "PowerDraw"),
+                ],
+                [
+                    gpu_graph("SM clock (MHz)", "SMClock"),
+                    gpu_graph("Memory clock (MHz)", "MemoryClock"),
+                ],
+                [
+                    cloudwatch.TextWidget(
+                        markdown="## ComfyUI",
+                        width=24,
+                        height=1,
+                    ),
+                ],
+                [
+                    cloudwatch.GraphWidget(
+                        title="Queue",
+                        width=12,
+                        left=[activity_metric("QueueRunning"),
+                              activity_metric("QueuePending")],
+                    ),
+                    cloudwatch.GraphWidget(
+                        title="Idle time (s)",
+                        width=12,
+                        left=[activity_metric("IdleSeconds", statistic="Minimum")],
+                    ),
+                ],
+                [
+                    cloudwatch.GraphWidget(
+                        title="Scale-up time (s)",
+                        width=12,
+                        left=[cloudwatch.Metric(
+                            namespace="ComfyUI/ScaleUp",
+                            metric_name=metric_name,
+                            statistic="Maximum",
+                            period=Duration.hours(1),
+                        ) for metric_name in ["TimeToReady", "Ec2Launch", "ImagePull", "EcsHealthCheck"]],
+                    ),
+                    cloudwatch.GraphWidget(
+                        title="Running ComfyUI tasks",
+                        width=12,
+                        left=[cloudwatch.Metric(
+                            namespace="ECS/ContainerInsights",
+                            metric_name="RunningTaskCount",
+                            dimensions_map={
+                                "ClusterName": cluster.cluster_name,
+                                "ServiceName": service.service_name
+                            },
+                            statistic="Maximum",
+                            period=Duration.minutes(1),
+                        )],
+                    ),
+                ],
+            ],
+        )
+
+        # Output
+
+        self.dashboard = dashboard
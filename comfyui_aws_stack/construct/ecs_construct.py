@@ -16,19 +16,69 @@ from aws_cdk import (
     aws_events as events,
     aws_events_targets as events_targets,
     aws_kms as kms,
+    aws_s3 as s3,
     Duration,
     RemovalPolicy,
     Size,
+    Stack,
 )
 from constructs import Construct
 from cdk_nag import NagSuppressions
 
+from comfyui_aws_stack.construct.asg_construct import MODEL_CACHE_HOST_PATH, MODEL_STORE_HOST_PATH
+from comfyui_aws_stack.construct.soci_index_construct import SociIndexConstruct
+from comfyui_aws_stack.instance_capabilities import task_settings
+
+# Persistent data of ComfyUI (models, custom_nodes, user, input, output),
+# where the EBS volume is mounted. The ComfyUI code comes from the image.
+COMFYUI_DATA_DIR = "/home/user/opt/data"
+# Model cache directory in the ComfyUI container
+MODEL_CACHE_DIR = "/opt/model-cache"
+
+# Where the models are stored: on the rexray EBS volume (COMFYUI_DATA_DIR),
+# or in S3 mounted read-only at MODEL_STORE_DIR (see extra_model_paths_s3.yaml)
+MODEL_STORES = ("ebs", "s3")
+MODEL_STORE_DIR = "/home/user/opt/model_store"
+MODEL_STORE_PATHS_CONFIG = "/home/user/opt/config/extra_model_paths_s3.yaml"
+
+# Model index on the EBS volume (see docker/model_index)
+MODEL_INDEX_PATH = COMFYUI_DATA_DIR + "/models/.model-index.json"
+
+# Lock, wheelhouse and environment of the custom node requirements on the
+# EBS volume (see docker/node_deps)
+NODE_DEPS_DIR = COMFYUI_DATA_DIR + "/.node-deps"
+
+# Metrics of the model load profiler events (see docker/model_profiler):
+# name, filter pattern, value, unit
+MODEL_LOAD_METRICS = [
+    ("ModelLoadSeconds", '{ $.event = "model_load" }',
+     "$.load_seconds", cloudwatch.Unit.SECONDS),
+    ("ModelDeserializeSeconds", '{ $.event = "model_load" }',
+     "$.deserialize_seconds", cloudwatch.Unit.SECONDS),
+    ("ModelReadThroughput", '{ $.event = "model_load" && $.page_cache_hit = 0 }',
+     "$.read_mib_per_second", None),
+    ("ModelPageCacheHit", '{ $.event = "model_load" }',
+     "$.page_cache_hit", None),
+    ("ModelTransferSeconds", '{ $.event = "model_transfer" && $.loaded > 0 }',
+     "$.transfer_seconds", cloudwatch.Unit.SECONDS),
+    ("ModelVramHit", '{ $.event = "model_transfer" }',
+     "$.vram_hit", None),
+]
+
+# ComfyUI output directory, and where the output offload sidecar sees it
+COMFYUI_OUTPUT_DIR = COMFYUI_DATA_DIR + "/output"
+OFFLOAD_OUTPUT_DIR = "/data/output"
+
 
 class EcsConstruct(Construct):
     cluster: ecs.Cluster
     service: ecs.IService
     ecs_target_group: elbv2.ApplicationTargetGroup
     ecs_health_topic: sns.Topic
+    docker_image_asset: ecr_assets.DockerImageAsset
+    image_uri: str
+    log_group: logs.LogGroup
+    service_security_group: ec2.SecurityGroup
 
     def __init__(
             self,
@@ -45,9 +95,39 @@ class EcsConstruct(Construct):
             instance_types: list,
             slack_workspace_id: str = None,
             slack_channel_id: str = None,
+            gpu_metrics: bool = False,
+            max_workers: int = 1,
+            model_cache: bool = False,
+            download_models: bool = False,
+            model_store: str = "ebs",
+            model_index: bool = False,
+            model_profiler: bool = False,
+            custom_node_wheelhouse: bool = False,
+            output_bucket: s3.IBucket = None,
+            output_retention_hours: float = 168,
+            output_local_max_gb: float = 0,
+            soci_index: bool = False,
             **kwargs) -> None:
         super().__init__(scope, construct_id, **kwargs)
 
+        if model_store not in MODEL_STORES:
+            raise ValueError(
+                f"model_store must be one of {', '.join(MODEL_STORES)}")
+        if download_models and model_store != "ebs":
+            raise ValueError(
+                "download_models requires model_store='ebs': the S3 model store is read-only, upload the models to S3")
+        if model_index and model_store != "ebs":
+            raise ValueError(
+                "model_index requires model_store='ebs': the S3 model store is read-only")
+        if custom_node_wheelhouse and model_store != "ebs":
+            raise ValueError(
+                "custom_node_wheelhouse requires model_store='ebs': custom nodes only persist on the EBS volume")
+        # The rexray volume attaches to one instance at a time: a worker
+        # starting on another instance would preempt it from a running one
+        if max_workers > 1 and model_store != "s3":
+            raise ValueError(
+                "max_workers > 1 requires model_store='s3': the EBS volume attaches to one instance at a time")
+
         # Create an ECS Cluster
         cluster = ecs.Cluster(
             scope, "ComfyUICluster",
@@ -55,13 +135,17 @@ class EcsConstruct(Construct):
             container_insights=True
         )
 
+        # N-worker mode: the service task count is scaled and the capacity
+        # provider sizes the ASG to fit the tasks. Instances running a task
+        # are protected from scale-in.
+        multi_worker = max_workers > 1
+
         # Create ASG Capacity Provider for the ECS Cluster
         capacity_provider = ecs.AsgCapacityProvider(
             scope, "AsgCapacityProvider",
             auto_scaling_group=auto_scaling_group,
-            enable_managed_scaling=False,  # Enable managed scaling
-            # Disable managed termination protection
-            enable_managed_termination_protection=False,
+            enable_managed_scaling=multi_worker,
+            enable_managed_termination_protection=multi_worker,
             target_capacity_percent=100
         )
 
@@ -88,6 +172,18 @@ class EcsConstruct(Construct):
             network_mode=ecr_assets.NetworkMode.custom(
                 "sagemaker") if is_sagemaker_studio else None
         )
+        image_tag = docker_image_asset.image_tag
+        image_uri = docker_image_asset.image_uri
+
+        # Lazy loading: the task runs the SOCI-enabled image, which hosts
+        # with the SOCI snapshotter start before its layers are fetched
+        soci_index_construct = SociIndexConstruct(
+            scope, "SociIndexConstruct",
+            docker_image_asset=docker_image_asset,
+        ) if soci_index else None
+        if soci_index_construct:
+            image_tag = soci_index_construct.image_tag
+            image_uri = soci_index_construct.image_uri
 
         # CloudWatch Logs Group
         log_group = logs.LogGroup(
@@ -110,40 +206,68 @@ class EcsConstruct(Construct):
             )
         )
 
+        # Per instance type ComfyUI settings written by the ASG user data
+        settings_volume = ecs.Volume(
+            name="ComfyUISettings",
+            host=ecs.Host(source_path="/etc/comfyui"),
+        )
+
+        # The S3 model store does not need the EBS volume, the data folders
+        # are in the container and the task does not wait for the volume
+        # attachment
+        if model_store == "s3":
+            model_store_volume = ecs.Volume(
+                name="ModelStore",
+                host=ecs.Host(source_path=MODEL_STORE_HOST_PATH),
+            )
+            volumes = [model_store_volume, settings_volume]
+        else:
+            volumes = [volume, settings_volume]
+        if output_bucket and model_store == "s3":
+            # No EBS volume, share the output directory with the offload
+            # sidecar
+            output_volume = ecs.Volume(name="ComfyUIOutput")
+            volumes.append(output_volume)
+        if model_cache:
+            # NVMe instance store mounted by the ASG user data
+            model_cache_volume = ecs.Volume(
+                name="ModelCache",
+                host=ecs.Host(source_path=MODEL_CACHE_HOST_PATH),
+            )
+            volumes.append(model_cache_volume)
+
         task_definition = ecs.Ec2TaskDefinition(
             scope,
             "TaskDef",
             network_mode=ecs.NetworkMode.AWS_VPC,
             task_role=task_exec_role,
             execution_role=task_exec_role,
-            volumes=[volume]
+            volumes=volumes
         )
+        if soci_index_construct:
+            # The task definition references the image once it is pushed
+            task_definition.node.add_dependency(soci_index_construct.index_build)
+
+        # Memory reservation and swap from the instance capability table
+        # (instance_types.json): the reservation fits one task per GPU on
+        # the smallest instance type, the swap is backed by the host swap file
+        settings = task_settings(instance_types)
+        memory_reservation = settings["memory_reservation_mib"]
 
         # Linux parameters for swap configuration
         linux_parameters = ecs.LinuxParameters(
             self,
             "LinuxParameters",
-            max_swap=Size.mebibytes(10240),  # 10GB swap memory (10 * 1024 MiB)
+            max_swap=Size.mebibytes(settings["max_swap_mib"]),
             swappiness=60    # Default swappiness value
         )
 
-        # Determine memory reservation based on instance types
-        # Get max memory from instance types (simplified mapping)
-        instance_memory_map = {
-            "g4dn.xlarge": 16384, "g4dn.2xlarge": 32768, "g4dn.4xlarge": 65536,
-            "g5.xlarge": 16384, "g5.2xlarge": 32768, "g5.4xlarge": 65536,
-            "g6.xlarge": 16384, "g6.2xlarge": 32768, "g6.4xlarge": 65536,
-            "g6e.xlarge": 32768, "g6e.2xlarge": 65536, "g6e.4xlarge": 131072,
-        }
-        max_memory = min([instance_memory_map.get(it, 16384) for it in instance_types])
-        memory_reservation = int(max_memory * 0.9)  # Use 90% of available memory
-
         # Add container to the task definition
         container = task_definition.add_container(
             "ComfyUIContainer",
             image=ecs.ContainerImage.from_ecr_repository(
                 docker_image_asset.repository,
-                docker_image_asset.image_tag
+                image_tag
             ),
             gpu_count=1,
             memory_reservation_mib=memory_reservation,
@@ -165,13 +289,75 @@ class EcsConstruct(Construct):
                 # Add other env variables here
             }
         )
+        if download_models:
+            # Download the models of comfyui_config/models.json at start
+            container.add_environment("DOWNLOAD_MODELS", "true")
+        if model_index:
+            # Hash and deduplicate the models at start, list the model
+            # folders from the index
+            container.add_environment("MODEL_INDEX_PATH", MODEL_INDEX_PATH)
+        if custom_node_wheelhouse:
+            # Install the custom node requirements offline from the volume,
+            # resolve them again only when they change
+            container.add_environment("NODE_DEPS_DIR", NODE_DEPS_DIR)
+        if model_profiler:
+            # Log the load time of every model file and GPU transfer
+            container.add_environment("MODEL_PROFILER", "true")
+            for metric_name, pattern, value, unit in MODEL_LOAD_METRICS:
+                logs.MetricFilter(
+                    scope,
+                    metric_name + "Filter",
+                    log_group=log_group,
+                    filter_pattern=logs.FilterPattern.literal(pattern),
+                    metric_namespace="ComfyUI/ModelLoad",
+                    metric_name=metric_name,
+                    metric_value=value,
+                    unit=unit,
+                    dimensions={"Source": "$.source"} if "model_load" in pattern else None,
+                )
+        if model_cache:
+            container.add_environment("MODEL_CACHE_DIR", MODEL_CACHE_DIR)
+            container.add_mount_points(
+                ecs.MountPoint(
+                    container_path=MODEL_CACHE_DIR,
+                    source_volume=model_cache_volume.name,
+                    read_only=False
+                )
+            )
+
+        if model_store == "s3":
+            container.add_environment("MODEL_PATHS_CONFIG", MODEL_STORE_PATHS_CONFIG)
+            container.add_mount_points(
+                ecs.MountPoint(
+                    container_path=MODEL_STORE_DIR,
+                    source_volume=model_store_volume.name,
+                    read_only=True
+                )
+            )
+        else:
+            # Mount the host volume to the container
+            container.add_mount_points(
+                ecs.MountPoint(
+                    container_path=COMFYUI_DATA_DIR,
+                    source_volume=volume.name,
+                    read_only=False
+                )
+            )
+
+        if output_bucket and model_store == "s3":
+            container.add_mount_points(
+                ecs.MountPoint(
+                    container_path=COMFYUI_OUTPUT_DIR,
+                    source_volume=output_volume.name,
+                    read_only=False
+                )
+            )
 
-        # Mount the host volume to the container
         container.add_mount_points(
             ecs.MountPoint(
-                container_path="/home/user/opt/ComfyUI",
-                source_volume=volume.name,
-                read_only=False
+                container_path="/etc/comfyui",
+                source_volume=settings_volume.name,
+                read_only=True
             )
         )
 
@@ -186,6 +372,100 @@ class EcsConstruct(Construct):
             )
         )
 
+        # Activity metrics sidecar: shares the task network namespace and
+        # publishes queue depth and idle time for the idle scale-in alarm
+        metrics_image_asset = ecr_assets.DockerImageAsset(
+            scope,
+            "MetricsImage",
+            directory="comfyui_aws_stack/metrics",
+            platform=ecr_assets.Platform.LINUX_AMD64,
+            network_mode=ecr_assets.NetworkMode.custom(
+                "sagemaker") if is_sagemaker_studio else None
+        )
+        task_definition.add_container(
+            "MetricsContainer",
+            image=ecs.ContainerImage.from_docker_image_asset(
+                metrics_image_asset),
+            # ComfyUI keeps serving if the publisher fails
+            essential=False,
+            memory_reservation_mib=64,
+            logging=ecs.LogDriver.aws_logs(
+                stream_prefix="comfy-ui-metrics", log_group=log_group),
+            environment={
+                "ASG_NAME": auto_scaling_group.auto_scaling_group_name,
+                "COMFYUI_URL": "http://localhost:8181",
+                # Protect the task from service scale-in while it is busy
+                "TASK_PROTECTION": "true" if multi_worker else "false",
+            }
+        )
+        task_exec_role.add_to_policy(
+            iam.PolicyStatement(
+                actions=["cloudwatch:PutMetricData"],
+                resources=["*"],
+                conditions={
+                    "StringEquals": {"cloudwatch:namespace": "ComfyUI/Activity"}
+                }
+            )
+        )
+        if multi_worker:
+            task_exec_role.add_to_policy(
+                iam.PolicyStatement(
+                    actions=["ecs:UpdateTaskProtection",
+                             "ecs:GetTaskProtection"],
+                    resources=[Stack.of(self).format_arn(
+                        service="ecs",
+                        resource="task",
+                        resource_name=f"{cluster.cluster_name}/*",
+                    )]
+                )
+            )
+
+        # Output offload sidecar: uploads new outputs to S3 and keeps the
+        # local output directory within its retention and size budget
+        if output_bucket:
+            output_offload_image_asset = ecr_assets.DockerImageAsset(
+                scope,
+                "OutputOffloadImage",
+                directory="comfyui_aws_stack/output_offload",
+                platform=ecr_assets.Platform.LINUX_AMD64,
+                network_mode=ecr_assets.NetworkMode.custom(
+                    "sagemaker") if is_sagemaker_studio else None
+            )
+            output_offload_container = task_definition.add_container(
+                "OutputOffloadContainer",
+                image=ecs.ContainerImage.from_docker_image_asset(
+                    output_offload_image_asset),
+                # ComfyUI keeps serving if the offload fails
+                essential=False,
+                memory_reservation_mib=256,
+                logging=ecs.LogDriver.aws_logs(
+                    stream_prefix="comfy-ui-output-offload", log_group=log_group),
+                environment={
+                    "OUTPUT_BUCKET_NAME": output_bucket.bucket_name,
+                    "OUTPUT_DIR": OFFLOAD_OUTPUT_DIR,
+                    "OUTPUT_RETENTION_HOURS": str(output_retention_hours),
+                    "OUTPUT_LOCAL_MAX_GB": str(output_local_max_gb),
+                }
+            )
+            if model_store == "s3":
+                output_offload_container.add_mount_points(
+                    ecs.MountPoint(
+                        container_path=OFFLOAD_OUTPUT_DIR,
+                        source_volume=output_volume.name,
+                        read_only=False
+                    )
+                )
+            else:
+                # output of the EBS volume
+                output_offload_container.add_mount_points(
+                    ecs.MountPoint(
+                        container_path="/data",
+                        source_volume=volume.name,
+                        read_only=False
+                    )
+                )
+            output_bucket.grant_read_write(task_exec_role)
+
         # Create ECS Service Security Group
         service_security_group = ec2.SecurityGroup(
             scope,
@@ -219,6 +499,64 @@ class EcsConstruct(Construct):
             min_healthy_percent=0,
         )
 
+        # GPU metrics daemon: one task per container instance, sampling the
+        # host GPUs with nvidia-smi. It does not reserve the GPU used by
+        # ComfyUI, NVIDIA_VISIBLE_DEVICES exposes it through the NVIDIA
+        # runtime instead. Host networking is needed to read the instance
+        # identity from IMDS.
+        if gpu_metrics:
+            gpu_metrics_task_role = iam.Role(
+                scope,
+                "GpuMetricsTaskRole",
+                assumed_by=iam.ServicePrincipal("ecs-tasks.amazonaws.com"),
+            )
+            gpu_metrics_task_role.add_to_policy(
+                iam.PolicyStatement(
+                    actions=["cloudwatch:PutMetricData"],
+                    resources=["*"],
+                    conditions={
+                        "StringEquals": {"cloudwatch:namespace": "ComfyUI/GPU"}
+                    }
+                )
+            )
+            gpu_metrics_task_definition = ecs.Ec2TaskDefinition(
+                scope,
+                "GpuMetricsTaskDef",
+                network_mode=ecs.NetworkMode.HOST,
+                task_role=gpu_metrics_task_role,
+            )
+            gpu_metrics_task_definition.add_container(
+                "GpuMetricsContainer",
+                image=ecs.ContainerImage.from_docker_image_asset(
+                    metrics_image_asset),
+                command=["python", "gpu_metrics.py"],
+                memory_reservation_mib=64,
+                logging=ecs.LogDriver.aws_logs(
+                    stream_prefix="gpu-metrics", log_group=log_group),
+                environment={
+                    "ASG_NAME": auto_scaling_group.auto_scaling_group_name,
+                    "NVIDIA_VISIBLE_DEVICES": "all",
+                    "NVIDIA_DRIVER_CAPABILITIES": "utility",
+                }
+            )
+            ecs.Ec2Service(
+                scope,
+                "GpuMetricsService",
+                cluster=cluster,
+                task_definition=gpu_metrics_task_definition,
+                daemon=True,
+            )
+
+            NagSuppressions.add_resource_suppressions(
+                [gpu_metrics_task_definition],
+                suppressions=[
+                    {"id": "AwsSolutions-ECS2",
+                     "reason": "Environment variables only hold the ASG name and NVIDIA runtime settings."
+                     },
+                ],
+                apply_to_children=True
+            )
+
         # Add target groups for ECS service
         ecs_target_group = elbv2.ApplicationTargetGroup(
             scope,
@@ -231,6 +569,9 @@ class EcsConstruct(Construct):
                 service.load_balancer_target(
                     container_name=container.container_name, container_port=8181
                 )],
+            # Keep a user's websocket and prompts on the same worker
+            stickiness_cookie_duration=Duration.hours(
+                1) if multi_worker else None,
             health_check=elbv2.HealthCheck(
                 enabled=True,
                 path="/system_stats",
@@ -371,3 +712,7 @@ class EcsConstruct(Construct):
         self.service = service
         self.ecs_target_group = ecs_target_group
         self.ecs_health_topic = ecs_health_topic
+        self.docker_image_asset = docker_image_asset
+        self.image_uri = image_uri
+        self.log_group = log_group
+        self.service_security_group = service_security_group
@@ -0,0 +1,312 @@
+import hashlib
+import textwrap
+
+from aws_cdk import (
+    aws_ec2 as ec2,
+    aws_ecr_assets as ecr_assets,
+    aws_events as events,
+    aws_events_targets as events_targets,
+    aws_iam as iam,
+    aws_imagebuilder as imagebuilder,
+    aws_lambda as lambda_,
+    aws_ssm as ssm,
+    Duration,
+)
+from constructs import Construct
+
+# Parent image: the newest ECS-optimized GPU AMI at every build
+ECS_GPU_AMI_PARAMETER = "/aws/service/ecs/optimized-ami/amazon-linux-2/gpu/recommended/image_id"
+
+# Weekly rebuild on the newest parent AMI (Image Builder cron, in UTC)
+GOLDEN_AMI_SCHEDULE = "cron(0 3 ? * sun *)"
+
+# Pipeline AMIs kept, the older ones are deregistered with their snapshots
+GOLDEN_AMI_KEEP = 3
+
+# Tag of the AMIs of a stack, the value is the AMI parameter name
+GOLDEN_AMI_TAG = "ComfyUIGoldenAmi"
+
+# The build needs no GPU: the NVIDIA settings run at boot
+BUILD_INSTANCE_TYPES = ["m5.xlarge", "m6i.xlarge"]
+
+# Host setup baked into the AMI. Everything the launch template user data
+# would otherwise do on every boot before the ECS agent starts.
+HOST_COMPONENT = textwrap.dedent("""
+    name: ComfyUIHost
+    description: rexray EBS plugin, NVIDIA settings, ECS agent settings and the ComfyUI image
+    schemaVersion: 1.0
+    parameters:
+      - Region:
+          type: string
+      - ImageUri:
+          type: string
+    phases:
+      - name: build
+        steps:
+          - name: RexrayPlugin
+            action: ExecuteBash
+            inputs:
+              commands:
+                - docker plugin install public.ecr.aws/j1l5j1d1/rexray-ebs --grant-all-permissions REXRAY_PREEMPT=true EBS_REGION={{ Region }}
+          - name: NvidiaSettings
+            action: ExecuteBash
+            inputs:
+              commands:
+                - |
+                  cat > /usr/local/bin/nvidia-gpu-settings.sh <<'EOF'
+                  #!/bin/bash
+                  # Keep the driver initialized between containers and run the
+                  # GPUs at their maximum application clocks (where supported)
+                  nvidia-smi -pm 1
+                  nvidia-smi --query-gpu=index,clocks.max.memory,clocks.max.graphics --format=csv,noheader,nounits |
+                  while IFS=', ' read INDEX MEMORY GRAPHICS; do
+                      nvidia-smi -i $INDEX -ac $MEMORY,$GRAPHICS || true
+                  done
+                  EOF
+                  chmod +x /usr/local/bin/nvidia-gpu-settings.sh
+                  cat > /etc/systemd/system/nvidia-gpu-settings.service <<'EOF'
+                  [Unit]
+                  Description=NVIDIA persistence mode and application clocks
+                  Before=docker.service ecs.service
+
+                  [Service]
+                  Type=oneshot
+                  ExecStart=/usr/local/bin/nvidia-gpu-settings.sh
+
+                  [Install]
+                  WantedBy=multi-user.target
+                  EOF
+                  systemctl enable nvidia-gpu-settings
+          - name: EcsAgentSettings
+            action: ExecuteBash
+            inputs:
+              commands:
+                - echo "ECS_IMAGE_PULL_BEHAVIOR=prefer-cached" >> /etc/ecs/ecs.config
+          - name: ComfyUIImage
+            action: ExecuteBash
+            inputs:
+              commands:
+                - |
+                  IMAGE_URI={{ ImageUri }}
+                  command -v aws || yum install -y awscli
+                  aws ecr get-login-password --region {{ Region }} | docker login --username AWS --password-stdin ${IMAGE_URI%%/*}
+                  docker pull $IMAGE_URI
+                  docker logout ${IMAGE_URI%%/*}
+          - name: Cleanup
+            action: ExecuteBash
+            inputs:
+              commands:
+                - |
+                  # The agent registers with the cluster of the launch template
+                  # user data on the first boot of an instance
+                  systemctl stop ecs || true
+                  rm -rf /var/lib/ecs/data/* /var/log/ecs/*
+    """)
+
+
+class GoldenAmiConstruct(Construct):
+    ami_parameter: ssm.StringParameter
+    image_pipeline: imagebuilder.CfnImagePipeline
+
+    def __init__(
+            self,
+            scope: Construct,
+            construct_id: str,
+            vpc: ec2.Vpc,
+            docker_image_asset: ecr_assets.DockerImageAsset,
+            ami_parameter_name: str,
+            region: str,
+            **kwargs) -> None:
+        super().__init__(scope, construct_id, **kwargs)
+
+        # Recipes and components are immutable, a new ComfyUI image or host
+        # setup needs new ones
+        version_hash = hashlib.sha256(
+            (HOST_COMPONENT + docker_image_asset.image_tag).encode('utf-8')).hexdigest()[:10]
+
+        host_component = imagebuilder.CfnComponent(
+            scope,
+            "GoldenAmiHostComponent",
+            name=f"ComfyUIHost-{version_hash}",
+            platform="Linux",
+            version="1.0.0",
+            data=HOST_COMPONENT,
+        )
+
+        image_recipe = imagebuilder.CfnImageRecipe(
+            scope,
+            "GoldenAmiRecipe",
+            name=f"ComfyUIHost-{version_hash}",
+            version="1.0.0",
+            parent_image=f"ssm:{ECS_GPU_AMI_PARAMETER}",
+            components=[
+                imagebuilder.CfnImageRecipe.ComponentConfigurationProperty(
+                    component_arn=host_component.attr_arn,
+                    parameters=[
+                        imagebuilder.CfnImageRecipe.ComponentParameterProperty(
+                            name="Region", value=[region]),
+                        imagebuilder.CfnImageRecipe.ComponentParameterProperty(
+                            name="ImageUri", value=[docker_image_asset.image_uri]),
+                    ],
+                ),
+            ],
+            # Same root volume as the launch template
+            block_device_mappings=[
+                imagebuilder.CfnImageRecipe.InstanceBlockDeviceMappingProperty(
+                    device_name="/dev/xvda",
+                    ebs=imagebuilder.CfnImageRecipe.EbsInstanceBlockDeviceSpecificationProperty(
+                        volume_size=50,
+                        volume_type="gp3",
+                        encrypted=True,
+                        delete_on_termination=True,
+                    ),
+                ),
+            ],
+        )
+
+        build_role = iam.Role(
+            scope,
+            "GoldenAmiBuildRole",
+            assumed_by=iam.ServicePrincipal("ec2.amazonaws.com"),
+            managed_policies=[
+                iam.ManagedPolicy.from_aws_managed_policy_name(
+                    "AmazonSSMManagedInstanceCore"),
+                iam.ManagedPolicy.from_aws_managed_policy_name(
+                    "EC2InstanceProfileForImageBuilder"),
+            ]
+        )
+        docker_image_asset.repository.grant_pull(build_role)
+        build_instance_profile = iam.CfnInstanceProfile(
+            scope,
+            "GoldenAmiBuildInstanceProfile",
+            roles=[build_role.role_name],
+        )
+        build_security_group = ec2.SecurityGroup(
+            scope,
+            "GoldenAmiBuildSecurityGroup",
+            vpc=vpc,
+            description="Security Group for the golden AMI builds",
+            allow_all_outbound=True,
+        )
+        infrastructure = imagebuilder.CfnInfrastructureConfiguration(
+            scope,
+            "GoldenAmiInfrastructure",
+            name=f"ComfyUIHost-{version_hash}",
+            instance_profile_name=build_instance_profile.ref,
+            instance_types=BUILD_INSTANCE_TYPES,
+            subnet_id=vpc.private_subnets[0].subnet_id,
+            security_group_ids=[build_security_group.security_group_id],
+            terminate_instance_on_failure=True,
+        )
+
+        distribution = imagebuilder.CfnDistributionConfiguration(
+            scope,
+            "GoldenAmiDistribution",
+            name=f"ComfyUIHost-{version_hash}",
+            distributions=[
+                imagebuilder.CfnDistributionConfiguration.DistributionProperty(
+                    region=region,
+                    ami_distribution_configuration={
+                        "Name": "comfyui-host-{{ imagebuilder:buildDate }}",
+                        "Description": f"ComfyUI host, image {docker_image_asset.image_tag[:12]}",
+                        "AmiTags": {
+                            "ComfyUIImageTag": docker_image_asset.image_tag,
+                            GOLDEN_AMI_TAG: ami_parameter_name,
+                        },
+                    },
+                ),
+            ],
+        )
+
+        # First AMI, built during the deployment
+        image = imagebuilder.CfnImage(
+            scope,
+            "GoldenAmi",
+            image_recipe_arn=image_recipe.attr_arn,
+            infrastructure_configuration_arn=infrastructure.attr_arn,
+            distribution_configuration_arn=distribution.attr_arn,
+            image_tests_configuration=imagebuilder.CfnImage.ImageTestsConfigurationProperty(
+                image_tests_enabled=False),
+        )
+
+        # The launch template resolves the parameter at every launch, the
+        # pipeline builds replace its value
+        ami_parameter = ssm.StringParameter(
+            scope,
+            "GoldenAmiParameter",
+            parameter_name=ami_parameter_name,
+            string_value=image.attr_image_id,
+            data_type=ssm.ParameterDataType.AWS_EC2_IMAGE,
+            description="Newest ComfyUI host AMI",
+        )
+
+        # Weekly builds with the security updates of the parent AMI
+        image_pipeline = imagebuilder.CfnImagePipeline(
+            scope,
+            "GoldenAmiPipeline",
+            name=f"ComfyUIHost-{version_hash}",
+            image_recipe_arn=image_recipe.attr_arn,
+            infrastructure_configuration_arn=infrastructure.attr_arn,
+            distribution_configuration_arn=distribution.attr_arn,
+            image_tests_configuration=imagebuilder.CfnImagePipeline.ImageTestsConfigurationProperty(
+                image_tests_enabled=False),
+            schedule=imagebuilder.CfnImagePipeline.ScheduleProperty(
+                schedule_expression=GOLDEN_AMI_SCHEDULE,
+                pipeline_execution_start_condition="EXPRESSION_MATCH_ONLY",
+            ),
+        )
+
+        # Publish the AMIs of the pipeline builds and remove the older ones
+        publish_function = lambda_.Function(
+            scope,
+            "GoldenAmiPublishFunction",
+            handler="golden_ami.handler",
+            code=lambda_.Code.from_asset(
+                "./comfyui_aws_stack/lambda/golden_ami_lambda"),
+            runtime=lambda_.Runtime.PYTHON_3_12,
+            timeout=Duration.seconds(60),
+            environment={
+                "PIPELINE_ARN": image_pipeline.attr_arn,
+                "AMI_PARAMETER_NAME": ami_parameter_name,
+                "AMI_TAG": GOLDEN_AMI_TAG,
+                "KEEP_AMIS": str(GOLDEN_AMI_KEEP),
+            },
+        )
+        publish_function.add_to_role_policy(
+            iam.PolicyStatement(
+                actions=["imagebuilder:GetImage", "ec2:DescribeImages"],
+                resources=["*"],
+            )
+        )
+        publish_function.add_to_role_policy(
+            iam.PolicyStatement(
+                actions=["ec2:DeregisterImage"],
+                resources=["*"],
+                conditions={
+                    "StringEquals": {f"ec2:ResourceTag/{GOLDEN_AMI_TAG}": ami_parameter_name},
+                },
+            )
+        )
+        # The snapshots are not tagged
+        publish_function.add_to_role_policy(
+            iam.PolicyStatement(
+                actions=["ec2:DeleteSnapshot"],
+                resources=["*"],
+            )
+        )
+        ami_parameter.grant_write(publish_function)
+        events.Rule(
+            scope,
+            "GoldenAmiAvailableRule",
+            event_pattern=events.EventPattern(
+                source=["aws.imagebuilder"],
+                detail_type=["EC2 Image Builder Image State Change"],
+                detail={"state": {"status": ["AVAILABLE"]}},
+            ),
+            targets=[events_targets.LambdaFunction(publish_function)],
+        )
+
+        # Output
+
+        self.ami_parameter = ami_parameter
+        self.image_pipeline = image_pipeline
@@ -0,0 +1,51 @@
+from aws_cdk import (
+    aws_s3 as s3,
+    RemovalPolicy,
+)
+from constructs import Construct
+from cdk_nag import NagSuppressions
+
+# Key prefix of the model folders, laid out like ComfyUI/models/
+MODEL_STORE_PREFIX = "models/"
+
+
+class ModelStoreConstruct(Construct):
+    model_bucket: s3.IBucket
+
+    def __init__(
+            self,
+            scope: Construct,
+            construct_id: str,
+            model_bucket_name: str = None,
+            **kwargs) -> None:
+        super().__init__(scope, construct_id, **kwargs)
+
+        if model_bucket_name:
+            # Bring an existing bucket holding the models
+            model_bucket = s3.Bucket.from_bucket_name(
+                scope, "ModelBucket", model_bucket_name)
+        else:
+            # Models outlive the stack
+            model_bucket = s3.Bucket(
+                scope,
+                "ModelBucket",
+                encryption=s3.BucketEncryption.S3_MANAGED,
+                block_public_access=s3.BlockPublicAccess.BLOCK_ALL,
+                enforce_ssl=True,
+                removal_policy=RemovalPolicy.RETAIN,
+            )
+
+            # Nag
+
+            NagSuppressions.add_resource_suppressions(
+                model_bucket,
+                suppressions=[
+                    {"id": "AwsSolutions-S1",
+                     "reason": "Read-only model store, access is audited with CloudTrail"
+                     },
+                ]
+            )
+
+        # Output
+
+        self.model_bucket = model_bucket
@@ -0,0 +1,65 @@
+from aws_cdk import (
+    aws_s3 as s3,
+    Duration,
+    RemovalPolicy,
+)
+from constructs import Construct
+from cdk_nag import NagSuppressions
+
+
+class OutputStoreConstruct(Construct):
+    output_bucket: s3.Bucket
+
+    def __init__(
+            self,
+            scope: Construct,
+            construct_id: str,
+            app_origin: str,
+            output_expiration_days: int = None,
+            **kwargs) -> None:
+        super().__init__(scope, construct_id, **kwargs)
+
+        # Offloaded outputs (outputs/), with their previews (previews/) and
+        # thumbnails (thumbnails/), see comfyui_aws_stack/output_offload
+        output_bucket = s3.Bucket(
+            scope,
+            "OutputBucket",
+            encryption=s3.BucketEncryption.S3_MANAGED,
+            block_public_access=s3.BlockPublicAccess.BLOCK_ALL,
+            enforce_ssl=True,
+            removal_policy=RemovalPolicy.RETAIN,
+            lifecycle_rules=[
+                s3.LifecycleRule(
+                    abort_incomplete_multipart_upload_after=Duration.days(1),
+                ),
+            ] + ([
+                s3.LifecycleRule(
+                    expiration=Duration.days(output_expiration_days),
+                ),
+            ] if output_expiration_days else []),
+            # /view redirects to presigned URLs of the bucket, which the
+            # frontend fetches and draws on canvases from the app origin
+            cors=[
+                s3.CorsRule(
+                    allowed_methods=[s3.HttpMethods.GET, s3.HttpMethods.HEAD],
+                    allowed_origins=[app_origin],
+                    allowed_headers=["*"],
+                    max_age=3600,
+                ),
+            ],
+        )
+
+        # Nag
+
+        NagSuppressions.add_resource_suppressions(
+            output_bucket,
+            suppressions=[
+                {"id": "AwsSolutions-S1",
+                 "reason": "Objects are only written by the ComfyUI task, access is audited with CloudTrail"
+                 },
+            ]
+        )
+
+        # Output
+
+        self.output_bucket = output_bucket
@@ -0,0 +1,162 @@
+from aws_cdk import (
+    aws_codebuild as codebuild,
+    aws_ecr_assets as ecr_assets,
+    aws_iam as iam,
+    aws_lambda as lambda_,
+    custom_resources as cr,
+    CustomResource,
+    Duration,
+)
+from constructs import Construct
+from cdk_nag import NagSuppressions
+
+# SOCI CLI used to build the index, and snapshotter installed on the hosts
+SOCI_VERSION = "0.10.0"
+SOCI_RELEASE = (
+    "https://github.com/awslabs/soci-snapshotter/releases/download/"
+    f"v{SOCI_VERSION}/soci-snapshotter-{SOCI_VERSION}-linux-amd64.tar.gz")
+
+# Tag of the SOCI-enabled image, next to the tag of the image asset
+SOCI_TAG_SUFFIX = "-soci"
+
+
+class SociIndexConstruct(Construct):
+    image_tag: str
+    image_uri: str
+    index_build: CustomResource
+
+    def __init__(
+            self,
+            scope: Construct,
+            construct_id: str,
+            docker_image_asset: ecr_assets.DockerImageAsset,
+            **kwargs) -> None:
+        super().__init__(scope, construct_id, **kwargs)
+
+        repository = docker_image_asset.repository
+        image_tag = docker_image_asset.image_tag + SOCI_TAG_SUFFIX
+        image_uri = f"{repository.repository_uri}:{image_tag}"
+
+        # Converts the published image asset into a SOCI-enabled image: the
+        # same layers, plus an index of the files of every layer so that the
+        # SOCI snapshotter can start the container before the layers are
+        # fully fetched. soci needs containerd, which runs in privileged mode.
+        index_project = codebuild.Project(
+            scope,
+            "SociIndexProject",
+            description="Builds the SOCI index of the ComfyUI image",
+            environment=codebuild.BuildEnvironment(
+                build_image=codebuild.LinuxBuildImage.STANDARD_7_0,
+                # Room for the uncompressed layers of the image
+                compute_type=codebuild.ComputeType.LARGE,
+                privileged=True,
+            ),
+            timeout=Duration.minutes(60),
+            build_spec=codebuild.BuildSpec.from_object({
+                "version": "0.2",
+                "phases": {
+                    "install": {
+                        "commands": [
+                            f"curl -sSfL {SOCI_RELEASE} | tar -xz -C /usr/local/bin soci",
+                            "nohup containerd > /tmp/containerd.log 2>&1 &",
+                            "timeout 60 sh -c 'until ctr version > /dev/null 2>&1; do sleep 1; done'",
+                        ]
+                    },
+                    "build": {
+                        "commands": [
+                            "PASSWORD=$(aws ecr get-login-password)",
+                            "ctr image pull --user AWS:$PASSWORD $SOURCE_IMAGE",
+                            "soci convert $SOURCE_IMAGE $TARGET_IMAGE",
+                            "ctr image push --user AWS:$PASSWORD $TARGET_IMAGE",
+                        ]
+                    },
+                },
+            }),
+        )
+        repository.grant_pull_push(index_project)
+
+        # The build takes longer than a custom resource handler may run:
+        # on_event starts it and is_complete polls it, so the task
+        # definition is only updated once the SOCI-enabled image is pushed
+        handler_code = lambda_.Code.from_asset(
+            "./comfyui_aws_stack/lambda/soci_index_lambda")
+        on_event_function = lambda_.Function(
+            scope,
+            "SociIndexStartFunction",
+            handler="soci_index.on_event",
+            code=handler_code,
+            runtime=lambda_.Runtime.PYTHON_3_12,
+            timeout=Duration.seconds(30),
+        )
+        is_complete_function = lambda_.Function(
+            scope,
+            "SociIndexCompleteFunction",
+            handler="soci_index.is_complete",
+            code=handler_code,
+            runtime=lambda_.Runtime.PYTHON_3_12,
+            timeout=Duration.seconds(30),
+        )
+        on_event_function.add_to_role_policy(
+            iam.PolicyStatement(
+                actions=["codebuild:StartBuild"],
+                resources=[index_project.project_arn],
+            )
+        )
+        is_complete_function.add_to_role_policy(
+            iam.PolicyStatement(
+                actions=["codebuild:BatchGetBuilds"],
+                resources=[index_project.project_arn],
+            )
+        )
+        provider = cr.Provider(
+            scope,
+            "SociIndexProvider",
+            on_event_handler=on_event_function,
+            is_complete_handler=is_complete_function,
+            query_interval=Duration.seconds(30),
+            total_timeout=Duration.minutes(90),
+        )
+        # A new image asset (new tag) starts a new build
+        index_build = CustomResource(
+            scope,
+            "SociIndexBuild",
+            service_token=provider.service_token,
+            properties={
+                "ProjectName": index_project.project_name,
+                "SourceImage": docker_image_asset.image_uri,
+                "TargetImage": image_uri,
+            },
+        )
+
+        # Nag
+
+        NagSuppressions.add_resource_suppressions(
+            index_project,
+            suppressions=[
+                {"id": "AwsSolutions-CB3",
+                 "reason": "soci runs on containerd, which needs privileged mode"
+                 },
+                {"id": "AwsSolutions-CB4",
+                 "reason": "The build only reads and writes the image asset repository, artifacts are not stored"
+                 },
+            ],
+            apply_to_children=True
+        )
+        NagSuppressions.add_resource_suppressions(
+            provider,
+            suppressions=[
+                {"id": "AwsSolutions-SF1",
+                 "reason": "The waiter state machine is created by the custom resource provider, the handlers log to CloudWatch"
+                 },
+                {"id": "AwsSolutions-SF2",
+                 "reason": "The waiter state machine is created by the custom resource provider"
+                 },
+            ],
+            apply_to_children=True
+        )
+
+        # Output
+
+        self.image_tag = image_tag
+        self.image_uri = image_uri
+        self.index_build = index_build
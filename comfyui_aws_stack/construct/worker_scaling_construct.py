@@ -0,0 +1,124 @@
+from aws_cdk import (
+    aws_applicationautoscaling as appscaling,
+    aws_autoscaling as autoscaling,
+    aws_cloudwatch as cloudwatch,
+    aws_ecs as ecs,
+    Duration,
+    TimeZone,
+)
+from constructs import Construct
+
+
+def to_aws_cron(expression: str) -> str:
+    """Convert a five field cron expression (as used by the ASG scheduled
+    actions) to the six field format of Application Auto Scaling, where
+    day-of-week is 1-7 starting on Sunday and one of day-of-month /
+    day-of-week has to be "?"."""
+    minute, hour, day_of_month, month, day_of_week = expression.split()
+
+    def convert_day(day):
+        return str(int(day) % 7 + 1) if day.isdigit() else day
+
+    if day_of_week != "*":
+        day_of_week = ",".join(
+            "-".join(convert_day(day) for day in part.split("-"))
+            for part in day_of_week.split(","))
+        day_of_month = "?" if day_of_month == "*" else day_of_month
+    else:
+        day_of_week = "?"
+    return f"cron({minute} {hour} {day_of_month} {month} {day_of_week} *)"
+
+
+class WorkerScalingConstruct(Construct):
+    scalable_target: ecs.ScalableTaskCount
+
+    def __init__(
+            self,
+            scope: Construct,
+            construct_id: str,
+            service: ecs.Ec2Service,
+            auto_scaling_group: autoscaling.AutoScalingGroup,
+            max_workers: int,
+            worker_queue_target: int,
+            auto_scale_down: bool,
+            idle_scale_down_minutes: int,
+            schedule_auto_scaling: bool,
+            timezone: str,
+            schedule_scale_down: str,
+            schedule_scale_up: str,
+            **kwargs) -> None:
+        super().__init__(scope, construct_id, **kwargs)
+
+        # In N-worker mode the ECS service is scaled and the capacity
+        # provider (managed scaling) adds or removes instances to fit the
+        # tasks, so every policy here acts on the task count.
+        scalable_target = service.auto_scale_task_count(
+            min_capacity=0,
+            max_capacity=max_workers,
+        )
+
+        def activity_metric(metric_name, statistic):
+            # Every worker publishes one datapoint per minute with the same
+            # dimension, so the statistic aggregates across workers
+            return cloudwatch.Metric(
+                namespace="ComfyUI/Activity",
+                metric_name=metric_name,
+                dimensions_map={
+                    "AutoScalingGroupName": auto_scaling_group.auto_scaling_group_name
+                },
+                statistic=statistic,
+                period=Duration.minutes(1),
+            )
+
+        # Scale out when the average number of queued and running prompts
+        # per worker exceeds the target. Scale-in is left to the idle policy
+        # below so busy workers are not picked.
+        scalable_target.scale_to_track_custom_metric(
+            "QueueDepthScaling",
+            metric=activity_metric("QueueDepth", "Average"),
+            target_value=worker_queue_target,
+            disable_scale_in=True,
+            scale_out_cooldown=Duration.minutes(2),
+        )
+
+        # Remove one worker at a time once the most idle worker has been idle
+        # for the idle window. Busy workers protect their task from scale-in,
+        # so only idle workers are stopped.
+        if auto_scale_down:
+            scalable_target.scale_on_metric(
+                "IdleScaling",
+                metric=activity_metric("IdleSeconds", "Maximum"),
+                scaling_steps=[
+                    appscaling.ScalingInterval(
+                        upper=idle_scale_down_minutes * 60, change=0),
+                    appscaling.ScalingInterval(
+                        lower=idle_scale_down_minutes * 60, change=-1),
+                ],
+                adjustment_type=appscaling.AdjustmentType.CHANGE_IN_CAPACITY,
+                cooldown=Duration.minutes(2),
+                evaluation_periods=1,
+            )
+
+        # Scheduled Scaling:
+        # Stop all workers after work hours, keep at least one during work hours
+        if schedule_auto_scaling:
+            scalable_target.scale_on_schedule(
+                "AfterWorkHoursAction",
+                schedule=appscaling.Schedule.expression(
+                    to_aws_cron(schedule_scale_down)),
+                time_zone=TimeZone.of(timezone),
+                min_capacity=0,
+                max_capacity=0,
+            )
+            scalable_target.scale_on_schedule(
+                "StartWorkHoursAction",
+                schedule=appscaling.Schedule.expression(
+                    to_aws_cron(schedule_scale_up)),
+                time_zone=TimeZone.of(timezone),
+                min_capacity=1,
+                max_capacity=max_workers,
+            )
+
+        # Output
+
+        self.scalable_target = scalable_target
@@ -0,0 +1,69 @@
+#!/bin/sh
+# Starts ComfyUI in the data directory ($COMFYUI_DATA_DIR, the working
+# directory). The optional features are enabled by environment variables of
+# the task definition (see construct/ecs_construct.py).
+
+# VRAM mode, cache size and threads for the instance type (COMFYUI_ARGS,
+# OMP_NUM_THREADS), written by the EC2 user data and mounted from the host
+# (see instance_types.json)
+if [ -f /etc/comfyui/comfyui.env ]; then
+    . /etc/comfyui/comfyui.env
+fi
+
+# Data folders, created on a new volume
+mkdir -p models custom_nodes user input output
+
+# ComfyUI-Manager is part of the image, a copy left on the volume by the
+# former layout (ComfyUI on the volume) is disabled
+if [ -d custom_nodes/ComfyUI-Manager ] && [ ! -e custom_nodes/ComfyUI-Manager.disabled ]; then
+    mv custom_nodes/ComfyUI-Manager custom_nodes/ComfyUI-Manager.disabled
+fi
+
+# In the background: DOWNLOAD_MODELS downloads the models of the manifest,
+# then MODEL_INDEX_PATH indexes and deduplicates the models
+{
+    if [ -n "$DOWNLOAD_MODELS" ]; then
+        python /home/user/opt/model_downloader/download_models.py
+    fi
+    if [ -n "$MODEL_INDEX_PATH" ]; then
+        nice python /home/user/opt/model_index/model_index.py --scan
+    fi
+} &
+
+# ComfyUI and its arguments. MODEL_PATHS_CONFIG adds the model folders of
+# the S3 model store.
+set -- /home/user/opt/ComfyUI/main.py --listen 0.0.0.0 --port 8181 \
+    --output-directory "$COMFYUI_DATA_DIR/output/" \
+    --input-directory "$COMFYUI_DATA_DIR/input/" \
+    --user-directory "$COMFYUI_DATA_DIR/user/"
+if [ -n "$MODEL_PATHS_CONFIG" ]; then
+    set -- "$@" --extra-model-paths-config "$MODEL_PATHS_CONFIG"
+fi
+# COMFYUI_ARGS holds several arguments, split on purpose
+set -- "$@" $COMFYUI_ARGS
+
+# Launchers, each runs the next one. Each is put in front of the others, so
+# the last one below runs first.
+
+# MODEL_CACHE_DIR: models are read through the NVMe model cache
+if [ -n "$MODEL_CACHE_DIR" ]; then
+    set -- /home/user/opt/model_cache/model_cache.py "$@"
+fi
+
+# MODEL_INDEX_PATH: ComfyUI lists the model folders from the index
+if [ -n "$MODEL_INDEX_PATH" ]; then
+    set -- /home/user/opt/model_index/model_index.py "$@"
+fi
+
+# MODEL_PROFILER: model loads and GPU transfers are logged as JSON events
+if [ -n "$MODEL_PROFILER" ]; then
+    set -- /home/user/opt/model_profiler/model_profiler.py "$@"
+fi
+
+# NODE_DEPS_DIR: the custom node requirements come from the volume, updated
+# in the background when they changed
+if [ -n "$NODE_DEPS_DIR" ]; then
+    set -- /home/user/opt/node_deps/node_deps.py "$@"
+fi
+
+exec python "$@"
@@ -0,0 +1,160 @@
+"""
+Read-through model cache on the NVMe instance store.
+
+ComfyUI resolves every model file with folder_paths.get_full_path. The
+launcher wraps it so that files of the model folders are copied from the
+EBS volume to the cache directory on first access, and loaded from there
+afterwards. The least recently used files are evicted to stay within the
+cache size.
+
+    python model_cache.py /home/user/opt/ComfyUI/main.py [ComfyUI arguments]
+
+The cache is only used when MODEL_CACHE_DIR holds the marker file written
+when the instance store was formatted, so it never fills the root volume.
+"""
+import os
+import runpy
+import shutil
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+MARKER_FILE = ".model-cache"
+
+# Share of the cache disk used for models
+CACHE_DISK_RATIO = 0.9
+
+# Folders holding configuration or code rather than model weights
+UNCACHED_FOLDERS = {"configs", "custom_nodes"}
+
+COPY_BUFFER_BYTES = 16 * 1024 * 1024
+
+
+def log(message):
+    print(f"[model-cache] {message}", flush=True)
+
+
+class ModelCache:
+    """LRU of source files copied to cache_dir. The access time of a cached
+    file records its last use (kept across restarts), the modification time
+    and size those of the source, to detect replaced models."""
+
+    def __init__(self, cache_dir, max_bytes=None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes or int(shutil.disk_usage(cache_dir).total * CACHE_DISK_RATIO)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.entries = OrderedDict()
+        files = []
+        for root, _, names in os.walk(cache_dir):
+            for name in names:
+                path = os.path.join(root, name)
+                if name.endswith(".partial"):
+                    # Copy interrupted by a restart
+                    os.remove(path)
+                    continue
+                if name == MARKER_FILE:
+                    continue
+                stat = os.stat(path)
+                files.append((stat.st_atime, path, stat.st_size))
+        for _, path, size in sorted(files):
+            self.entries[path] = size
+
+    @property
+    def used_bytes(self):
+        return sum(self.entries.values())
+
+    def cached_path(self, source):
+        return os.path.join(self.cache_dir, os.path.abspath(source).lstrip(os.sep))
+
+    def _is_current(self, cached, source_stat):
+        try:
+            stat = os.stat(cached)
+        except FileNotFoundError:
+            return False
+        return stat.st_size == source_stat.st_size and int(stat.st_mtime) == int(source_stat.st_mtime)
+
+    def _evict(self, needed_bytes):
+        while self.entries and self.used_bytes + needed_bytes > self.max_bytes:
+            path, size = self.entries.popitem(last=False)
+            log(f"Evicting {path} ({size // (1024 * 1024)} MiB)")
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _copy(self, source, cached, source_stat):
+        os.makedirs(os.path.dirname(cached), exist_ok=True)
+        partial = cached + ".partial"
+        with open(source, "rb") as src, open(partial, "wb") as dst:
+            shutil.copyfileobj(src, dst, COPY_BUFFER_BYTES)
+        os.utime(partial, (time.time(), source_stat.st_mtime))
+        os.replace(partial, cached)
+
+    def path(self, source):
+        """Path to load `source` from, copying it to the cache on a miss.
+        Files larger than the cache are loaded from the source."""
+        source_stat = os.stat(source)
+        cached = self.cached_path(source)
+        with self.lock:
+            if self._is_current(cached, source_stat):
+                self.hits += 1
+                self.entries[cached] = source_stat.st_size
+                self.entries.move_to_end(cached)
+                os.utime(cached, (time.time(), source_stat.st_mtime))
+                return cached
+            if source_stat.st_size > self.max_bytes:
+                return source
+            self.misses += 1
+            self.entries.pop(cached, None)
+            self._evict(source_stat.st_size)
+            start = time.time()
+            self._copy(source, cached, source_stat)
+            self.entries[cached] = source_stat.st_size
+            log(f"Cached {source} in {time.time() - start:.1f}s")
+            return cached
+
+
+def install(folder_paths, cache):
+    """Serve the model files resolved by ComfyUI from the cache."""
+    get_full_path = folder_paths.get_full_path
+
+    def cached_get_full_path(folder_name, filename):
+        path = get_full_path(folder_name, filename)
+        if path is None or folder_name in UNCACHED_FOLDERS or not os.path.isfile(path):
+            return path
+        try:
+            return cache.path(path)
+        except OSError as e:
+            log(f"Loading {path} from the source: {e}")
+            return path
+
+    folder_paths.get_full_path = cached_get_full_path
+
+
+def main():
+    main_py = sys.argv[1]
+    sys.argv = sys.argv[1:]
+    sys.path.insert(0, os.path.dirname(os.path.abspath(main_py)))
+
+    cache_dir = os.environ.get("MODEL_CACHE_DIR")
+    if cache_dir and os.path.isfile(os.path.join(cache_dir, MARKER_FILE)):
+        # folder_paths reads the command line arguments on import, as in main.py
+        import comfy.options
+        comfy.options.enable_args_parsing()
+        import folder_paths
+
+        cache = ModelCache(cache_dir)
+        install(folder_paths, cache)
+        log(f"Caching models in {cache_dir} ({cache.used_bytes // (1024 ** 3)} of "
+            f"{cache.max_bytes // (1024 ** 3)} GiB used)")
+    elif cache_dir:
+        log(f"{cache_dir} is not an instance store volume, loading models from the source")
+
+    runpy.run_path(main_py, run_name="__main__")
+
+
+if __name__ == "__main__":
+    main()
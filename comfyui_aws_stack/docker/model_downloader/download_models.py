@@ -0,0 +1,273 @@
+"""
+Download the models listed in a model manifest into the ComfyUI model folders.
+
+The manifest (models.json) is a list of models:
+
+    [
+        {
+            "name": "sd_xl_base_1.0.safetensors",
+            "url": "https://huggingface.co/.../sd_xl_base_1.0.safetensors",
+            "folder": "checkpoints",
+            "sha256": "31e35c80fc...",
+            "size": 6938078334
+        }
+    ]
+
+`folder` is a model folder of extra_model_paths.yaml, `sha256` and `size`
+are optional. Files are fetched with parallel ranged requests into a
+.download file next to the target, with the completed chunks recorded so an
+interrupted download resumes. Models already present (with the manifest
+size, if given) are skipped. Models without a sha256 in the manifest are
+not verified: they are listed as a warning and the computed hash is printed
+so it can be pinned. With --require-sha256 (or REQUIRE_MODEL_SHA256=true)
+they are not downloaded at all.
+
+HF_TOKEN and CIVITAI_TOKEN are sent to huggingface.co and civitai.com.
+
+    python download_models.py [--manifest models.json] [--only NAME ...] [--require-sha256]
+"""
+import argparse
+import fcntl
+import hashlib
+import http.client
+import json
+import os
+import sys
+import threading
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+# Shared with the model index (appended, so that it never shadows a module of
+# ComfyUI or a custom node)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "model_folders"))
+from model_folders import DEFAULT_CONFIG, model_folders  # noqa: E402
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_MANIFEST = os.path.join(HERE, "models.json")
+
+CHUNK_BYTES = 64 * 1024 * 1024
+READ_BYTES = 1024 * 1024
+CONNECTIONS = 8
+RETRIES = 3
+TIMEOUT_SECONDS = 60
+
+TOKENS = {
+    "huggingface.co": "HF_TOKEN",
+    "civitai.com": "CIVITAI_TOKEN",
+}
+
+
+def log(message):
+    print(f"[download-models] {message}", flush=True)
+
+
+def load_manifest(path, folders):
+    with open(path) as f:
+        models = json.load(f)
+    for model in models:
+        missing = [key for key in ("name", "url", "folder") if not model.get(key)]
+        if missing:
+            raise ValueError(f"{model.get('name', model)}: missing {', '.join(missing)}")
+        if model["folder"] not in folders:
+            raise ValueError(f"{model['name']}: {model['folder']} is not a folder of extra_model_paths.yaml")
+    return models
+
+
+def _request(url, start=None, end=None):
+    request = urllib.request.Request(url, headers={"User-Agent": "comfyui-download-models"})
+    host = urllib.parse.urlparse(url).hostname or ""
+    for domain, variable in TOKENS.items():
+        if os.environ.get(variable) and (host == domain or host.endswith("." + domain)):
+            # Not forwarded on redirects to the storage hosts
+            request.add_unredirected_header("Authorization", f"Bearer {os.environ[variable]}")
+    if start is not None:
+        request.add_header("Range", f"bytes={start}-{'' if end is None else end}")
+    return urllib.request.urlopen(request, timeout=TIMEOUT_SECONDS)
+
+
+def probe(url):
+    """(size, ranges supported) of a URL, with a one byte ranged request."""
+    with _request(url, 0, 0) as response:
+        if response.status == 206:
+            return int(response.headers["Content-Range"].rsplit("/", 1)[1]), True
+        length = response.headers.get("Content-Length")
+        return (int(length) if length else None), False
+
+
+class Download:
+    """A file being fetched into `<target>.download`, with the completed
+    chunks recorded in `<target>.download.json`."""
+
+    def __init__(self, url, target, size, chunk_bytes=CHUNK_BYTES):
+        self.url = url
+        self.partial = target + ".download"
+        self.state_path = self.partial + ".json"
+        self.size = size
+        self.chunk_bytes = chunk_bytes
+        self.lock = threading.Lock()
+        self.done = set()
+        state = {}
+        if os.path.exists(self.state_path) and os.path.exists(self.partial):
+            with open(self.state_path) as f:
+                state = json.load(f)
+        if (state.get("url"), state.get("size"), state.get("chunk_bytes")) == (url, size, chunk_bytes):
+            self.done = set(state["done"])
+        else:
+            with open(self.partial, "wb") as f:
+                f.truncate(size)
+            self._save()
+
+    @property
+    def chunks(self):
+        return range((self.size + self.chunk_bytes - 1) // self.chunk_bytes)
+
+    def _save(self):
+        with open(self.state_path + ".tmp", "w") as f:
+            json.dump({"url": self.url, "size": self.size, "chunk_bytes": self.chunk_bytes,
+                       "done": sorted(self.done)}, f)
+        os.replace(self.state_path + ".tmp", self.state_path)
+
+    def fetch_chunk(self, index):
+        start = index * self.chunk_bytes
+        end = min(start + self.chunk_bytes, self.size) - 1
+        for attempt in range(RETRIES):
+            try:
+                offset = start
+                with _request(self.url, start, end) as response, open(self.partial, "r+b") as f:
+                    if response.status != 206:
+                        raise OSError(f"expected a partial response, got {response.status}")
+                    while offset <= end:
+                        data = response.read(min(READ_BYTES, end + 1 - offset))
+                        if not data:
+                            raise OSError(f"connection closed at byte {offset}")
+                        os.pwrite(f.fileno(), data, offset)
+                        offset += len(data)
+                break
+            except (OSError, http.client.HTTPException) as e:
+                if attempt == RETRIES - 1:
+                    raise
+                log(f"Retrying bytes {start}-{end}: {e}")
+                time.sleep(2 ** attempt)
+        with self.lock:
+            self.done.add(index)
+            self._save()
+
+    def run(self, connections=CONNECTIONS):
+        pending = [index for index in self.chunks if index not in self.done]
+        if len(pending) < len(self.chunks):
+            log(f"Resuming, {len(self.chunks) - len(pending)} of {len(self.chunks)} chunks already downloaded")
+        with ThreadPoolExecutor(max_workers=connections) as executor:
+            # list() raises the first failed chunk
+            list(executor.map(self.fetch_chunk, pending))
+        os.remove(self.state_path)
+        return self.partial
+
+
+def _stream(url, target):
+    """Single request download, for servers without range support."""
+    partial = target + ".download"
+    with _request(url) as response, open(partial, "wb") as f:
+        while True:
+            data = response.read(READ_BYTES)
+            if not data:
+                break
+            f.write(data)
+    return partial
+
+
+def sha256sum(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for data in iter(lambda: f.read(READ_BYTES), b""):
+            digest.update(data)
+    return digest.hexdigest()
+
+
+def download(model, folders, connections=CONNECTIONS, chunk_bytes=CHUNK_BYTES, require_sha256=False):
+    """Download a manifest entry, returns "present" or "downloaded"."""
+    if require_sha256 and not model.get("sha256"):
+        raise ValueError(f"{model['name']}: no sha256 in the manifest")
+    directory = folders[model["folder"]]
+    target = os.path.join(directory, model["name"])
+    if os.path.exists(target) and model.get("size") in (None, os.path.getsize(target)):
+        return "present"
+
+    os.makedirs(directory, exist_ok=True)
+    start = time.time()
+    size, ranges = probe(model["url"])
+    if model.get("size") and size and size != model["size"]:
+        raise ValueError(f"{model['name']}: {size} bytes at the URL, {model['size']} in the manifest")
+    if ranges and size:
+        partial = Download(model["url"], target, size, chunk_bytes).run(connections)
+    else:
+        partial = _stream(model["url"], target)
+
+    digest = sha256sum(partial)
+    if model.get("sha256") and digest != model["sha256"].lower():
+        os.remove(partial)
+        raise ValueError(f"{model['name']}: sha256 {digest} does not match the manifest")
+    os.replace(partial, target)
+    seconds = time.time() - start
+    mib = os.path.getsize(target) / (1024 * 1024)
+    log(f"Downloaded {model['name']} ({mib:.0f} MiB in {seconds:.0f}s, {mib / max(seconds, 0.001):.0f} MiB/s)")
+    if not model.get("sha256"):
+        log(f"WARNING: {model['name']} was not verified, pin it in the manifest: \"sha256\": \"{digest}\"")
+    return "downloaded"
+
+
+def unpinned(models):
+    return [model["name"] for model in models if not model.get("sha256")]
+
+
+def download_all(models, folders, connections=CONNECTIONS, require_sha256=False):
+    """Download every model, the failures are logged and returned."""
+    names = unpinned(models)
+    if names:
+        log(f"WARNING: {len(names)} of {len(models)} models have no sha256 in the manifest"
+            f" and {'are not downloaded' if require_sha256 else 'are not verified'}: {', '.join(names)}")
+    failed = []
+    for model in models:
+        try:
+            if download(model, folders, connections, require_sha256=require_sha256) == "present":
+                log(f"{model['name']} is already present")
+        except Exception as e:
+            log(f"Failed to download {model['name']}: {e}")
+            failed.append(model["name"])
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--manifest", default=os.environ.get("MODEL_MANIFEST", DEFAULT_MANIFEST))
+    parser.add_argument("--config", default=DEFAULT_CONFIG, help="extra_model_paths.yaml")
+    parser.add_argument("--connections", type=int, default=CONNECTIONS,
+                        help="parallel ranged requests per file (default: %(default)s)")
+    parser.add_argument("--only", nargs="+", metavar="NAME", help="only download these models")
+    parser.add_argument("--require-sha256", action="store_true",
+                        default=os.environ.get("REQUIRE_MODEL_SHA256", "").lower() in ("1", "true"),
+                        help="refuse models without a sha256 in the manifest")
+    args = parser.parse_args()
+
+    folders = model_folders(args.config)
+    models = load_manifest(args.manifest, folders)
+    if args.only:
+        models = [model for model in models if model["name"] in args.only]
+
+    # Started at container start and from the admin page, only one may run
+    lock = open(os.path.join(os.path.dirname(args.config), ".download-models.lock"), "w")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        log("Another download is running")
+        return 0
+
+    start = time.time()
+    failed = download_all(models, folders, args.connections, args.require_sha256)
+    log(f"{len(models) - len(failed)} of {len(models)} models ready in {time.time() - start:.0f}s")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,25 @@
+"""
+Model folders of extra_model_paths.yaml, shared by the model downloader and
+the model index.
+"""
+import os
+
+DEFAULT_CONFIG = "/home/user/opt/ComfyUI/extra_model_paths.yaml"
+
+
+def model_folders(config_path):
+    """Model folder name -> directory, from extra_model_paths.yaml (the first
+    base path listing a folder wins)."""
+    import yaml
+
+    with open(config_path) as f:
+        config = yaml.safe_load(f)
+    folders = {}
+    for section in config.values():
+        base_path = os.path.expanduser(section.get("base_path", ""))
+        for folder, paths in section.items():
+            if folder in ("base_path", "is_default") or folder in folders:
+                continue
+            path = str(paths).split("\n")[0].strip()
+            folders[folder] = os.path.join(base_path, path)
+    return folders
@@ -0,0 +1,276 @@
+"""
+Model index: content hashes, deduplication and cached folder listings.
+
+Scan (run in the background at container start):
+
+    python model_index.py --scan [--config extra_model_paths.yaml]
+
+hashes the files of the model folders of extra_model_paths.yaml. Files
+whose size and modification time match the index are not read again.
+Files with the same content are then deduplicated: copies are replaced
+with a reflink of the first file, or a hardlink where the file system does
+not support reflinks. The index, with the listing of every model
+directory, is saved to MODEL_INDEX_PATH.
+
+Launcher:
+
+    python model_index.py [model_cache.py] /home/user/opt/ComfyUI/main.py [ComfyUI arguments]
+
+ComfyUI lists the model folders with folder_paths.recursive_search. The
+launcher serves the listings from the index, only listing again the
+directories whose modification time changed.
+"""
+import argparse
+import fcntl
+import hashlib
+import json
+import os
+import runpy
+import sys
+import time
+
+# Shared with the model downloader (appended, so that it never shadows a module
+# of ComfyUI or a custom node)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "model_folders"))
+from model_folders import DEFAULT_CONFIG, model_folders  # noqa: E402
+
+
+INDEX_VERSION = 1
+
+# Folders holding code rather than model weights
+UNINDEXED_FOLDERS = {"custom_nodes"}
+
+# Downloads in progress (model_downloader, model_cache)
+PARTIAL_SUFFIXES = (".download", ".download.json", ".partial")
+
+# Smaller files (configs, embeddings) are hashed but not worth linking
+MIN_DEDUP_BYTES = 1024 * 1024
+
+READ_BYTES = 1024 * 1024
+
+# linux/fs.h
+FICLONE = 0x40049409
+
+
+def log(message):
+    print(f"[model-index] {message}", flush=True)
+
+
+def sha256sum(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for data in iter(lambda: f.read(READ_BYTES), b""):
+            digest.update(data)
+    return digest.hexdigest()
+
+
+def list_dir(path, mtime):
+    """Listing of a directory, as recorded in the index."""
+    files, subdirs = [], []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            (subdirs if entry.is_dir() else files).append(entry.name)
+    return {"mtime": mtime, "files": sorted(files), "subdirs": sorted(subdirs)}
+
+
+def reflink(source, target):
+    with open(source, "rb") as src, open(target, "wb") as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+
+
+def link(source, target):
+    """Replace target with a reflink or hardlink of source. Returns the
+    method used.
+
+    Hardlinks share their content (the ext4 volumes have no reflinks), so
+    the linked file is made read-only: writing one path in place would
+    change every other. Replacing a path (os.replace, as the
+    downloads do) leaves the others as they are."""
+    tmp = target + ".dedup"
+    try:
+        reflink(source, tmp)
+        method = "reflink"
+    except OSError:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        os.chmod(source, os.stat(source).st_mode & 0o7555)
+        os.link(source, tmp)
+        method = "hardlink"
+    os.replace(tmp, target)
+    return method
+
+
+class ModelIndex:
+    """Content hashes of the model files ({path: {size, mtime_ns, sha256}})
+    and the listings of the model directories ({path: {mtime, files,
+    subdirs}})."""
+
+    def __init__(self, path):
+        self.path = path
+        self.files = {}
+        self.dirs = {}
+        self.hashed = 0
+        try:
+            with open(path) as f:
+                index = json.load(f)
+            if index.get("version") == INDEX_VERSION:
+                self.files = index["files"]
+                self.dirs = index["dirs"]
+        except (FileNotFoundError, ValueError):
+            pass
+
+    def save(self):
+        with open(self.path + ".tmp", "w") as f:
+            json.dump({"version": INDEX_VERSION, "files": self.files, "dirs": self.dirs}, f)
+        os.replace(self.path + ".tmp", self.path)
+
+    def _entry(self, path, stat):
+        entry = self.files.get(path)
+        if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            return entry
+        self.hashed += 1
+        return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": sha256sum(path)}
+
+    def scan(self, directories):
+        """Hash the new and changed files of the directories, and record
+        their listings."""
+        files, dirs = {}, {}
+        pending = [os.path.normpath(directory) for directory in directories if os.path.isdir(directory)]
+        while pending:
+            directory = pending.pop()
+            if directory in dirs:
+                continue
+            dirs[directory] = listing = list_dir(directory, os.path.getmtime(directory))
+            pending.extend(os.path.join(directory, name) for name in listing["subdirs"])
+            for name in listing["files"]:
+                if name.startswith(".") or name.endswith(PARTIAL_SUFFIXES):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                    files[path] = self._entry(path, stat)
+                except FileNotFoundError:
+                    continue
+        self.files = files
+        self.dirs = dirs
+
+    def deduplicate(self):
+        """Link the files with the same content to the first of them.
+        Returns (linked files, bytes saved)."""
+        by_hash = {}
+        for path, entry in sorted(self.files.items()):
+            if entry["size"] >= MIN_DEDUP_BYTES:
+                by_hash.setdefault((entry["sha256"], entry["size"]), []).append(path)
+
+        linked, saved = 0, 0
+        for paths in by_hash.values():
+            source = paths[0]
+            for target in paths[1:]:
+                try:
+                    source_stat, target_stat = os.stat(source), os.stat(target)
+                except FileNotFoundError:
+                    continue
+                if (source_stat.st_dev, source_stat.st_ino) == (target_stat.st_dev, target_stat.st_ino):
+                    continue
+                if source_stat.st_dev != target_stat.st_dev:
+                    continue
+                # Changed since it was hashed, left for the next scan
+                if any(self.files[path]["mtime_ns"] != stat.st_mtime_ns
+                       for path, stat in [(source, source_stat), (target, target_stat)]):
+                    continue
+                method = link(source, target)
+                log(f"{target}: {method} of {source}")
+                if method == "hardlink":
+                    self.files[target] = dict(self.files[source])
+                else:
+                    self.files[target]["mtime_ns"] = os.stat(target).st_mtime_ns
+                linked += 1
+                saved += target_stat.st_size
+        # The linked files changed their directories
+        for directory in {os.path.dirname(path) for paths in by_hash.values() for path in paths}:
+            if directory in self.dirs:
+                self.dirs[directory]["mtime"] = os.path.getmtime(directory)
+        return linked, saved
+
+
+def install(folder_paths, index):
+    """List the model directories from the index, listing again the
+    directories whose modification time changed."""
+
+    def indexed_recursive_search(directory, excluded_dir_names=None):
+        if not os.path.isdir(directory):
+            return [], {}
+        excluded = set(excluded_dir_names or [])
+        result, dirs = [], {}
+        pending = [directory]
+        while pending:
+            path = pending.pop()
+            try:
+                mtime = os.path.getmtime(path)
+            except FileNotFoundError:
+                continue
+            dirs[path] = mtime
+            listing = index.dirs.get(os.path.normpath(path))
+            if listing is None or listing["mtime"] != mtime:
+                listing = index.dirs[os.path.normpath(path)] = list_dir(path, mtime)
+            relative_dir = os.path.relpath(path, directory)
+            result.extend(os.path.normpath(os.path.join(relative_dir, name)) for name in listing["files"])
+            pending.extend(os.path.join(path, name) for name in listing["subdirs"] if name not in excluded)
+        return result, dirs
+
+    folder_paths.recursive_search = indexed_recursive_search
+
+
+def scan(index_path, config_path):
+    # Started at container start, only one may run
+    lock = open(index_path + ".lock", "w")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        log("Another scan is running")
+        return 0
+
+    start = time.time()
+    folders = model_folders(config_path)
+    index = ModelIndex(index_path)
+    index.scan([path for folder, path in folders.items() if folder not in UNINDEXED_FOLDERS])
+    linked, saved = index.deduplicate()
+    index.save()
+    log(f"Indexed {len(index.files)} files ({index.hashed} hashed), linked {linked} "
+        f"duplicates ({saved / 1024 ** 3:.1f} GiB) in {time.time() - start:.0f}s")
+    return 0
+
+
+def main():
+    if sys.argv[1:2] == ["--scan"]:
+        parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+        parser.add_argument("--scan", action="store_true")
+        parser.add_argument("--config", default=DEFAULT_CONFIG, help="extra_model_paths.yaml")
+        args = parser.parse_args()
+        return scan(os.environ["MODEL_INDEX_PATH"], args.config)
+
+    # Launcher, possibly of another launcher (model_cache.py)
+    main_py = next(arg for arg in sys.argv[1:] if os.path.basename(arg) == "main.py")
+    script = sys.argv[1]
+    sys.argv = sys.argv[1:]
+    sys.path.insert(0, os.path.dirname(os.path.abspath(main_py)))
+
+    index_path = os.environ.get("MODEL_INDEX_PATH")
+    if index_path:
+        # folder_paths reads the ComfyUI arguments on import, as in main.py
+        argv = sys.argv
+        sys.argv = argv[argv.index(main_py):]
+        import comfy.options
+        comfy.options.enable_args_parsing()
+        import folder_paths
+        sys.argv = argv
+
+        index = ModelIndex(index_path)
+        install(folder_paths, index)
+        log(f"Listing model folders from {index_path} ({len(index.dirs)} directories)")
+
+    runpy.run_path(script, run_name="__main__")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
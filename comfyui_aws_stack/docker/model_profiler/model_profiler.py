@@ -0,0 +1,233 @@
+"""
+Model load profiler.
+
+    python model_profiler.py [model_index.py] [model_cache.py] /home/user/opt/ComfyUI/main.py [ComfyUI arguments]
+
+Logs a JSON event for every model file ComfyUI loads, and for every move
+of models to the GPU. The events go to the container log, where the
+metric filters of EcsConstruct turn them into ComfyUI/ModelLoad metrics
+and the admin page summarizes them.
+
+    {"event": "model_load", "file": "sd_xl_base_1.0.safetensors", "folder": "checkpoints",
+     "source": "ebs", "bytes": 6938078334, "storage_bytes": 6938078334, "page_cache_hit": 0,
+     "load_seconds": 41.2, "read_seconds": 38.9, "deserialize_seconds": 2.3,
+     "read_mib_per_second": 170.1}
+
+    {"event": "model_transfer", "models": ["sd_xl_base_1.0.safetensors"], "loaded": 1,
+     "resident": 0, "vram_hit": 0, "bytes": 5135149760, "transfer_seconds": 1.9,
+     "transfer_mib_per_second": 2577.5}
+
+storage_bytes are the bytes the process read from storage during the
+load (/proc/self/io), the rest came from the page cache. The time the
+loading thread spent on the CPU is reported as deserialize_seconds, the
+rest of the load time as read_seconds (waiting on storage).
+
+ComfyUI modules are patched when main.py imports them, so that torch is
+still imported after the CUDA setup of main.py.
+"""
+import importlib.abc
+import importlib.util
+import json
+import os
+import runpy
+import sys
+import time
+
+MODEL_CACHE_DIR = os.environ.get("MODEL_CACHE_DIR")
+MODEL_STORE_DIR = "/home/user/opt/model_store"
+
+# Loads reading less than this share from storage were served from RAM
+PAGE_CACHE_HIT_RATIO = 0.1
+
+MIB = 1024 * 1024
+
+
+def emit(event):
+    print(json.dumps(event), flush=True)
+
+
+def storage_read_bytes():
+    """Bytes read from storage by the process, None without /proc."""
+    try:
+        with open("/proc/self/io") as f:
+            for line in f:
+                if line.startswith("read_bytes:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+
+
+def source(path):
+    if MODEL_CACHE_DIR and path.startswith(MODEL_CACHE_DIR + os.sep):
+        return "nvme-cache"
+    if path.startswith(MODEL_STORE_DIR + os.sep):
+        return "s3"
+    return "ebs"
+
+
+def profile_load(load, path, *args, **kwargs):
+    """Call load (comfy.utils.load_torch_file) and log a model_load event."""
+    path = str(path)
+    read_before = storage_read_bytes()
+    cpu_before = time.thread_time()
+    start = time.perf_counter()
+    result = load(path, *args, **kwargs)
+    load_seconds = time.perf_counter() - start
+    cpu_seconds = min(time.thread_time() - cpu_before, load_seconds)
+
+    size = os.path.getsize(path)
+    event = {
+        "event": "model_load",
+        "file": os.path.basename(path),
+        "folder": os.path.basename(os.path.dirname(path)),
+        "source": source(path),
+        "bytes": size,
+        "load_seconds": round(load_seconds, 3),
+        "read_seconds": round(load_seconds - cpu_seconds, 3),
+        "deserialize_seconds": round(cpu_seconds, 3),
+    }
+    if read_before is not None:
+        storage_bytes = max(storage_read_bytes() - read_before, 0)
+        event["storage_bytes"] = storage_bytes
+        event["page_cache_hit"] = int(storage_bytes < size * PAGE_CACHE_HIT_RATIO)
+    if load_seconds > 0:
+        event["read_mib_per_second"] = round(event.get("storage_bytes", size) / MIB / load_seconds, 1)
+    emit(event)
+    return result
+
+
+def label(model):
+    """File the model was loaded from, or its class."""
+    inner = getattr(model, "model", None)
+    return getattr(model, "profiler_file", None) or type(inner if inner is not None else model).__name__
+
+
+def tag(patchers, path):
+    """Record the file of the model patchers (and CLIP, VAE) of a checkpoint."""
+    for patcher in patchers:
+        patcher = getattr(patcher, "patcher", patcher)
+        if patcher is not None:
+            try:
+                patcher.profiler_file = os.path.basename(str(path))
+            except AttributeError:
+                pass
+
+
+def profile_transfer(model_management, load_models_gpu, models, *args, **kwargs):
+    """Call load_models_gpu and log a model_transfer event."""
+    import torch
+
+    models = list(models)
+    resident = {id(loaded.model) for loaded in model_management.current_loaded_models}
+    loading = [model for model in models if id(model) not in resident]
+    if torch.cuda.is_available():
+        torch.cuda.synchronize()
+    start = time.perf_counter()
+    result = load_models_gpu(models, *args, **kwargs)
+    if torch.cuda.is_available():
+        torch.cuda.synchronize()
+    transfer_seconds = time.perf_counter() - start
+
+    size = sum(model.model_size() for model in loading)
+    event = {
+        "event": "model_transfer",
+        "models": [label(model) for model in models],
+        "loaded": len(loading),
+        "resident": len(models) - len(loading),
+        "vram_hit": int(not loading),
+        "bytes": size,
+        "transfer_seconds": round(transfer_seconds, 3),
+    }
+    if loading and transfer_seconds > 0:
+        event["transfer_mib_per_second"] = round(size / MIB / transfer_seconds, 1)
+    emit(event)
+    return result
+
+
+def patch_utils(utils):
+    load_torch_file = utils.load_torch_file
+
+    def profiled_load_torch_file(ckpt, *args, **kwargs):
+        return profile_load(load_torch_file, ckpt, *args, **kwargs)
+
+    utils.load_torch_file = profiled_load_torch_file
+
+
+def patch_model_management(model_management):
+    load_models_gpu = model_management.load_models_gpu
+
+    def profiled_load_models_gpu(models, *args, **kwargs):
+        return profile_transfer(model_management, load_models_gpu, models, *args, **kwargs)
+
+    model_management.load_models_gpu = profiled_load_models_gpu
+
+
+def patch_sd(sd):
+    load_checkpoint_guess_config = sd.load_checkpoint_guess_config
+    load_diffusion_model = sd.load_diffusion_model
+
+    def tagged_load_checkpoint_guess_config(ckpt_path, *args, **kwargs):
+        out = load_checkpoint_guess_config(ckpt_path, *args, **kwargs)
+        tag(out[:3], ckpt_path)
+        return out
+
+    def tagged_load_diffusion_model(unet_path, *args, **kwargs):
+        model = load_diffusion_model(unet_path, *args, **kwargs)
+        tag([model], unet_path)
+        return model
+
+    sd.load_checkpoint_guess_config = tagged_load_checkpoint_guess_config
+    sd.load_diffusion_model = tagged_load_diffusion_model
+
+
+PATCHES = {
+    "comfy.utils": patch_utils,
+    "comfy.model_management": patch_model_management,
+    "comfy.sd": patch_sd,
+}
+
+
+class PatchFinder(importlib.abc.MetaPathFinder):
+    """Patches modules right after their first import."""
+
+    def __init__(self, patches):
+        self.patches = dict(patches)
+
+    def find_spec(self, name, path, target=None):
+        patch = self.patches.pop(name, None)
+        if patch is None:
+            return None
+        spec = importlib.util.find_spec(name)
+        if spec is None or spec.loader is None:
+            return spec
+        exec_module = spec.loader.exec_module
+
+        def patched_exec_module(module):
+            exec_module(module)
+            try:
+                patch(module)
+            except AttributeError as e:
+                emit({"event": "model_profiler_error", "module": name, "error": str(e)})
+
+        spec.loader.exec_module = patched_exec_module
+        return spec
+
+
+def install(patches=PATCHES):
+    finder = PatchFinder(patches)
+    sys.meta_path.insert(0, finder)
+    return finder
+
+
+def main():
+    script = sys.argv[1]
+    sys.argv = sys.argv[1:]
+    main_py = next(arg for arg in sys.argv if os.path.basename(arg) == "main.py")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(main_py)))
+
+    install()
+    runpy.run_path(script, run_name="__main__")
+
+
+if __name__ == "__main__":
+    main()
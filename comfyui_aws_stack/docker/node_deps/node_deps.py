@@ -0,0 +1,354 @@
+"""
+Custom node dependencies, resolved together and installed from a wheelhouse.
+
+    python node_deps.py [model_profiler.py] ... /home/user/opt/ComfyUI/main.py [ComfyUI arguments]
+
+ComfyUI-Manager installs the requirements of custom nodes into the Python
+of the image, which starts over with every container. The launcher keeps
+them on the data volume, in NODE_DEPS_DIR:
+
+    lock.json       lock hash, custom nodes and the resolved packages
+    wheelhouse/     wheels of every package resolved so far
+    envs/<hash>/    virtual environment of the lock (--system-site-packages)
+
+The lock hash covers the requirements.txt of every enabled custom node and
+the packages of the image. The environment of lock.json is added to
+sys.path and ComfyUI starts right away. When the lock hash changed, the
+update runs in the background (node_deps.py --update <env>) and its environment
+is used from the next start: resolving, downloading and building wheels
+takes longer than the container health check waits. The requirements are
+resolved together, with the packages of the image as constraints, so that
+only the missing packages are installed. Wheels not in the wheelhouse yet
+are downloaded (or built) one at a time, so that an interrupted update
+keeps them, then every package is installed offline into a new
+environment.
+
+Custom nodes whose requirements conflict with the others, or need a
+compiler (the image has none), are left out and logged in lock.json. They
+are retried when the lock hash changes. pip also finds the wheels built
+with the image (PIP_FIND_LINKS, SOURCE_ONLY_PACKAGES of the Dockerfile).
+"""
+import fcntl
+import hashlib
+import importlib.metadata
+import json
+import os
+import platform
+import re
+import runpy
+import shutil
+import site
+import subprocess
+import sys
+import time
+
+CUSTOM_NODES_DIR = os.path.join(os.environ.get("COMFYUI_DATA_DIR", "/home/user/opt/data"), "custom_nodes")
+
+LOCK_VERSION = 1
+
+# Last lines of pip's output in the errors
+ERROR_LINES = 5
+
+
+class DependencyError(Exception):
+    pass
+
+
+def log(message):
+    print(f"[node-deps] {message}", flush=True)
+
+
+def canonical_name(name):
+    # PEP 503
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+def node_requirements(custom_nodes_dir):
+    """Requirement lines of every enabled custom node with a requirements.txt.
+    pip options (-r, -e, --extra-index-url, ...) are skipped."""
+    requirements = {}
+    if not os.path.isdir(custom_nodes_dir):
+        return requirements
+    for node in sorted(os.listdir(custom_nodes_dir)):
+        path = os.path.join(custom_nodes_dir, node, "requirements.txt")
+        if node.startswith(".") or node.endswith(".disabled") or not os.path.isfile(path):
+            continue
+        lines = []
+        with open(path, errors="replace") as f:
+            for line in f:
+                line = re.sub(r"(^|\s)#.*", "", line).strip()
+                if line and not line.startswith("-"):
+                    lines.append(line)
+        if lines:
+            requirements[node] = lines
+    return requirements
+
+
+def base_constraints():
+    """The packages of the image, pinned. Read before any environment is
+    added to sys.path."""
+    pins = {}
+    for dist in importlib.metadata.distributions():
+        name = dist.metadata["Name"]
+        if name:
+            pins.setdefault(canonical_name(name), f"{name}=={dist.version}")
+    return [pins[name] for name in sorted(pins)]
+
+
+def lock_hash(requirements, constraints):
+    return hashlib.sha256(json.dumps({
+        "version": LOCK_VERSION,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "requirements": requirements,
+        "constraints": constraints,
+    }, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def packages_from_report(report):
+    """Packages to install from a pip installation report, with the
+    requirement that pip wheel builds them from."""
+    packages = []
+    for item in report.get("install", []):
+        name = item["metadata"]["name"]
+        version = item["metadata"]["version"]
+        download_info = item.get("download_info", {})
+        requirement = f"{name}=={version}"
+        if item.get("is_direct"):
+            url = download_info["url"]
+            vcs_info = download_info.get("vcs_info")
+            if vcs_info:
+                url = f"{vcs_info['vcs']}+{url}@{vcs_info['commit_id']}"
+            requirement = f"{name} @ {url}"
+        packages.append({"name": name, "version": version, "requirement": requirement})
+    return packages
+
+
+def site_packages(env_dir):
+    return os.path.join(env_dir, "lib", f"python{sys.version_info.major}.{sys.version_info.minor}",
+                        "site-packages")
+
+
+def activate(env_dir):
+    """Adds the environment after the packages of the image, for ComfyUI
+    and the processes it starts (ComfyUI-Manager runs pip)."""
+    path = site_packages(env_dir)
+    site.addsitedir(path)
+    os.environ["PYTHONPATH"] = os.pathsep.join(filter(None, [os.environ.get("PYTHONPATH"), path]))
+
+
+class NodeDeps:
+    def __init__(self, state_dir):
+        self.state_dir = state_dir
+        self.lock_path = os.path.join(state_dir, "lock.json")
+        self.wheelhouse = os.path.join(state_dir, "wheelhouse")
+        self.envs_dir = os.path.join(state_dir, "envs")
+
+    def load_lock(self):
+        try:
+            with open(self.lock_path) as f:
+                lock = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return lock if lock.get("version") == LOCK_VERSION else {}
+
+    def save_lock(self, lock):
+        tmp_path = self.lock_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(lock, f, indent=1)
+        os.replace(tmp_path, self.lock_path)
+
+    def pip(self, env_dir, *args):
+        result = subprocess.run(
+            [os.path.join(env_dir, "bin", "python"), "-m", "pip", *args, "--disable-pip-version-check"],
+            capture_output=True, text=True)
+        if result.returncode:
+            output = (result.stderr or result.stdout).strip().splitlines()
+            raise DependencyError(" / ".join(output[-ERROR_LINES:]))
+        return result.stdout
+
+    def wheel_names(self):
+        """(name, version) of the wheels in the wheelhouse."""
+        names = set()
+        for filename in os.listdir(self.wheelhouse):
+            if filename.endswith(".whl"):
+                name, version = filename.split("-")[:2]
+                names.add((canonical_name(name), version))
+        return names
+
+    def missing_wheels(self, packages):
+        present = self.wheel_names()
+        return [package for package in packages
+                if (canonical_name(package["name"]), package["version"]) not in present]
+
+    def resolve(self, env_dir, lines, constraints_path):
+        """Packages missing from the image and the environment for the
+        requirement lines."""
+        if not lines:
+            return []
+        requirements_path = os.path.join(self.state_dir, "requirements.txt")
+        with open(requirements_path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        report = self.pip(env_dir, "install", "--dry-run", "--quiet", "--report", "-",
+                          "--find-links", self.wheelhouse,
+                          "-r", requirements_path, "-c", constraints_path)
+        return packages_from_report(json.loads(report))
+
+    def fill_wheelhouse(self, env_dir, packages):
+        missing = self.missing_wheels(packages)
+        if missing:
+            log(f"Downloading {len(missing)} wheels: {', '.join(p['name'] for p in missing)}")
+        # One at a time, the wheels are kept when the update is interrupted
+        for package in missing:
+            self.pip(env_dir, "wheel", "--no-deps", "--wheel-dir", self.wheelhouse,
+                     "--find-links", self.wheelhouse, package["requirement"])
+
+    def prepare(self, env_dir, lines, constraints_path):
+        packages = self.resolve(env_dir, lines, constraints_path)
+        self.fill_wheelhouse(env_dir, packages)
+        return packages
+
+    def resolve_nodes(self, env_dir, requirements, constraints_path):
+        """Resolves the custom nodes together, or one by one when they
+        cannot be. Returns the packages, the nodes and the nodes left out."""
+        def lines(nodes):
+            return [line for node in nodes for line in requirements[node]]
+
+        nodes = sorted(requirements)
+        try:
+            return self.prepare(env_dir, lines(nodes), constraints_path), nodes, []
+        except DependencyError as e:
+            log(f"Custom node requirements do not resolve together, adding them one by one: {e}")
+
+        packages, resolved, failed = [], [], []
+        for node in nodes:
+            try:
+                packages = self.prepare(env_dir, lines(resolved + [node]), constraints_path)
+                resolved.append(node)
+            except DependencyError as e:
+                log(f"Leaving out {node}: {e}")
+                failed.append(node)
+        return packages, resolved, failed
+
+    def update(self, requirements, constraints, digest):
+        env_dir = os.path.join(self.envs_dir, digest[:12])
+        if os.path.exists(env_dir):
+            # Left by an interrupted update
+            shutil.rmtree(env_dir)
+        os.makedirs(self.wheelhouse, exist_ok=True)
+        # pip of the image, run by the environment
+        result = subprocess.run(
+            [sys.executable, "-m", "venv", "--system-site-packages", "--without-pip", env_dir],
+            capture_output=True, text=True)
+        if result.returncode:
+            raise DependencyError(result.stderr.strip())
+
+        constraints_path = os.path.join(self.state_dir, "constraints.txt")
+        with open(constraints_path, "w") as f:
+            f.write("\n".join(constraints) + "\n")
+        packages, nodes, failed = self.resolve_nodes(env_dir, requirements, constraints_path)
+        if packages:
+            self.pip(env_dir, "install", "--no-index", "--no-deps", "--find-links", self.wheelhouse,
+                     *(f"{p['name']}=={p['version']}" for p in packages))
+
+        self.save_lock({
+            "version": LOCK_VERSION,
+            "hash": digest,
+            "env": os.path.basename(env_dir),
+            "updated": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "nodes": nodes,
+            "failed_nodes": failed,
+            "packages": packages,
+        })
+        log(f"Installed {len(packages)} packages for {len(nodes)} custom nodes"
+            + (f", left out {', '.join(failed)}" if failed else ""))
+        return env_dir
+
+    def current(self, digest):
+        """Environment of lock.json (None when there is none yet), and
+        whether the lock hash is digest."""
+        lock = self.load_lock()
+        env_dir = os.path.join(self.envs_dir, lock["env"]) if lock else None
+        if env_dir and not os.path.isdir(env_dir):
+            return None, False
+        return env_dir, bool(env_dir) and lock["hash"] == digest
+
+    def sync(self, requirements, constraints, in_use=None):
+        """Environment of the custom node requirements, updated when the
+        lock hash changed. None when there is none yet. The environment
+        in_use (loaded by the running ComfyUI) is not deleted."""
+        os.makedirs(self.envs_dir, exist_ok=True)
+        digest = lock_hash(requirements, constraints)
+        current, up_to_date = self.current(digest)
+        if up_to_date:
+            log(f"Lock {digest[:12]} unchanged, {len(self.load_lock()['packages'])} packages")
+            return current
+
+        log(f"Resolving the requirements of {len(requirements)} custom nodes")
+        try:
+            env_dir = self.update(requirements, constraints, digest)
+        except (DependencyError, OSError, ValueError) as e:
+            # ComfyUI starts anyway, the update is retried at the next start
+            log(f"Update failed, {'keeping the previous environment' if current else 'no environment'}: {e}")
+            return current
+
+        # The previous environment and the one ComfyUI loaded at its start
+        # may still be in use
+        keep = {os.path.basename(env_dir), os.path.basename(current or ""), in_use}
+        for name in os.listdir(self.envs_dir):
+            if name not in keep:
+                shutil.rmtree(os.path.join(self.envs_dir, name), ignore_errors=True)
+        return env_dir
+
+
+def background_update(state_dir, in_use=None):
+    """node_deps.py --update [env]: updates the environment, one update at
+    a time, for the next start of ComfyUI. env is the environment ComfyUI
+    is running with, kept when a later update of the same container
+    replaces the lock again."""
+    os.nice(10)
+    os.makedirs(state_dir, exist_ok=True)
+    with open(os.path.join(state_dir, "update.lock"), "w") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            log("Update already running")
+            return
+        start = time.perf_counter()
+        deps = NodeDeps(state_dir)
+        requirements, constraints = node_requirements(CUSTOM_NODES_DIR), base_constraints()
+        deps.sync(requirements, constraints, in_use)
+        if deps.current(lock_hash(requirements, constraints))[1]:
+            log(f"Updated in {time.perf_counter() - start:.1f}s, restart ComfyUI to use the new environment")
+
+
+def main():
+    state_dir = os.environ.get("NODE_DEPS_DIR")
+    if sys.argv[1:2] == ["--update"]:
+        background_update(state_dir, *sys.argv[2:3])
+        return
+
+    script = sys.argv[1]
+    sys.argv = sys.argv[1:]
+    main_py = next(arg for arg in sys.argv if os.path.basename(arg) == "main.py")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(main_py)))
+
+    if state_dir:
+        deps = NodeDeps(state_dir)
+        requirements = node_requirements(CUSTOM_NODES_DIR)
+        env_dir, up_to_date = deps.current(lock_hash(requirements, base_constraints()))
+        if not up_to_date:
+            # Started before the environment is added to PYTHONPATH
+            log(f"Requirements of {len(requirements)} custom nodes changed, updating in the background"
+                + (", keeping the previous environment" if env_dir else ""))
+            subprocess.Popen([sys.executable, os.path.abspath(__file__), "--update"]
+                             + ([os.path.basename(env_dir)] if env_dir else []))
+        if env_dir:
+            activate(env_dir)
+            log(f"Using {env_dir}")
+
+    runpy.run_path(script, run_name="__main__")
+
+
+if __name__ == "__main__":
+    main()
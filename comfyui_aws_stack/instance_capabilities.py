@@ -0,0 +1,87 @@
+import json
+import os
+
+# Generated by scripts/generate_instance_types.py (make instance-types)
+INSTANCE_TYPES_FILE = os.path.join(os.path.dirname(__file__), "instance_types.json")
+
+# Share of the RAM left to the task, the rest is kept for the OS, the ECS
+# and Docker daemons and the sidecars
+TASK_MEMORY_RATIO = 0.9
+
+# --highvram keeps every model on the GPU (L40S), --lowvram splits the
+# UNet between GPU and RAM
+HIGHVRAM_MIN_MIB = 40 * 1024
+LOWVRAM_MAX_MIB = 8 * 1024
+
+# Host swap for models offloaded from the GPU that do not fit in RAM,
+# on the 50 GiB root volume
+MIN_SWAP_MIB = 4 * 1024
+MAX_SWAP_MIB = 16 * 1024
+
+# Node outputs (including loaded models) kept in RAM across prompts, per
+# RAM available to a ComfyUI task. Below 32 GiB the classic cache only keeps
+# the last prompt.
+CACHE_LRU_SIZES = [
+    (64 * 1024, 20),
+    (32 * 1024, 10),
+]
+
+
+def load_instance_types(path=INSTANCE_TYPES_FILE):
+    with open(path) as f:
+        return json.load(f)
+
+
+def instance_capabilities(instance_type, table=None):
+    """vcpus, memory_mib, gpus, gpu_memory_mib (per GPU) and
+    instance_storage_gb (NVMe) of an instance type."""
+    table = table or load_instance_types()
+    if instance_type not in table:
+        raise ValueError(
+            f"{instance_type} is not in {os.path.basename(INSTANCE_TYPES_FILE)}, "
+            "add it with scripts/generate_instance_types.py")
+    return table[instance_type]
+
+
+def comfyui_settings(instance_type, table=None):
+    """Settings of the ComfyUI task running on one GPU of an instance type:
+    RAM and vCPUs are shared between the GPUs (one task per GPU)."""
+    capabilities = instance_capabilities(instance_type, table)
+    gpus = capabilities["gpus"]
+    memory_mib = capabilities["memory_mib"] // gpus
+    vram_mib = capabilities["gpu_memory_mib"]
+
+    if vram_mib >= HIGHVRAM_MIN_MIB:
+        args = ["--highvram"]
+    elif vram_mib <= LOWVRAM_MAX_MIB:
+        args = ["--lowvram"]
+    else:
+        args = ["--normalvram"]
+    for min_memory_mib, cache_size in CACHE_LRU_SIZES:
+        if memory_mib >= min_memory_mib:
+            args += ["--cache-lru", str(cache_size)]
+            break
+
+    # Models offloaded from every GPU, less the half of the RAM not used by
+    # the running workflows
+    swap_mib = capabilities["gpu_memory_mib"] * gpus - capabilities["memory_mib"] // 2
+    swap_mib = min(max(swap_mib, MIN_SWAP_MIB), MAX_SWAP_MIB)
+
+    return {
+        "memory_reservation_mib": int(memory_mib * TASK_MEMORY_RATIO),
+        "swap_mib": swap_mib,
+        "threads": max(capabilities["vcpus"] // gpus, 1),
+        "args": args,
+    }
+
+
+def task_settings(instance_types, table=None):
+    """Task definition settings that fit every instance type of the ASG: the
+    memory reservation of the smallest one, and swap up to the largest host
+    swap file."""
+    table = table or load_instance_types()
+    settings = [comfyui_settings(instance_type, table) for instance_type in instance_types]
+    return {
+        "memory_reservation_mib": min(s["memory_reservation_mib"] for s in settings),
+        "max_swap_mib": max(s["swap_mib"] for s in settings),
+    }
@@ -1,26 +1,28 @@
-import boto3
-import os
+import json
 
+from cluster_state import get_cluster_state, current_phase
+from model_loads import model_loads_html
+from workers import max_workers, multi_worker
 
-def handler(event, context):
-    asg_name = os.environ.get("ASG_NAME")
-    ecs_cluster_name = os.environ.get("ECS_CLUSTER_NAME")
-    ecs_service_name = os.environ.get("ECS_SERVICE_NAME")
+# Text shown under the loader for each scale-up phase
+PHASE_MESSAGES = {
+    "instance_launching": "Launching the GPU instance.",
+    "task_placed": "Instance is up. Starting the ComfyUI container.",
+    "container_running": "Container started. Waiting for ComfyUI to become healthy.",
+    "container_healthy": "ComfyUI is healthy. Switching traffic.",
+    "ready": "ComfyUI is ready. Redirecting.",
+}
 
-    # Clients
-    asg_client = boto3.client('autoscaling')
-    ecs_client = boto3.client('ecs')
 
+def handler(event, context):
     try:
-        # Get ASG and ECS status
-        asg_response = asg_client.describe_auto_scaling_groups(
-            AutoScalingGroupNames=[asg_name])
-        ecs_response = ecs_client.describe_services(
-            cluster=ecs_cluster_name, services=[ecs_service_name])
+        # Get ASG and ECS status (cached, kept current by EventBridge)
+        state = get_cluster_state()
+        phase = current_phase(state)
 
-        desired_capacity = asg_response['AutoScalingGroups'][0]['DesiredCapacity']
-        running_tasks_count = ecs_response['services'][0]['runningCount']
-        instances = asg_response['AutoScalingGroups'][0]['Instances']
+        desired_capacity = state['desired_capacity']
+        running_tasks_count = state['running_count']
+        instances = state['instances']
 
         # Determine the status and what to display
         if desired_capacity > 0 and running_tasks_count > 0 and instances:
@@ -28,8 +30,8 @@ def handler(event, context):
             display_restart_shutdown = True
             display_scaleup = False
             status_message = ""
-        elif desired_capacity > 0 and instances:
-            # ComfyUI is currently scaling up
+        elif desired_capacity > 0:
+            # ComfyUI is currently scaling up (instance may not be listed yet)
             display_restart_shutdown = False
             display_scaleup = False
             status_message = "ComfyUI is currently scaling up. It may take 5-10 minutes"
@@ -57,6 +59,9 @@ def handler(event, context):
             <div>
                 <a href='/admin/shutdown' class='button-link'>Shutdown ComfyUI</a>
             </div>
+            <div>
+                <a href='/admin/models' class='button-link'>Download Models</a>
+            </div>
         </div>
         """ if display_restart_shutdown else ""
 
@@ -67,8 +72,18 @@ def handler(event, context):
         </div>
         """ if display_scaleup else ""
 
+        # N-worker mode: list the worker instances
+        workers_html = f"""
+        <p>{running_tasks_count} of up to {max_workers()} workers running</p>
+        <p>{'<br>'.join(instances)}</p>
+        """ if display_restart_shutdown and multi_worker() else ""
+
+        # Model load profiler summary
+        model_loads = model_loads_html() if display_restart_shutdown else ""
+
         status_html = f"<p id='status-message'>{status_message}</p>" if status_message else ""
         if "ComfyUI is currently scaling up." in status_html:
+            status_html += f"<p id='phase-message'>{PHASE_MESSAGES.get(phase, '')}</p>"
             status_html += '<div class="loader"></div>'
 
         # Full HTML Content
@@ -121,29 +136,63 @@ def handler(event, context):
                         animation: spin 1s linear infinite;
                         margin: 20px auto;
                     }}
+                    .model-loads {{
+                        font-size: 12px;
+                        border-collapse: collapse;
+                        margin: 0 auto;
+                    }}
+                    .model-loads th, .model-loads td {{
+                        padding: 2px 6px;
+                        border-bottom: 1px solid #ddd;
+                    }}
                     @keyframes spin {{
                         0% {{ transform: rotate(0deg); }}
                         100% {{ transform: rotate(360deg); }}
                     }}
                 </style>
                 <script>
-                    function checkAndReload() {{
+                    const phaseMessages = {json.dumps(PHASE_MESSAGES)};
+
+                    // Long-poll /admin/status, which answers as soon as the phase changes
+                    async function waitForPhase(phase) {{
+                        try {{
+                            const response = await fetch('/admin/status?phase=' + encodeURIComponent(phase),
+                                                         {{ credentials: 'same-origin', cache: 'no-store' }});
+                            if (!response.ok) throw new Error(response.statusText);
+                            const status = await response.json();
+                            if (status.phase === 'ready') {{
+                                location.href = '/';
+                                return;
+                            }}
+                            if (!(status.phase in phaseMessages)) {{
+                                location.reload();
+                                return;
+                            }}
+                            document.getElementById('phase-message').textContent = phaseMessages[status.phase];
+                            waitForPhase(status.phase);
+                        }} catch (e) {{
+                            // e.g. expired session: fall back to a full reload
+                            setTimeout(() => location.reload(), 30000);
+                        }}
+                    }}
+
+                    function checkAndWait() {{
                         const statusMessage = document.getElementById('status-message');
                         if (statusMessage && statusMessage.textContent.includes("ComfyUI is currently scaling up.")) {{
-                            setTimeout(() => {{
-                                location.reload();
-                            }}, 30000); // reload every 30 seconds
+                            waitForPhase({json.dumps(phase)});
                         }}
                     }}
-                    window.onload = checkAndReload;
+                    window.onload = checkAndWait;
                 </script>
             </head>
             <body>
                 <main>
                     <h1>ComfyUI Admin</h1>
+                    {workers_html}
                     {restart_shutdown_html}
                     {scaleup_html}
                     {status_html}
+                    {model_loads}
                 </main>
             </body>
             </html>
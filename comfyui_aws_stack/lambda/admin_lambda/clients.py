@@ -0,0 +1,30 @@
+import boto3
+
+# boto3 clients are expensive to build (endpoint and model loading), so each
+# one is created on first use and then shared by every invocation that lands
+# on the same Lambda container.
+_clients = {}
+_resources = {}
+
+
+def client(service_name):
+    if service_name not in _clients:
+        _clients[service_name] = boto3.client(service_name)
+    return _clients[service_name]
+
+
+def resource(service_name):
+    if service_name not in _resources:
+        _resources[service_name] = boto3.resource(service_name)
+    return _resources[service_name]
+
+
+_parameters = {}
+
+
+def parameter(name):
+    """SSM parameter value, read once per container."""
+    if name not in _parameters:
+        _parameters[name] = client('ssm').get_parameter(
+            Name=name)['Parameter']['Value']
+    return _parameters[name]
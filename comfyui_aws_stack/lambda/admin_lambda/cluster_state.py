@@ -0,0 +1,142 @@
+import os
+import time
+from decimal import Decimal
+
+from clients import client, resource
+
+# Key of the single item holding the cached cluster state
+CLUSTER_STATE_KEY = "cluster"
+
+# Scale-up phases in the order they are reached. "ready" means the
+# scale-up listener has switched "/" back to ComfyUI.
+SCALE_UP_PHASES = [
+    "instance_launching",
+    "task_placed",
+    "container_running",
+    "container_healthy",
+    "ready",
+]
+
+
+_tables = {}
+
+
+def _table():
+    table_name = os.environ["CLUSTER_STATE_TABLE_NAME"]
+    if table_name not in _tables:
+        _tables[table_name] = resource('dynamodb').Table(table_name)
+    return _tables[table_name]
+
+
+def _max_age():
+    return int(os.environ.get("CLUSTER_STATE_TTL_SECONDS", "60"))
+
+
+def _from_item(item):
+    return {
+        "desired_capacity": int(item["desired_capacity"]),
+        "instances": list(item.get("instances", [])),
+        "service_desired_count": int(item["service_desired_count"]),
+        "running_count": int(item["running_count"]),
+        "updated_at": float(item["updated_at"]),
+        "phase": item.get("phase"),
+    }
+
+
+def describe_cluster_state():
+    """Read the current ASG and ECS service state from the describe APIs."""
+    asg_client = client('autoscaling')
+    ecs_client = client('ecs')
+
+    asg_response = asg_client.describe_auto_scaling_groups(
+        AutoScalingGroupNames=[os.environ["ASG_NAME"]])
+    ecs_response = ecs_client.describe_services(
+        cluster=os.environ["ECS_CLUSTER_NAME"],
+        services=[os.environ["ECS_SERVICE_NAME"]])
+
+    asg = asg_response['AutoScalingGroups'][0]
+    service = ecs_response['services'][0]
+    return {
+        "desired_capacity": asg['DesiredCapacity'],
+        "instances": [instance['InstanceId'] for instance in asg['Instances']],
+        "service_desired_count": service['desiredCount'],
+        "running_count": service['runningCount'],
+        "updated_at": time.time(),
+    }
+
+
+def refresh_cluster_state():
+    """Describe the cluster and store the result in the cache."""
+    state = describe_cluster_state()
+    try:
+        # Update rather than put so the recorded phase survives a refresh
+        response = _table().update_item(
+            Key={"id": CLUSTER_STATE_KEY},
+            UpdateExpression="SET desired_capacity = :desired_capacity, "
+                             "instances = :instances, "
+                             "service_desired_count = :service_desired_count, "
+                             "running_count = :running_count, "
+                             "updated_at = :updated_at",
+            ExpressionAttributeValues={
+                ":desired_capacity": state["desired_capacity"],
+                ":instances": state["instances"],
+                ":service_desired_count": state["service_desired_count"],
+                ":running_count": state["running_count"],
+                ":updated_at": Decimal(str(state["updated_at"])),
+            },
+            ReturnValues="ALL_NEW",
+        )
+        return _from_item(response["Attributes"])
+    except Exception as e:
+        print(f"Error writing cluster state cache: {e}")
+    state["phase"] = None
+    return state
+
+
+def get_cluster_state():
+    """Return the cached cluster state, falling back to the describe APIs
+    when the cache is empty, older than the TTL or unreachable."""
+    try:
+        item = _table().get_item(
+            Key={"id": CLUSTER_STATE_KEY}).get("Item")
+        if item and time.time() - float(item["updated_at"]) < _max_age():
+            return _from_item(item)
+    except Exception as e:
+        print(f"Error reading cluster state cache: {e}")
+    return refresh_cluster_state()
+
+
+def update_cluster_state(**fields):
+    """Apply a known change (e.g. a new desired capacity) to the cached state
+    without another describe call. The timestamp is left untouched so the
+    remaining fields still expire on schedule."""
+    names = {f"#{key}": key for key in fields}
+    values = {f":{key}": value for key, value in fields.items()}
+    try:
+        _table().update_item(
+            Key={"id": CLUSTER_STATE_KEY},
+            UpdateExpression="SET " + ", ".join(
+                f"#{key} = :{key}" for key in fields),
+            ConditionExpression="attribute_exists(id)",
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+        )
+    except Exception as e:
+        # Nothing cached yet (or cache unreachable): next read will describe
+        print(f"Error updating cluster state cache: {e}")
+
+
+def current_phase(state):
+    """Return the phase to show for the given state. A recorded phase is
+    only trusted while it agrees with the ASG / ECS counts, so scheduled
+    and alarm-driven scaling still show up correctly."""
+    phase = state.get("phase")
+    if state["desired_capacity"] > 0:
+        if state["running_count"] > 0:
+            return phase if phase in SCALE_UP_PHASES else "ready"
+        if phase in SCALE_UP_PHASES and phase != "ready":
+            return phase
+        return "instance_launching"
+    if state["running_count"] > 0:
+        return "scaling_down"
+    return "stopped"
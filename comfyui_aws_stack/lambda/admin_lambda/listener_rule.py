@@ -0,0 +1,36 @@
+import os
+
+from clients import client, parameter
+
+# Paths served by the admin router while ComfyUI is up
+SCALED_UP_PATHS = ['/admin']
+
+# While ComfyUI is scaled down the admin page is also served on "/" and,
+# with the prompt buffer, prompt submissions are queued (see prompt_buffer.py)
+SCALED_DOWN_PATHS = ['/', '/admin']
+PROMPT_PATHS = ['/prompt', '/api/prompt']
+
+
+def _modify_rule(paths):
+    client('elbv2').modify_rule(
+        RuleArn=parameter(os.environ['LISTENER_RULE_ARN_PARAMETER']),
+        Conditions=[
+            {
+                'Field': 'path-pattern',
+                'Values': paths
+            }
+        ]
+    )
+
+
+def route_to_admin():
+    """Serve the admin page (and buffer prompts) while ComfyUI is down."""
+    paths = SCALED_DOWN_PATHS
+    if os.environ.get('PROMPT_QUEUE_URL'):
+        paths = paths + PROMPT_PATHS
+    _modify_rule(paths)
+
+
+def route_to_comfyui():
+    """Forward everything but the admin paths to ComfyUI."""
+    _modify_rule(SCALED_UP_PATHS)
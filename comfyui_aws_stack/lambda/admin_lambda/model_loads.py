@@ -0,0 +1,130 @@
+import html
+import json
+import os
+import time
+
+from clients import client
+
+# Events of the model load profiler (docker/model_profiler) summarized on
+# the admin page
+SUMMARY_HOURS = 24
+MAX_EVENTS = 500
+# Sparse log groups return empty pages with a nextToken
+MAX_CALLS = 20
+
+
+def recent_events(log_group, hours=SUMMARY_HOURS, max_events=MAX_EVENTS, max_calls=MAX_CALLS):
+    """Newest profiler events of the last hours, oldest first. The hours
+    are read backwards, in windows of 1, 2, 4, ... hours, until max_events
+    are found or after max_calls calls to FilterLogEvents."""
+    end = int(time.time() * 1000)
+    start = end - hours * 3600 * 1000
+    window = 3600 * 1000
+    events, calls = [], 0
+    while end > start and len(events) < max_events and calls < max_calls:
+        window_start = max(start, end - window)
+        window *= 2
+        kwargs = {
+            "logGroupName": log_group,
+            "startTime": window_start,
+            # Inclusive
+            "endTime": end - 1,
+            "filterPattern": '{ $.event = "model_load" || $.event = "model_transfer" }',
+        }
+        while calls < max_calls:
+            response = client('logs').filter_log_events(**kwargs)
+            calls += 1
+            for log_event in response["events"]:
+                try:
+                    events.append((log_event["timestamp"], json.loads(log_event["message"])))
+                except ValueError:
+                    continue
+            if "nextToken" not in response:
+                break
+            kwargs["nextToken"] = response["nextToken"]
+        end = window_start
+    events.sort(key=lambda item: item[0])
+    return [event for _, event in events[-max_events:]]
+
+
+def summarize(events):
+    """Per model file: loads, page cache hits, mean load, read and
+    deserialize times and read throughput. GPU transfers: count, VRAM
+    hits, mean transfer time and throughput."""
+    files = {}
+    for event in events:
+        if event.get("event") != "model_load":
+            continue
+        row = files.setdefault(event["file"], {
+            "file": event["file"], "folder": event.get("folder"), "loads": 0, "page_cache_hits": 0,
+            "load_seconds": 0.0, "read_seconds": 0.0, "deserialize_seconds": 0.0, "throughputs": []})
+        row["loads"] += 1
+        row["page_cache_hits"] += event.get("page_cache_hit", 0)
+        row["source"] = event.get("source")
+        for key in ("load_seconds", "read_seconds", "deserialize_seconds"):
+            row[key] += event.get(key, 0)
+        if not event.get("page_cache_hit") and "read_mib_per_second" in event:
+            row["throughputs"].append(event["read_mib_per_second"])
+
+    loads = []
+    for row in files.values():
+        throughputs = row.pop("throughputs")
+        for key in ("load_seconds", "read_seconds", "deserialize_seconds"):
+            row[key] = round(row[key] / row["loads"], 1)
+        row["read_mib_per_second"] = round(sum(throughputs) / len(throughputs)) if throughputs else None
+        loads.append(row)
+    loads.sort(key=lambda row: row["load_seconds"], reverse=True)
+
+    transfers = [event for event in events if event.get("event") == "model_transfer"]
+    moved = [event for event in transfers if event.get("loaded")]
+    throughputs = [event["transfer_mib_per_second"] for event in moved if "transfer_mib_per_second" in event]
+    return {
+        "loads": loads,
+        "transfers": {
+            "count": len(transfers),
+            "vram_hits": sum(event.get("vram_hit", 0) for event in transfers),
+            "transfer_seconds": round(sum(event["transfer_seconds"] for event in moved) / len(moved), 1)
+            if moved else None,
+            "transfer_mib_per_second": round(sum(throughputs) / len(throughputs)) if throughputs else None,
+        },
+    }
+
+
+def summary_html(summary):
+    if not summary["loads"] and not summary["transfers"]["count"]:
+        return f"<p>No model loads in the last {SUMMARY_HOURS} hours</p>"
+
+    def cell(value, suffix=""):
+        return "-" if value is None else f"{value}{suffix}"
+
+    rows = "".join(
+        f"<tr><td>{html.escape(row['file'])}</td><td>{html.escape(str(row['source']))}</td>"
+        f"<td>{row['loads']}</td><td>{row['page_cache_hits']}</td>"
+        f"<td>{row['load_seconds']}s</td><td>{row['read_seconds']}s</td>"
+        f"<td>{row['deserialize_seconds']}s</td><td>{cell(row['read_mib_per_second'], ' MiB/s')}</td></tr>"
+        for row in summary["loads"]
+    )
+    transfers = summary["transfers"]
+    return f"""
+        <h2>Model loads (last {SUMMARY_HOURS} hours)</h2>
+        <table class='model-loads'>
+            <tr><th>File</th><th>Source</th><th>Loads</th><th>RAM hits</th>
+                <th>Load</th><th>Read</th><th>Deserialize</th><th>Read speed</th></tr>
+            {rows}
+        </table>
+        <p>GPU: {transfers['count']} model loads, {transfers['vram_hits']} already in VRAM,
+           {cell(transfers['transfer_seconds'], 's')} per transfer
+           ({cell(transfers['transfer_mib_per_second'], ' MiB/s')})</p>
+        """
+
+
+def model_loads_html():
+    """Summary for the admin page, empty without the profiler."""
+    log_group = os.environ.get("MODEL_LOAD_LOG_GROUP")
+    if not log_group:
+        return ""
+    try:
+        return summary_html(summarize(recent_events(log_group)))
+    except Exception as e:
+        print(f"Error summarizing model loads: {e}")
+        return "<p>Unable to summarize the model loads.</p>"
@@ -0,0 +1,45 @@
+import json
+
+from clients import client
+from cluster_state import get_cluster_state
+
+# Runs the downloader of the image in the ComfyUI container of every worker.
+# Its output goes to the container log (the stdout of process 1).
+DOWNLOAD_COMMAND = (
+    "docker ps -q --filter label=com.amazonaws.ecs.container-name=ComfyUIContainer"
+    " | xargs -r -I{} docker exec -d {} sh -c"
+    " 'python /home/user/opt/model_downloader/download_models.py > /proc/1/fd/1 2>&1'"
+)
+
+
+def send_download_command(instance_ids):
+    response = client('ssm').send_command(
+        InstanceIds=instance_ids,
+        DocumentName="AWS-RunShellScript",
+        Parameters={'commands': [DOWNLOAD_COMMAND]}
+    )
+    return response['Command']['CommandId']
+
+
+def handler(event, context):
+    # Download the models of the manifest (comfyui_config/models.json) that
+    # are missing on the volume, without restarting ComfyUI
+    state = get_cluster_state()
+    instances = state['instances'] if state['running_count'] >= 1 else []
+    if not instances:
+        body = {"message": "ComfyUI is not running, start it to download models"}
+        status_code = 409
+    else:
+        command_id = send_download_command(instances)
+        body = {
+            "message": "Model download started, progress is in the ComfyUI log",
+            "instances": instances,
+            "command_id": command_id,
+        }
+        status_code = 202
+
+    return {
+        "statusCode": status_code,
+        "body": json.dumps(body),
+        "headers": {"Content-Type": "application/json"}
+    }
@@ -0,0 +1,161 @@
+import base64
+import json
+import os
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+from clients import client
+from scaleup_trigger import trigger_scale_up
+
+# Single message group: the FIFO queue replays prompts in submission order
+MESSAGE_GROUP_ID = "prompts"
+
+# SQS message size limit
+MAX_PROMPT_BYTES = 256 * 1024
+
+# A replay stops after REPLAY_SECONDS and leaves the remaining prompts in
+# the queue, well within the 5 minute timeout of the replay function so
+# that it still switches the listener rule back to ComfyUI
+REPLAY_SECONDS = 180
+REPLAY_RETRY_SECONDS = 10
+SUBMIT_TIMEOUT_SECONDS = 30
+
+
+def _queue_url():
+    return os.environ.get("PROMPT_QUEUE_URL")
+
+
+def _json_response(status_code, body):
+    return {
+        "statusCode": status_code,
+        "body": json.dumps(body),
+        "headers": {"Content-Type": "application/json"}
+    }
+
+
+def _error_response(status_code, error_type, message):
+    # Same error shape as the ComfyUI /prompt API
+    return _json_response(status_code, {
+        "error": {"type": error_type, "message": message, "details": "", "extra_info": {}},
+        "node_errors": {},
+    })
+
+
+def queued_prompts():
+    """Approximate number of buffered prompts (0 without a prompt buffer)."""
+    if not _queue_url():
+        return 0
+    attributes = client('sqs').get_queue_attributes(
+        QueueUrl=_queue_url(),
+        AttributeNames=["ApproximateNumberOfMessages",
+                        "ApproximateNumberOfMessagesNotVisible"]
+    )["Attributes"]
+    return sum(int(value) for value in attributes.values())
+
+
+def enqueue(prompt):
+    """Buffer a ComfyUI /prompt request body and return its prompt ID.
+
+    The ID is set in the body, ComfyUI uses a client supplied prompt_id, so
+    the job ID returned now is the one ComfyUI reports in /history later."""
+    prompt_id = prompt.get("prompt_id") or str(uuid.uuid4())
+    body = json.dumps({**prompt, "prompt_id": prompt_id})
+    if len(body.encode()) > MAX_PROMPT_BYTES:
+        raise ValueError(f"Prompt is larger than {MAX_PROMPT_BYTES} bytes")
+
+    client('sqs').send_message(
+        QueueUrl=_queue_url(),
+        MessageBody=body,
+        MessageGroupId=MESSAGE_GROUP_ID,
+        # Unique per enqueue: a prompt moved back by the Spot drain shortly
+        # after its replay would otherwise be dropped as a duplicate
+        MessageDeduplicationId=str(uuid.uuid4()),
+    )
+    return prompt_id
+
+
+def _submit(comfyui_url, body, deadline):
+    """POST one buffered prompt to ComfyUI. Returns False if ComfyUI could
+    not be reached before the deadline (time.monotonic())."""
+    attempt = 0
+    while deadline - time.monotonic() > 0:
+        attempt += 1
+        request = urllib.request.Request(
+            f"{comfyui_url}/prompt", data=body.encode(), method="POST",
+            headers={"Content-Type": "application/json"})
+        try:
+            timeout = min(SUBMIT_TIMEOUT_SECONDS, max(1, deadline - time.monotonic()))
+            with urllib.request.urlopen(request, timeout=timeout):
+                return True
+        except urllib.error.HTTPError as e:
+            if e.code == 400:
+                # Invalid prompt (e.g. missing node or model), it would be
+                # rejected again, so it is dropped
+                print(f"Dropping prompt rejected by ComfyUI: {e.read().decode(errors='replace')}")
+                return True
+            print(f"Error replaying prompt (attempt {attempt}): {e}")
+        except (urllib.error.URLError, TimeoutError) as e:
+            print(f"Error replaying prompt (attempt {attempt}): {e}")
+        time.sleep(max(0, min(REPLAY_RETRY_SECONDS, deadline - time.monotonic())))
+    return False
+
+
+def replay(comfyui_url, seconds=REPLAY_SECONDS):
+    """Submit the buffered prompts to ComfyUI in order and delete each one
+    once ComfyUI accepted it, for at most the given seconds. Returns the
+    number of replayed prompts."""
+    deadline = time.monotonic() + seconds
+    sqs_client = client('sqs')
+    replayed = 0
+    while True:
+        messages = sqs_client.receive_message(
+            QueueUrl=_queue_url(),
+            MaxNumberOfMessages=10,
+            WaitTimeSeconds=0,
+        ).get("Messages", [])
+        if not messages:
+            return replayed
+        for message in messages:
+            if not _submit(comfyui_url, message["Body"], deadline):
+                # The unacknowledged prompts become visible again after the
+                # queue visibility timeout, still in order
+                return replayed
+            sqs_client.delete_message(
+                QueueUrl=_queue_url(),
+                ReceiptHandle=message["ReceiptHandle"]
+            )
+            replayed += 1
+
+
+def handler(event, context):
+    # /prompt and /api/prompt are only routed here while ComfyUI is scaled
+    # down (see listener_rule.py)
+    method = event.get("httpMethod", "GET")
+    if method == "GET":
+        # Enough of the ComfyUI response for clients polling the queue
+        return _json_response(200, {"exec_info": {"queue_remaining": queued_prompts()}})
+    if method != "POST":
+        return _error_response(405, "method_not_allowed", f"{method} is not supported while ComfyUI is scaled down")
+
+    body = event.get("body") or ""
+    if event.get("isBase64Encoded"):
+        body = base64.b64decode(body).decode()
+    try:
+        prompt = json.loads(body)
+    except ValueError:
+        return _error_response(400, "invalid_prompt", "Request body is not valid JSON")
+    if not isinstance(prompt, dict) or "prompt" not in prompt:
+        return _error_response(400, "no_prompt", "No prompt provided")
+
+    try:
+        prompt_id = enqueue(prompt)
+    except ValueError as e:
+        return _error_response(413, "prompt_too_large", str(e))
+    number = queued_prompts()
+
+    message = trigger_scale_up()
+    print(f"Buffered prompt {prompt_id}: {message}")
+
+    return _json_response(200, {"prompt_id": prompt_id, "number": number, "node_errors": {}})
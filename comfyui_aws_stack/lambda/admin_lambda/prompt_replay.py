@@ -0,0 +1,44 @@
+from cluster_state import get_cluster_state, update_cluster_state
+from listener_rule import route_to_comfyui
+from prompt_buffer import queued_prompts, replay
+from scaleup_trace import record_milestone
+
+COMFYUI_PORT = 8181
+
+
+def task_private_ip(detail):
+    """Private IP of an awsvpc task from an ECS Task State Change event or
+    a describe_tasks result (the ENI attachment type differs)."""
+    for attachment in detail.get('attachments', []):
+        for item in attachment.get('details', []):
+            if item.get('name') == 'privateIPv4Address':
+                return item.get('value')
+    return None
+
+
+def handler(event, context):
+    # Runs in the VPC (to reach the task) on ECS Task State Change events of
+    # tasks that became RUNNING and HEALTHY
+    detail = event.get('detail', {})
+    task_ip = task_private_ip(detail)
+    if not task_ip:
+        print(f"No private IP in the event of task {detail.get('taskArn')}")
+        return {"statusCode": 200}
+
+    try:
+        replayed = replay(f"http://{task_ip}:{COMFYUI_PORT}")
+        print(f"Replayed {replayed} buffered prompts to {task_ip}")
+    finally:
+        # The scale-up listener leaves the listener rule alone while prompts
+        # are buffered, so that new prompts are not run ahead of them. The
+        # rule is switched even if the replay failed: prompts that could not
+        # be replayed stay queued until the next scale-up.
+        remaining = queued_prompts()
+        if remaining:
+            print(f"{remaining} buffered prompts could not be replayed")
+        if get_cluster_state()['desired_capacity'] >= 1:
+            route_to_comfyui()
+            update_cluster_state(phase="ready")
+            record_milestone("listener_flipped")
+
+    return {"statusCode": 200}
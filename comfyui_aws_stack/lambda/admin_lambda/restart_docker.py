@@ -1,12 +1,14 @@
-import boto3
-import os
 
+from clients import client
+from cluster_state import get_cluster_state
+from listener_rule import route_to_admin
 
-def send_docker_restart_command(instance_id):
-    ssm_client = boto3.client('ssm')
+
+def send_docker_restart_command(instance_ids):
+    ssm_client = client('ssm')
     command = "sudo systemctl restart docker"
     response = ssm_client.send_command(
-        InstanceIds=[instance_id],
+        InstanceIds=instance_ids,
         DocumentName="AWS-RunShellScript",
         Parameters={'commands': [command]}
     )
@@ -15,44 +17,20 @@ def send_docker_restart_command(instance_id):
 
 def handler(event, context):
 
-    asg_name = os.environ.get("ASG_NAME")
-    cluster_name = os.environ.get("ECS_CLUSTER_NAME")
-    service_name = os.environ.get("ECS_SERVICE_NAME")
-    listener_rule_arn = os.environ.get('LISTENER_RULE_ARN')
-
-    ecs_client = boto3.client('ecs')
-    scaling_client = boto3.client('autoscaling')
-    elbv2_client = boto3.client('elbv2')
-
     try:
-        asg_response = scaling_client.describe_auto_scaling_groups(
-            AutoScalingGroupNames=[asg_name]
-        )
+        state = get_cluster_state()
 
-        desired_capacity = asg_response['AutoScalingGroups'][0]['DesiredCapacity']
-        if desired_capacity == 1:
+        desired_capacity = state['desired_capacity']
+        if desired_capacity >= 1:
             # Check if the service has the expected number of RUNNING tasks
-            response = ecs_client.describe_services(
-                cluster=cluster_name,
-                services=[service_name]
-            )
-            running_count = response['services'][0]['runningCount']
+            running_count = state['running_count']
             if running_count >= 1:
-                instances = asg_response['AutoScalingGroups'][0]['Instances']
-                # Assuming max capacity of 1, get the first instance ID
+                instances = state['instances']
+                # Restart docker on every worker instance
                 if instances:
-                    instance_id = instances[0]['InstanceId']
-                    command_id = send_docker_restart_command(instance_id)
+                    command_id = send_docker_restart_command(instances)
                     # Update the listener rule to redirect to the admin page per default
-                    elbv2_client.modify_rule(
-                        RuleArn=listener_rule_arn,
-                        Conditions=[
-                            {
-                                'Field': 'path-pattern',
-                                'Values': ['/', '/admin']
-                            }
-                        ]
-                    )
+                    route_to_admin()
                     message = f"Docker restart command sent. Command ID: {command_id}"
                 else:
                     message = "No running instance found for ASG"
@@ -0,0 +1,62 @@
+import json
+
+import admin
+import models
+import prompt_buffer
+import restart_docker
+import scalein_listener
+import scaleup_listener
+import scaleup_trace
+import scaleup_trigger
+import shutdown
+import signout
+import status
+import view
+
+# ALB requests, dispatched on the request path
+PATH_HANDLERS = {
+    # "/" is only routed here while ComfyUI is scaled down
+    "/": admin.handler,
+    "/admin": admin.handler,
+    "/admin/status": status.handler,
+    "/admin/restart": restart_docker.handler,
+    "/admin/models": models.handler,
+    "/admin/shutdown": shutdown.handler,
+    "/admin/scaleup": scaleup_trigger.handler,
+    "/signout": signout.handler,
+    # Only routed here while ComfyUI is scaled down and the prompt buffer is
+    # enabled
+    "/prompt": prompt_buffer.handler,
+    "/api/prompt": prompt_buffer.handler,
+    # Output files (type=output), only routed here with the output offload
+    "/view": view.handler,
+    "/api/view": view.handler,
+}
+
+# EventBridge events, dispatched on the event source and detail type
+EVENT_HANDLERS = {
+    ("aws.autoscaling", "EC2 Instance-terminate Lifecycle Action"): scalein_listener.handler,
+    ("aws.autoscaling", "EC2 Instance Launch Successful"): scaleup_trace.handler,
+    ("aws.ecs", "ECS Task State Change"): scaleup_listener.handler,
+    ("aws.ecs", "ECS Container Instance State Change"): scaleup_trace.handler,
+    ("aws.ecs", "ECS Service Action"): scaleup_trace.handler,
+}
+
+
+def handler(event, context):
+    if "elb" in event.get("requestContext", {}):
+        path = event.get("path", "")
+        route = PATH_HANDLERS.get(path.rstrip("/") or "/")
+        if route is None:
+            return {
+                "statusCode": 404,
+                "body": json.dumps(f"No admin handler for {path}"),
+                "headers": {"Content-Type": "application/json"}
+            }
+        return route(event, context)
+
+    route = EVENT_HANDLERS.get((event.get("source"), event.get("detail-type")))
+    if route is None:
+        # Every rule targeting the router is in EVENT_HANDLERS
+        raise ValueError(f"No admin handler for {event.get('detail-type')} events from {event.get('source')}")
+    return route(event, context)
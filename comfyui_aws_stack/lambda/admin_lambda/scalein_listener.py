@@ -1,40 +1,30 @@
 import json
-import boto3
 import os
 
+from cluster_state import refresh_cluster_state, update_cluster_state
+from listener_rule import route_to_admin
 
-def handler(event, context):
 
-    client = boto3.client('autoscaling')
-    elbv2_client = boto3.client('elbv2')
+def handler(event, context):
 
-    # Retrieve the listener rule ARN from environment variables
-    asg_name = os.environ.get('ASG_NAME')
-    listener_rule_arn = os.environ.get('LISTENER_RULE_ARN')
+    # Retrieve the listener rule ARN parameter from environment variables
+    listener_rule_arn_parameter = os.environ.get('LISTENER_RULE_ARN_PARAMETER')
 
-    if not listener_rule_arn:
+    if not listener_rule_arn_parameter:
         return {
             'statusCode': 400,
             'body': json.dumps('Listener Rule ARN not provided')
         }
 
     try:
-        asg_response = client.describe_auto_scaling_groups(
-            AutoScalingGroupNames=[asg_name]
-        )
+        # Refresh the cached cluster state from the event
+        state = refresh_cluster_state()
 
-        desired_capacity = asg_response['AutoScalingGroups'][0]['DesiredCapacity']
+        desired_capacity = state['desired_capacity']
         if desired_capacity == 0:
             # Update the listener rule to redirect to the admin page per default
-            elbv2_client.modify_rule(
-                RuleArn=listener_rule_arn,
-                Conditions=[
-                    {
-                        'Field': 'path-pattern',
-                        'Values': ['/', '/admin']
-                    }
-                ]
-            )
+            route_to_admin()
+            update_cluster_state(phase="stopped")
 
     except Exception as e:
         # Handle any exceptions that occur
@@ -1,44 +1,60 @@
-import json
-import boto3
-import os
+import time
+from datetime import datetime
 
+from cluster_state import refresh_cluster_state, update_cluster_state
+from listener_rule import route_to_comfyui
+from prompt_buffer import queued_prompts
+from scaleup_trace import record_task_event, record_milestone
 
-def handler(event, context):
+# Buffered prompts hold the listener rule for at most this long after the
+# task started (twice the timeout of the replay function), in case the
+# replay never switched it
+REPLAY_WAIT_SECONDS = 600
+
+
+def _waiting_for_replay(detail):
+    """True while buffered prompts are still expected to be replayed."""
+    if not queued_prompts():
+        return False
+    started_at = detail.get('startedAt')
+    if started_at:
+        started = datetime.fromisoformat(started_at.replace("Z", "+00:00")).timestamp()
+        if time.time() - started > REPLAY_WAIT_SECONDS:
+            print(f"Buffered prompts not replayed {REPLAY_WAIT_SECONDS}s after the task started, routing to ComfyUI")
+            return False
+    return True
 
-    scaling_client = boto3.client('autoscaling')
-    ecs_client = boto3.client('ecs')
-    elbv2_client = boto3.client('elbv2')
 
-    # Retrieve the listener rule ARN from environment variables
-    asg_name = os.environ.get('ASG_NAME')
-    cluster_name = os.environ['ECS_CLUSTER_NAME']
-    service_name = os.environ['ECS_SERVICE_NAME']
-    listener_rule_arn = os.environ['LISTENER_RULE_ARN']
+def handler(event, context):
+
+    detail = event.get('detail', {})
 
     try:
-        asg_response = scaling_client.describe_auto_scaling_groups(
-            AutoScalingGroupNames=[asg_name]
-        )
-
-        desired_capacity = asg_response['AutoScalingGroups'][0]['DesiredCapacity']
-        if desired_capacity == 1:
-            # Check if the service has the expected number of RUNNING tasks
-            response = ecs_client.describe_services(
-                cluster=cluster_name,
-                services=[service_name]
-            )
-            running_count = response['services'][0]['runningCount']
-            if running_count >= 1:
+        # Refresh the cached cluster state from the event
+        state = refresh_cluster_state()
+        record_task_event(event)
+
+        desired_capacity = state['desired_capacity']
+        if desired_capacity >= 1:
+            running_count = state['running_count']
+            if running_count < 1:
+                # Still scaling up from zero: record the progress for the
+                # admin status page
+                if detail.get('lastStatus') == 'PENDING':
+                    update_cluster_state(phase="task_placed")
+                elif detail.get('lastStatus') == 'RUNNING':
+                    update_cluster_state(
+                        phase="container_healthy" if detail.get('healthStatus') == 'HEALTHY' else "container_running")
+            elif _waiting_for_replay(detail):
+                # Buffered prompts are replayed first, the replay function
+                # updates the listener rule once they are in ComfyUI
+                print("Waiting for the buffered prompts to be replayed")
+            else:
+                # At least one worker is RUNNING
                 # Update the listener rule to redirect to the admin page per default
-                elbv2_client.modify_rule(
-                    RuleArn=listener_rule_arn,
-                    Conditions=[
-                        {
-                            'Field': 'path-pattern',
-                            'Values': ['/admin']
-                        }
-                    ]
-                )
+                route_to_comfyui()
+                update_cluster_state(phase="ready")
+                record_milestone("listener_flipped")
 
     except Exception as e:
         # Handle any exceptions that occur
@@ -0,0 +1,216 @@
+import json
+import os
+import time
+import uuid
+from datetime import datetime
+from decimal import Decimal
+
+from clients import resource
+
+# Key of the item holding the milestones of the current scale-up
+TRACE_KEY = "scaleup-trace"
+
+METRIC_NAMESPACE = "ComfyUI/ScaleUp"
+
+# Container instance attribute written by the launch template user data
+USER_DATA_COMPLETED_ATTRIBUTE = "comfyui.userdata-completed-at"
+
+# (metric name, start milestone(s), end milestone). The first start
+# milestone that was recorded is used, so scale-ups that were not started
+# from the admin page (schedule, alarm) are measured from the ASG change.
+PHASES = [
+    ("DesiredCapacityChange", ["clicked"], "desired_capacity_set"),
+    ("Ec2Launch", ["desired_capacity_set"], "instance_launched"),
+    ("UserData", ["instance_launched"], "user_data_completed"),
+    ("EcsAgentRegistration", ["user_data_completed", "instance_launched"], "agent_registered"),
+    ("TaskPlacement", ["agent_registered"], "image_pull_started"),
+    ("ImagePull", ["image_pull_started"], "image_pull_completed"),
+    # rexray attaches the EBS volume while the container is being created,
+    # ECS does not report the two steps separately
+    ("VolumeAttachAndContainerStart", ["image_pull_completed"], "container_started"),
+    ("EcsHealthCheck", ["container_started"], "ecs_healthy"),
+    ("AlbHealthCheck", ["ecs_healthy"], "alb_healthy"),
+    ("TimeToListenerFlip", ["clicked", "desired_capacity_set"], "listener_flipped"),
+    ("TimeToReady", ["clicked", "desired_capacity_set"], "alb_healthy"),
+]
+
+# A trace is complete once both of these have been recorded
+FINAL_MILESTONES = ["listener_flipped", "alb_healthy"]
+
+
+def _table():
+    return resource('dynamodb').Table(os.environ["CLUSTER_STATE_TABLE_NAME"])
+
+
+def _timestamp(value):
+    """Epoch seconds from an ISO 8601 event timestamp."""
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+
+def _emit(metrics, properties):
+    """Print one CloudWatch embedded metric format record."""
+    print(json.dumps({
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": METRIC_NAMESPACE,
+                "Dimensions": [[]],
+                "Metrics": [{"Name": name, "Unit": "Seconds"} for name in metrics],
+            }],
+        },
+        **properties,
+        **metrics,
+    }))
+
+
+def _phase_duration(milestones, starts, end):
+    for start in starts:
+        if start in milestones and end in milestones:
+            return round(float(milestones[end]) - float(milestones[start]), 3)
+    return None
+
+
+def start_trace(milestones=None):
+    """Start a new scale-up trace, replacing any previous one."""
+    trace_id = str(uuid.uuid4())
+    try:
+        _table().put_item(Item={
+            "id": TRACE_KEY,
+            "trace_id": trace_id,
+            "milestones": {name: Decimal(str(timestamp))
+                           for name, timestamp in (milestones or {}).items()},
+        })
+    except Exception as e:
+        # Tracing must never block the scale-up itself
+        print(f"Error starting scale-up trace: {e}")
+    return trace_id
+
+
+def record_milestone(name, timestamp=None, **properties):
+    """Record a milestone of the running trace and emit the phases that
+    end with it. Milestones are only recorded once per trace."""
+    timestamp = time.time() if timestamp is None else timestamp
+    names = {"#name": name}
+    values = {":timestamp": Decimal(str(timestamp))}
+    update = "SET milestones.#name = :timestamp"
+    for key, value in properties.items():
+        names[f"#{key}"] = key
+        values[f":{key}"] = value
+        update += f", #{key} = :{key}"
+
+    try:
+        trace = _table().update_item(
+            Key={"id": TRACE_KEY},
+            UpdateExpression=update,
+            ConditionExpression="attribute_exists(trace_id) AND attribute_not_exists(completed_at) "
+                                "AND attribute_not_exists(milestones.#name)",
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+            ReturnValues="ALL_NEW",
+        )["Attributes"]
+    except Exception as e:
+        # No trace running or milestone already recorded
+        if "ConditionalCheckFailed" not in str(e):
+            print(f"Error recording scale-up milestone {name}: {e}")
+        return
+
+    milestones = trace["milestones"]
+    record = {
+        "TraceId": trace["trace_id"],
+        "InstanceType": trace.get("instance_type", "unknown"),
+    }
+    metrics = {}
+    for metric, starts, end in PHASES:
+        if end == name:
+            duration = _phase_duration(milestones, starts, end)
+            if duration is not None:
+                metrics[metric] = duration
+    if metrics:
+        _emit(metrics, {**record, "Milestone": name})
+
+    if all(milestone in milestones for milestone in FINAL_MILESTONES):
+        _complete(trace, record)
+
+
+def _complete(trace, record):
+    try:
+        _table().update_item(
+            Key={"id": TRACE_KEY},
+            UpdateExpression="SET completed_at = :now",
+            ConditionExpression="trace_id = :trace_id AND attribute_not_exists(completed_at)",
+            ExpressionAttributeValues={
+                ":now": Decimal(str(time.time())),
+                ":trace_id": trace["trace_id"],
+            },
+        )
+    except Exception:
+        # Another invocation completed the trace first
+        return
+
+    # Per scale-up trace record (log only, the phases were emitted as metrics)
+    milestones = trace["milestones"]
+    print(json.dumps({
+        "ScaleUpTrace": {
+            **record,
+            "Milestones": {name: float(timestamp) for name, timestamp in milestones.items()},
+            "Phases": {metric: _phase_duration(milestones, starts, end)
+                       for metric, starts, end in PHASES},
+        }
+    }))
+
+
+def record_task_event(event):
+    """Record the milestones reported by an ECS Task State Change event."""
+    detail = event.get('detail', {})
+    if detail.get('pullStartedAt'):
+        record_milestone("image_pull_started", _timestamp(detail['pullStartedAt']))
+    if detail.get('pullStoppedAt'):
+        record_milestone("image_pull_completed", _timestamp(detail['pullStoppedAt']))
+    if detail.get('startedAt'):
+        record_milestone("container_started", _timestamp(detail['startedAt']))
+    if detail.get('healthStatus') == 'HEALTHY' and event.get('time'):
+        record_milestone("ecs_healthy", _timestamp(event['time']))
+
+
+def handler(event, context):
+    detail_type = event.get('detail-type')
+    detail = event.get('detail', {})
+
+    try:
+        if detail_type == "EC2 Instance Launch Successful":
+            # Launches into the warm pool are not part of a scale-up
+            if detail.get('Destination') == "WarmPool":
+                return {"statusCode": 200}
+            # Scale-ups not started from the admin page begin here, as does
+            # any launch after one the current trace has already seen
+            trace = _table().get_item(Key={"id": TRACE_KEY}).get("Item")
+            if not trace or "completed_at" in trace or "instance_launched" in trace["milestones"]:
+                start_trace({"desired_capacity_set": _timestamp(detail['StartTime'])})
+            record_milestone("instance_launched", _timestamp(detail['EndTime']))
+
+        elif detail_type == "ECS Container Instance State Change":
+            attributes = {attribute['name']: attribute.get('value')
+                          for attribute in detail.get('attributes', [])}
+            instance_type = attributes.get("ecs.instance-type", "unknown")
+            user_data_completed = float(attributes.get(USER_DATA_COMPLETED_ATTRIBUTE) or 0)
+            # Instances started from the warm pool ran the user data while
+            # being prepared, before the scale-up began
+            trace = _table().get_item(Key={"id": TRACE_KEY}).get("Item")
+            if trace and user_data_completed and user_data_completed >= min(
+                    map(float, trace["milestones"].values()), default=0):
+                record_milestone("user_data_completed", user_data_completed,
+                                 instance_type=instance_type)
+            if detail.get('registeredAt'):
+                record_milestone("agent_registered", _timestamp(detail['registeredAt']),
+                                 instance_type=instance_type)
+
+        elif detail_type == "ECS Service Action":
+            # Steady state requires the task to be healthy in the target group
+            if detail.get('eventName') == "SERVICE_STEADY_STATE":
+                record_milestone("alb_healthy", _timestamp(event['time']))
+
+    except Exception as e:
+        # Handle any exceptions that occur
+        print(f"Error: {e}")
+
+    return {"statusCode": 200}
@@ -1,46 +1,46 @@
 import json
-import boto3
 import os
+import time
 
+from clients import client
+from cluster_state import get_cluster_state, update_cluster_state
+from scaleup_trace import start_trace, record_milestone
+from workers import max_workers, multi_worker, register_worker_limits
 
-def handler(event, context):
+
+def trigger_scale_up():
+    """Scale ComfyUI up from zero, shared by the admin page button and the
+    prompt buffer. Returns a message describing the outcome."""
 
     asg_name = os.environ.get("ASG_NAME")
     ecs_cluster_name = os.environ.get("ECS_CLUSTER_NAME")
     ecs_service_name = os.environ.get("ECS_SERVICE_NAME")
 
     # Clients
-    asg_client = boto3.client('autoscaling')
-    ecs_client = boto3.client('ecs')
+    asg_client = client('autoscaling')
+    ecs_client = client('ecs')
     try:
-        # Get the current ASG configuration
-        asg_response = asg_client.describe_auto_scaling_groups(
-            AutoScalingGroupNames=[asg_name]
-        )
-        desired_capacity = asg_response['AutoScalingGroups'][0]['DesiredCapacity']
-
-        # Get the current status of ECS service
-        ecs_response = ecs_client.describe_services(
-            cluster=ecs_cluster_name,
-            services=[ecs_service_name]
-        )
-        current_service_desired_count = ecs_response['services'][0]['desiredCount']
-        running_tasks_count = ecs_response['services'][0]['runningCount']
+        # Get the current ASG and ECS service status
+        state = get_cluster_state()
+        desired_capacity = state['desired_capacity']
+        current_service_desired_count = state['service_desired_count']
+        running_tasks_count = state['running_count']
 
         if desired_capacity < 1:
+            start_trace({"clicked": time.time()})
+            if multi_worker():
+                # Lift the max capacity set by the after work hours schedule
+                register_worker_limits(MaxCapacity=max_workers())
+
             # Update the desired capacity of the ASG
             response = asg_client.set_desired_capacity(
                 AutoScalingGroupName=asg_name,
                 DesiredCapacity=1,
                 HonorCooldown=False
             )
-
-            # Update ECS Service Desired Count
-            ecs_response = ecs_client.describe_services(
-                cluster=ecs_cluster_name,
-                services=[ecs_service_name]
-            )
-            current_service_desired_count = ecs_response['services'][0]['desiredCount']
+            record_milestone("desired_capacity_set")
+            update_cluster_state(desired_capacity=1,
+                                 phase="instance_launching")
 
             # Increment ECS Service Desired Count
             if current_service_desired_count < 1:
@@ -49,13 +49,14 @@ def handler(event, context):
                     service=ecs_service_name,
                     desiredCount=1
                 )
+                update_cluster_state(service_desired_count=1)
 
             message = """ComfyUI is triggered to scale up again.
                          Please refresh in 5-10 minutes."""
-        elif desired_capacity == 1 and running_tasks_count < 1:
+        elif running_tasks_count < 1:
             message = """ComfyUI is currently scaling back up. 
                          Please refresh in 5-8 minutes."""
-        elif desired_capacity == 1 and running_tasks_count == 1:
+        elif running_tasks_count >= 1:
             message = "ComfyUI is already up and running."
         else:
             message = "ComfyUI is in an unexpected state."
@@ -66,6 +67,12 @@ def handler(event, context):
         print(f"Error: {e}")
         message = "Error occurred. Unable to scale ComfyUI."
 
+    return message
+
+
+def handler(event, context):
+    trigger_scale_up()
+
     return {
         "statusCode": 302,
         "headers": {
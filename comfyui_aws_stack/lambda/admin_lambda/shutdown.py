@@ -1,7 +1,10 @@
 import json
-import boto3
 import os
 
+from clients import client
+from cluster_state import get_cluster_state, update_cluster_state
+from workers import multi_worker, register_worker_limits
+
 
 def handler(event, context):
 
@@ -15,23 +18,33 @@ def handler(event, context):
         }
 
     # Clients
-    asg_client = boto3.client('autoscaling')
+    asg_client = client('autoscaling')
 
     try:
         # Get the current ASG configuration
-        asg_response = asg_client.describe_auto_scaling_groups(
-            AutoScalingGroupNames=[asg_name]
-        )
+        state = get_cluster_state()
+
+        # Check if any instance is still requested
+        desired_capacity = state['desired_capacity']
+        if desired_capacity >= 1:
+            if multi_worker():
+                # Stop every worker, otherwise managed scaling would launch
+                # instances again for the remaining tasks
+                register_worker_limits(MinCapacity=0)
+                client('ecs').update_service(
+                    cluster=os.environ["ECS_CLUSTER_NAME"],
+                    service=os.environ["ECS_SERVICE_NAME"],
+                    desiredCount=0
+                )
+                update_cluster_state(service_desired_count=0)
 
-        # Check if the desired capacity is already 1
-        desired_capacity = asg_response['AutoScalingGroups'][0]['DesiredCapacity']
-        if desired_capacity == 1:
             # Update the desired capacity of the ASG
             response = asg_client.set_desired_capacity(
                 AutoScalingGroupName=asg_name,
                 DesiredCapacity=0,
                 HonorCooldown=False
             )
+            update_cluster_state(desired_capacity=0, phase="scaling_down")
             message = "ComfyUI is shutting down"
         else:
             message = "ComfyUI is already shutdown"
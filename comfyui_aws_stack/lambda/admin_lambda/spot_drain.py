@@ -0,0 +1,141 @@
+import json
+import os
+import urllib.request
+
+from clients import client
+from cluster_state import get_cluster_state, update_cluster_state
+from listener_rule import route_to_admin
+from prompt_buffer import enqueue
+from prompt_replay import COMFYUI_PORT, task_private_ip
+
+
+def _comfyui(url, body=None):
+    request = urllib.request.Request(
+        url, method="GET" if body is None else "POST",
+        data=None if body is None else json.dumps(body).encode(),
+        headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=10) as response:
+        payload = response.read()
+    return json.loads(payload) if payload else None
+
+
+def unfinished_prompts(queue):
+    """ComfyUI /prompt request bodies for the running and pending entries of
+    a ComfyUI /queue response, in execution order. Entries are
+    [number, prompt_id, prompt, extra_data, outputs_to_execute, ...], the
+    client_id of the submitting websocket is part of extra_data."""
+    entries = sorted(queue.get("queue_running", []) + queue.get("queue_pending", []),
+                     key=lambda entry: entry[0])
+    return [{
+        "prompt": entry[2],
+        "prompt_id": entry[1],
+        "extra_data": entry[3],
+    } for entry in entries]
+
+
+def _service_tasks(instance_id):
+    """(container instance ARN, ComfyUI tasks) on an EC2 instance, or
+    (None, []) if the instance is not part of the cluster."""
+    ecs_client = client('ecs')
+    cluster = os.environ["ECS_CLUSTER_NAME"]
+    container_instances = ecs_client.list_container_instances(
+        cluster=cluster, filter=f"ec2InstanceId == {instance_id}"
+    )["containerInstanceArns"]
+    if not container_instances:
+        return None, []
+    task_arns = ecs_client.list_tasks(
+        cluster=cluster,
+        containerInstance=container_instances[0],
+        serviceName=os.environ["ECS_SERVICE_NAME"],
+    )["taskArns"]
+    tasks = ecs_client.describe_tasks(
+        cluster=cluster, tasks=task_arns)["tasks"] if task_arns else []
+    return container_instances[0], tasks
+
+
+# The two-minute notice before EC2 reclaims the instance. A rebalance
+# recommendation only signals an elevated risk, the instance may run for a
+# long time after it.
+INTERRUPTION_WARNING = "EC2 Spot Instance Interruption Warning"
+
+
+def _save_queue(task, saved, running=True):
+    """Saves the prompts of a task's ComfyUI queue that are not in saved
+    yet to the prompt buffer, the running one too unless running is False.
+    Returns the ComfyUI URL of the task, None without a private IP."""
+    task_ip = task_private_ip(task)
+    if not task_ip:
+        return None
+    comfyui_url = f"http://{task_ip}:{COMFYUI_PORT}"
+    queue = _comfyui(f"{comfyui_url}/queue")
+    if not running:
+        queue = {"queue_pending": queue.get("queue_pending", [])}
+    # The prompt buffer replays the prompts on the replacement task in the
+    # same order
+    prompts = [prompt for prompt in unfinished_prompts(queue) if prompt["prompt_id"] not in saved]
+    for prompt in prompts:
+        enqueue(prompt)
+        saved.add(prompt["prompt_id"])
+    print(f"Saved {len(prompts)} prompts of {task['taskArn']}")
+    return comfyui_url
+
+
+def handler(event, context):
+    # Runs in the VPC (to reach the task) on Spot interruption warnings and
+    # rebalance recommendations of any instance in the region
+    instance_id = event.get('detail', {}).get('instance-id')
+    container_instance, tasks = _service_tasks(instance_id)
+    if not container_instance:
+        return {"statusCode": 200}
+    print(f"{event.get('detail-type')} for {instance_id}")
+
+    if event.get('detail-type') != INTERRUPTION_WARNING:
+        # Stop new work only: the pending prompts move to the prompt buffer
+        # and are replayed on the replacement task, the running prompt
+        # finishes. Draining would stop the task (and the prompt) at once.
+        for task in tasks:
+            try:
+                saved = set()
+                comfyui_url = _save_queue(task, saved, running=False)
+                if saved:
+                    _comfyui(f"{comfyui_url}/queue", {"delete": sorted(saved)})
+            except Exception as e:
+                print(f"Error saving the queue of {task['taskArn']}: {e}")
+        return {"statusCode": 200}
+
+    # Record the queue first: once the instance is draining, ECS may stop
+    # the task and the ALB deregister it at any time
+    saved = {task['taskArn']: set() for task in tasks}
+    for task in tasks:
+        try:
+            _save_queue(task, saved[task['taskArn']])
+        except Exception as e:
+            print(f"Error saving the queue of {task['taskArn']}: {e}")
+
+    # Stop accepting prompts on this instance: ECS deregisters the task from
+    # the target group and starts a replacement on another instance, which
+    # the ASG launches (capacity rebalancing) from the instance types list
+    client('ecs').update_container_instances_state(
+        cluster=os.environ["ECS_CLUSTER_NAME"],
+        containerInstances=[container_instance],
+        status="DRAINING",
+    )
+
+    # Without another worker, prompts are buffered until the replacement
+    # task is healthy
+    if get_cluster_state()['running_count'] <= len(tasks):
+        route_to_admin()
+        update_cluster_state(phase="instance_launching")
+
+    # Save the prompts submitted in the meantime, then clear the queue and
+    # interrupt the running prompt, so that no prompt runs twice
+    for task in tasks:
+        try:
+            comfyui_url = _save_queue(task, saved[task['taskArn']])
+            if comfyui_url:
+                _comfyui(f"{comfyui_url}/queue", {"clear": True})
+                _comfyui(f"{comfyui_url}/interrupt", {})
+        except Exception as e:
+            print(f"Error clearing the queue of {task['taskArn']}: {e}")
+
+    return {"statusCode": 200}
@@ -0,0 +1,47 @@
+import json
+import time
+
+from cluster_state import get_cluster_state, current_phase
+
+# Keep well below the ALB idle timeout (60 seconds)
+LONG_POLL_SECONDS = 25
+POLL_INTERVAL_SECONDS = 1
+
+
+def handler(event, context):
+    # Long-poll: return as soon as the phase differs from the one the
+    # browser already knows, or after LONG_POLL_SECONDS without change
+    known_phase = (event.get('queryStringParameters') or {}).get('phase')
+    deadline = time.time() + LONG_POLL_SECONDS
+    if context is not None:
+        deadline = min(
+            deadline, time.time() + context.get_remaining_time_in_millis() / 1000 - 5)
+
+    try:
+        while True:
+            state = get_cluster_state()
+            phase = current_phase(state)
+            if phase != known_phase or time.time() + POLL_INTERVAL_SECONDS > deadline:
+                break
+            time.sleep(POLL_INTERVAL_SECONDS)
+
+        body = {
+            "phase": phase,
+            "desired_capacity": state['desired_capacity'],
+            "running_count": state['running_count'],
+        }
+        status_code = 200
+    except Exception as e:
+        # Handle any exceptions that occur
+        print(f"Error: {e}")
+        body = {"error": "Unable to determine the status of ComfyUI."}
+        status_code = 500
+
+    return {
+        "statusCode": status_code,
+        "body": json.dumps(body),
+        "headers": {
+            "Content-Type": "application/json",
+            "Cache-Control": "no-store"
+        }
+    }
@@ -0,0 +1,58 @@
+import os
+import posixpath
+import urllib.parse
+
+from botocore.exceptions import ClientError
+
+from clients import client
+
+# Same layout as the output offload sidecar (output_offload.py)
+OUTPUT_PREFIX = "outputs/"
+PREVIEW_PREFIX = "previews/"
+
+PRESIGNED_URL_SECONDS = 3600
+
+
+def object_key(params):
+    """S3 key of an offloaded output for ComfyUI /view parameters, None if
+    the path leaves the output directory."""
+    path = posixpath.normpath(posixpath.join(params.get("subfolder", ""), params.get("filename", "")))
+    if path.startswith("..") or path.startswith("/") or path == ".":
+        return None
+    if params.get("preview"):
+        # ComfyUI renders previews on request (preview=webp;90), use the
+        # preview rendered on upload instead
+        return f"{PREVIEW_PREFIX}{path}.webp"
+    return f"{OUTPUT_PREFIX}{path}"
+
+
+def _redirect(location, cache_control):
+    return {"statusCode": 302, "headers": {"Location": location, "Cache-Control": cache_control}}
+
+
+def handler(event, context):
+    # Only output files (type=output) are routed here, the other /view
+    # requests go to ComfyUI. ALB passes the query string URL-encoded.
+    query = event.get("queryStringParameters") or {}
+    params = {key: urllib.parse.unquote_plus(value) for key, value in query.items()}
+    key = object_key(params)
+    if key is None:
+        return {"statusCode": 400, "body": "Invalid filename"}
+
+    bucket = os.environ["OUTPUT_BUCKET_NAME"]
+    try:
+        client('s3').head_object(Bucket=bucket, Key=key)
+    except ClientError as e:
+        if e.response["Error"]["Code"] not in ("404", "NoSuchKey", "NotFound"):
+            raise
+        # Not offloaded yet: let ComfyUI serve it from the volume
+        return _redirect(f"{event.get('path', '/view')}?{urllib.parse.urlencode(params)}&local=1",
+                         "no-store")
+
+    # A redirect cached by the browser or CloudFront (CdnConstruct) must
+    # not outlive the presigned URL
+    return _redirect(client('s3').generate_presigned_url(
+        "get_object",
+        Params={"Bucket": bucket, "Key": key},
+        ExpiresIn=PRESIGNED_URL_SECONDS,
+    ), f"max-age={PRESIGNED_URL_SECONDS // 2}")
@@ -0,0 +1,25 @@
+import os
+
+from clients import client
+
+
+def max_workers():
+    """Maximum number of ComfyUI workers (instances / tasks)."""
+    return int(os.environ.get("MAX_WORKERS", "1"))
+
+
+def multi_worker():
+    """N-worker mode: the ECS service task count is scaled by Application
+    Auto Scaling and the ASG follows through the capacity provider."""
+    return max_workers() > 1
+
+
+def register_worker_limits(**limits):
+    """Update the MinCapacity / MaxCapacity of the ECS service scalable
+    target (e.g. to lift a scheduled max capacity of 0)."""
+    client('application-autoscaling').register_scalable_target(
+        ServiceNamespace="ecs",
+        ResourceId=f"service/{os.environ['ECS_CLUSTER_NAME']}/{os.environ['ECS_SERVICE_NAME']}",
+        ScalableDimension="ecs:service:DesiredCount",
+        **limits,
+    )
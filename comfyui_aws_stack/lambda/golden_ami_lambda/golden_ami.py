@@ -0,0 +1,64 @@
+"""
+    Publishes the AMIs built by the golden AMI pipeline.
+
+    Triggered by the Image Builder image state changes. The launch template
+    resolves the parameter at every instance launch, so new instances start
+    from the newest AMI without a deployment. Only the newest KEEP_AMIS
+    AMIs of the stack (tagged AMI_TAG) are kept, the others are deregistered
+    and their snapshots deleted.
+"""
+import os
+
+import boto3
+
+ec2 = boto3.client("ec2")
+imagebuilder = boto3.client("imagebuilder")
+ssm = boto3.client("ssm")
+
+
+def built_ami(image):
+    """AMI of an image built by the pipeline in this region, or None."""
+    if image.get("sourcePipelineArn") != os.environ["PIPELINE_ARN"]:
+        # Other pipelines, and the first AMI built by the deployment
+        return None
+    region = imagebuilder.meta.region_name
+    for ami in image.get("outputResources", {}).get("amis", []):
+        if ami.get("region") == region:
+            return ami["image"]
+    return None
+
+
+def old_amis(images, keep, published):
+    """AMIs older than the newest keep ones, never the published one."""
+    newest_first = sorted(images, key=lambda image: image["CreationDate"], reverse=True)
+    return [image for image in newest_first[keep:] if image["ImageId"] != published]
+
+
+def remove_old_amis(published):
+    images = ec2.describe_images(Owners=["self"], Filters=[
+        {"Name": f"tag:{os.environ['AMI_TAG']}", "Values": [os.environ["AMI_PARAMETER_NAME"]]},
+    ])["Images"]
+    for image in old_amis(images, int(os.environ["KEEP_AMIS"]), published):
+        ec2.deregister_image(ImageId=image["ImageId"])
+        for mapping in image.get("BlockDeviceMappings", []):
+            if "SnapshotId" in mapping.get("Ebs", {}):
+                ec2.delete_snapshot(SnapshotId=mapping["Ebs"]["SnapshotId"])
+        print(f"Removed {image['ImageId']} of {image['CreationDate']}")
+
+
+def handler(event, context):
+    for arn in event.get("resources", []):
+        image = imagebuilder.get_image(imageBuildVersionArn=arn)["image"]
+        ami_id = built_ami(image)
+        if not ami_id:
+            continue
+        ssm.put_parameter(
+            Name=os.environ["AMI_PARAMETER_NAME"],
+            Value=ami_id,
+            Type="String",
+            DataType="aws:ec2:image",
+            Overwrite=True,
+        )
+        print(f"Published {ami_id} of {arn}")
+        remove_old_amis(ami_id)
+    return {"statusCode": 200}
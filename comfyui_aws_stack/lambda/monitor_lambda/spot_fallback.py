@@ -0,0 +1,118 @@
+import boto3
+import os
+import json
+import time
+from datetime import datetime, timezone
+
+# ASG tag holding the epoch time until which the fallback stays active
+FALLBACK_TAG = "comfyui:spot-fallback-until"
+
+LAUNCH_FAILED_EVENT = "EC2 Instance Launch Unsuccessful"
+
+
+def recent_launch_failures(autoscaling, asg_name, since):
+    """Number of failed launch activities of the ASG started after `since`."""
+    failures = 0
+    paginator = autoscaling.get_paginator('describe_scaling_activities')
+    for page in paginator.paginate(AutoScalingGroupName=asg_name):
+        for activity in page['Activities']:
+            if activity['StartTime'] < since:
+                return failures
+            if activity['StatusCode'] == 'Failed' and activity['Description'].startswith('Launching'):
+                failures += 1
+    return failures
+
+
+def fallback_policy(policy, escalate, fallback_instance_types):
+    """MixedInstancesPolicy update that enables (escalate) or reverts the
+    fallback: either add the fallback instance types to the overrides, or
+    switch the capacity above the base to on-demand."""
+    if fallback_instance_types:
+        template = policy['LaunchTemplate']
+        overrides = [override for override in template['Overrides']
+                     if override['InstanceType'] not in fallback_instance_types]
+        if escalate:
+            overrides += [{'InstanceType': instance_type}
+                          for instance_type in fallback_instance_types]
+        return {
+            'LaunchTemplate': {
+                'LaunchTemplateSpecification': template['LaunchTemplateSpecification'],
+                'Overrides': overrides,
+            }
+        }
+    return {
+        'InstancesDistribution': {
+            'OnDemandPercentageAboveBaseCapacity': 100 if escalate else 0
+        }
+    }
+
+
+def notify(message):
+    sns_topic_arn = os.environ.get('SNS_TOPIC_ARN')
+    print(message)
+    if sns_topic_arn:
+        boto3.client('sns').publish(
+            TopicArn=sns_topic_arn,
+            Message=message,
+            Subject=f"ASG Spot Fallback - {os.environ['ASG_NAME']}",
+        )
+
+
+def handler(event, context):
+    asg_name = os.environ['ASG_NAME']
+    max_failures = int(os.environ['FALLBACK_FAILURES'])
+    window_seconds = int(os.environ['FALLBACK_WINDOW_MINUTES']) * 60
+    fallback_seconds = int(os.environ['FALLBACK_MINUTES']) * 60
+    fallback_instance_types = [instance_type for instance_type in os.environ.get(
+        'FALLBACK_INSTANCE_TYPES', '').split(',') if instance_type]
+
+    autoscaling = boto3.client('autoscaling')
+    group = autoscaling.describe_auto_scaling_groups(
+        AutoScalingGroupNames=[asg_name])['AutoScalingGroups'][0]
+    tags = {tag['Key']: tag['Value'] for tag in group.get('Tags', [])}
+    fallback_until = float(tags.get(FALLBACK_TAG, 0))
+    now = time.time()
+
+    if event.get('detail-type') == LAUNCH_FAILED_EVENT:
+        # Escalate once enough launches failed within the window
+        if fallback_until:
+            return {'statusCode': 200}
+        since = datetime.fromtimestamp(now - window_seconds, tz=timezone.utc)
+        failures = recent_launch_failures(autoscaling, asg_name, since)
+        print(f"{failures} failed launches in the last {window_seconds // 60} minutes")
+        if failures < max_failures:
+            return {'statusCode': 200}
+
+        autoscaling.update_auto_scaling_group(
+            AutoScalingGroupName=asg_name,
+            MixedInstancesPolicy=fallback_policy(
+                group['MixedInstancesPolicy'], True, fallback_instance_types),
+        )
+        autoscaling.create_or_update_tags(Tags=[{
+            'ResourceId': asg_name,
+            'ResourceType': 'auto-scaling-group',
+            'Key': FALLBACK_TAG,
+            'Value': str(int(now + fallback_seconds)),
+            'PropagateAtLaunch': False,
+        }])
+        fallback = f"adding {', '.join(fallback_instance_types)}" if fallback_instance_types else "using on-demand"
+        notify(f"{failures} Spot launches failed, {fallback} for {fallback_seconds // 60} minutes")
+
+    elif fallback_until and now >= fallback_until:
+        # Scheduled check: revert once the fallback period is over
+        autoscaling.update_auto_scaling_group(
+            AutoScalingGroupName=asg_name,
+            MixedInstancesPolicy=fallback_policy(
+                group['MixedInstancesPolicy'], False, fallback_instance_types),
+        )
+        autoscaling.delete_tags(Tags=[{
+            'ResourceId': asg_name,
+            'ResourceType': 'auto-scaling-group',
+            'Key': FALLBACK_TAG,
+        }])
+        notify("Spot fallback period is over, reverted to the configured Spot instances")
+
+    return {
+        'statusCode': 200,
+        'body': json.dumps('Spot fallback check completed')
+    }
@@ -0,0 +1,45 @@
+"""
+    Custom resource building the SOCI index of the ComfyUI image.
+
+    on_event starts the CodeBuild project that converts the image asset into
+    a SOCI-enabled image, is_complete polls the build until the image is pushed.
+"""
+import boto3
+
+codebuild = boto3.client("codebuild")
+
+FAILED_STATUSES = ("FAILED", "FAULT", "STOPPED", "TIMED_OUT")
+
+
+def on_event(event, context):
+    props = event["ResourceProperties"]
+    if event["RequestType"] == "Delete":
+        # The SOCI-enabled image stays in the asset repository, like the
+        # image asset itself
+        return {"PhysicalResourceId": event["PhysicalResourceId"]}
+
+    build = codebuild.start_build(
+        projectName=props["ProjectName"],
+        environmentVariablesOverride=[
+            {"name": "SOURCE_IMAGE", "value": props["SourceImage"], "type": "PLAINTEXT"},
+            {"name": "TARGET_IMAGE", "value": props["TargetImage"], "type": "PLAINTEXT"},
+        ],
+    )["build"]
+    print(f"Building the SOCI index of {props['SourceImage']}: {build['id']}")
+    return {
+        "PhysicalResourceId": props["TargetImage"],
+        "Data": {"BuildId": build["id"], "ImageUri": props["TargetImage"]},
+    }
+
+
+def is_complete(event, context):
+    if event["RequestType"] == "Delete":
+        return {"IsComplete": True}
+
+    build_id = event["Data"]["BuildId"]
+    [build] = codebuild.batch_get_builds(ids=[build_id])["builds"]
+    status = build["buildStatus"]
+    if status in FAILED_STATUSES:
+        raise RuntimeError(
+            f"SOCI index build {build_id} {status}, see {build.get('logs', {}).get('deepLink')}")
+    return {"IsComplete": status == "SUCCEEDED"}
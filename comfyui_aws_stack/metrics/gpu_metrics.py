@@ -0,0 +1,133 @@
+"""
+GPU metrics publisher (ECS daemon task, one per container instance).
+
+Samples every GPU of the host with nvidia-smi and publishes utilization,
+VRAM, temperature, clocks and power to CloudWatch at high resolution.
+Samples are taken every SAMPLE_INTERVAL_SECONDS and sent in one
+PutMetricData call per PUBLISH_INTERVAL_SECONDS.
+
+Set NVIDIA_SMI to another executable (e.g. a script printing canned CSV)
+to run without a GPU.
+"""
+import datetime
+import os
+import subprocess
+import time
+import urllib.request
+
+import boto3
+
+METRIC_NAMESPACE = "ComfyUI/GPU"
+
+NVIDIA_SMI = os.environ.get("NVIDIA_SMI", "nvidia-smi")
+SAMPLE_INTERVAL_SECONDS = int(os.environ.get("GPU_SAMPLE_INTERVAL_SECONDS", "10"))
+PUBLISH_INTERVAL_SECONDS = int(os.environ.get("GPU_PUBLISH_INTERVAL_SECONDS", "60"))
+
+# (nvidia-smi query field, metric name, unit)
+FIELDS = [
+    ("utilization.gpu", "GPUUtilization", "Percent"),
+    ("utilization.memory", "GPUMemoryUtilization", "Percent"),
+    ("memory.used", "VRAMUsed", "Megabytes"),
+    ("memory.free", "VRAMFree", "Megabytes"),
+    ("temperature.gpu", "GPUTemperature", "None"),
+    ("clocks.sm", "SMClock", "None"),
+    ("clocks.mem", "MemoryClock", "None"),
+    ("power.draw", "PowerDraw", "None"),
+]
+
+IMDS_URL = "http://169.254.169.254/latest"
+
+
+def sample(nvidia_smi=NVIDIA_SMI):
+    """Return one {metric name: value} dict per GPU, keyed by GPU index.
+    Fields the GPU does not support ("[N/A]", "[Not Supported]") are left out."""
+    output = subprocess.run(
+        [nvidia_smi,
+         "--query-gpu=index," + ",".join(field for field, _, _ in FIELDS),
+         "--format=csv,noheader,nounits"],
+        capture_output=True, text=True, check=True, timeout=30).stdout
+
+    gpus = {}
+    for line in output.strip().splitlines():
+        values = [value.strip() for value in line.split(",")]
+        metrics = {}
+        for (_, name, _), value in zip(FIELDS, values[1:]):
+            try:
+                metrics[name] = float(value)
+            except ValueError:
+                continue
+        gpus[values[0]] = metrics
+    return gpus
+
+
+def to_metric_data(gpus, timestamp, dimensions):
+    """Convert one sample to high resolution PutMetricData entries."""
+    units = {name: unit for _, name, unit in FIELDS}
+    return [
+        {
+            "MetricName": name,
+            "Dimensions": dimensions + [{"Name": "GPU", "Value": index}],
+            "Timestamp": timestamp,
+            "Value": value,
+            "Unit": units[name],
+            "StorageResolution": 1,
+        }
+        for index, metrics in gpus.items()
+        for name, value in metrics.items()
+    ]
+
+
+def instance_dimensions():
+    """InstanceId / InstanceType of the host from IMDSv2 (host network mode)."""
+    token_request = urllib.request.Request(
+        f"{IMDS_URL}/api/token", method="PUT",
+        headers={"X-aws-ec2-metadata-token-ttl-seconds": "300"})
+    with urllib.request.urlopen(token_request, timeout=5) as response:
+        token = response.read().decode()
+
+    def metadata(path):
+        request = urllib.request.Request(
+            f"{IMDS_URL}/meta-data/{path}",
+            headers={"X-aws-ec2-metadata-token": token})
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.read().decode()
+
+    return [
+        {"Name": "AutoScalingGroupName", "Value": os.environ["ASG_NAME"]},
+        {"Name": "InstanceId", "Value": metadata("instance-id")},
+        {"Name": "InstanceType", "Value": metadata("instance-type")},
+    ]
+
+
+def publish(cloudwatch, metric_data):
+    # PutMetricData accepts up to 1000 entries per call
+    for start in range(0, len(metric_data), 1000):
+        cloudwatch.put_metric_data(
+            Namespace=METRIC_NAMESPACE, MetricData=metric_data[start:start + 1000])
+
+
+def main():
+    cloudwatch = boto3.client("cloudwatch")
+    dimensions = instance_dimensions()
+    pending = []
+    last_publish = time.monotonic()
+
+    while True:
+        try:
+            timestamp = datetime.datetime.now(datetime.timezone.utc)
+            pending += to_metric_data(sample(), timestamp, dimensions)
+        except Exception as e:
+            print(f"Error sampling GPU metrics: {e}", flush=True)
+
+        if time.monotonic() - last_publish >= PUBLISH_INTERVAL_SECONDS:
+            try:
+                publish(cloudwatch, pending)
+            except Exception as e:
+                print(f"Error publishing GPU metrics: {e}", flush=True)
+            pending = []
+            last_publish = time.monotonic()
+        time.sleep(SAMPLE_INTERVAL_SECONDS)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+ComfyUI activity metrics publisher (sidecar of the ComfyUI task).
+
+Polls the ComfyUI API on localhost and publishes the queue depth, the
+running prompt count, the open client connections and the seconds since
+the last activity to CloudWatch. The idle scale-in alarm of the ASG is
+driven by IdleSeconds, which stays at 0 while a prompt is queued or running.
+
+With TASK_PROTECTION=true (N-worker mode) the task is also protected from
+ECS service scale-in while a prompt is queued or running.
+"""
+import json
+import os
+import time
+import urllib.request
+
+import boto3
+
+METRIC_NAMESPACE = "ComfyUI/Activity"
+
+COMFYUI_URL = os.environ.get("COMFYUI_URL", "http://localhost:8181")
+COMFYUI_PORT = int(COMFYUI_URL.rsplit(":", 1)[-1].split("/")[0])
+INTERVAL_SECONDS = int(os.environ.get("METRICS_INTERVAL_SECONDS", "60"))
+TASK_PROTECTION = os.environ.get("TASK_PROTECTION", "false") == "true"
+
+# Renewed on every interval while busy, expires if the sidecar stops
+TASK_PROTECTION_MINUTES = 15
+
+# /proc/net/tcp connection state for ESTABLISHED
+TCP_ESTABLISHED = "01"
+
+
+def get_queue():
+    """Return (running, pending) prompt counts from the ComfyUI /queue API."""
+    with urllib.request.urlopen(f"{COMFYUI_URL}/queue", timeout=10) as response:
+        queue = json.load(response)
+    return len(queue.get("queue_running", [])), len(queue.get("queue_pending", []))
+
+
+def count_client_connections(port=COMFYUI_PORT, tables=("/proc/net/tcp", "/proc/net/tcp6")):
+    """Count established connections to the ComfyUI port. The task shares
+    its network namespace with the sidecar (awsvpc), and the ALB keeps one
+    target connection per websocket, so this is an upper bound of the
+    connected browser sessions."""
+    connections = 0
+    for table in tables:
+        try:
+            with open(table) as f:
+                next(f)
+                for line in f:
+                    fields = line.split()
+                    local_port = int(fields[1].rsplit(":", 1)[1], 16)
+                    if local_port == port and fields[3] == TCP_ESTABLISHED:
+                        connections += 1
+        except FileNotFoundError:
+            continue
+    return connections
+
+
+class ActivityTracker:
+    """Remember when ComfyUI was last busy. The container start counts as
+    activity, so a fresh instance gets a full idle window."""
+
+    def __init__(self, now=None):
+        self.last_activity = time.time() if now is None else now
+
+    def update(self, running, pending, now=None):
+        now = time.time() if now is None else now
+        if running or pending:
+            self.last_activity = now
+        return now - self.last_activity
+
+
+def set_task_protection(enabled, agent_uri=None):
+    """Enable or disable scale-in protection of this task through the ECS
+    agent endpoint."""
+    agent_uri = agent_uri or os.environ["ECS_AGENT_URI"]
+    body = {"ProtectionEnabled": enabled}
+    if enabled:
+        body["ExpiresInMinutes"] = TASK_PROTECTION_MINUTES
+    request = urllib.request.Request(
+        f"{agent_uri}/task-protection/v1/state",
+        data=json.dumps(body).encode(), method="PUT",
+        headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.load(response)
+
+
+def publish(cloudwatch, dimensions, running, pending, connections, idle_seconds):
+    cloudwatch.put_metric_data(
+        Namespace=METRIC_NAMESPACE,
+        MetricData=[
+            {"MetricName": name, "Dimensions": dimensions, "Value": value, "Unit": unit}
+            for name, value, unit in [
+                ("QueueRunning", running, "Count"),
+                ("QueuePending", pending, "Count"),
+                ("QueueDepth", running + pending, "Count"),
+                ("ClientConnections", connections, "Count"),
+                ("IdleSeconds", idle_seconds, "Seconds"),
+            ]
+        ],
+    )
+
+
+def main():
+    cloudwatch = boto3.client("cloudwatch")
+    dimensions = [{"Name": "AutoScalingGroupName", "Value": os.environ["ASG_NAME"]}]
+    tracker = ActivityTracker()
+    protected = False
+
+    while True:
+        try:
+            running, pending = get_queue()
+            idle_seconds = tracker.update(running, pending)
+            publish(cloudwatch, dimensions, running, pending,
+                    count_client_connections(), idle_seconds)
+        except Exception as e:
+            # ComfyUI still starting or temporarily unreachable: publish
+            # nothing, a missing datapoint never scales the instance in
+            print(f"Error publishing ComfyUI metrics: {e}", flush=True)
+            time.sleep(INTERVAL_SECONDS)
+            continue
+
+        if TASK_PROTECTION and (idle_seconds == 0 or protected):
+            try:
+                set_task_protection(idle_seconds == 0)
+                protected = idle_seconds == 0
+            except Exception as e:
+                print(f"Error updating task protection: {e}", flush=True)
+        time.sleep(INTERVAL_SECONDS)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""
+ComfyUI output offload (sidecar of the ComfyUI task).
+
+Watches the ComfyUI output directory and uploads every new file to S3
+(multipart for large videos), with a WebP thumbnail and preview of images
+and videos. Uploaded files are deleted from the local output directory
+once they are older than the retention period, or when the directory
+exceeds its size budget, oldest first. The admin Lambda serves offloaded
+files on /view with presigned S3 redirects.
+
+Keys, for a file <subfolder>/<name> of the output directory:
+
+    outputs/<subfolder>/<name>
+    previews/<subfolder>/<name>.webp     (1024 px)
+    thumbnails/<subfolder>/<name>.webp   (256 px)
+"""
+import json
+import mimetypes
+import os
+import subprocess
+import tempfile
+import time
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+
+OUTPUT_DIR = os.environ.get("OUTPUT_DIR", "/data/output")
+INTERVAL_SECONDS = int(os.environ.get("OFFLOAD_INTERVAL_SECONDS", "10"))
+RETENTION_HOURS = float(os.environ.get("OUTPUT_RETENTION_HOURS", "168"))
+LOCAL_MAX_GB = float(os.environ.get("OUTPUT_LOCAL_MAX_GB", "0"))
+
+# Files still being written by ComfyUI are left for the next scan
+STABLE_SECONDS = 5
+
+STATE_FILE = ".offload.json"
+
+OUTPUT_PREFIX = "outputs/"
+PREVIEW_PREFIX = "previews/"
+THUMBNAIL_PREFIX = "thumbnails/"
+PREVIEW_SIZE = 1024
+THUMBNAIL_SIZE = 256
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".webp", ".gif", ".bmp", ".tiff"}
+VIDEO_EXTENSIONS = {".mp4", ".webm", ".mov", ".mkv"}
+
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=16 * 1024 * 1024,
+    multipart_chunksize=16 * 1024 * 1024,
+    max_concurrency=8,
+)
+
+
+def log(message):
+    print(f"[output-offload] {message}", flush=True)
+
+
+def object_key(prefix, relative_path, suffix=""):
+    return prefix + relative_path.replace(os.sep, "/") + suffix
+
+
+def scan(output_dir, now=None):
+    """{relative path: (size, mtime)} of the complete files of the output
+    directory."""
+    now = time.time() if now is None else now
+    files = {}
+    for root, _, names in os.walk(output_dir):
+        for name in names:
+            if name.startswith("."):
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if now - stat.st_mtime >= STABLE_SECONDS:
+                files[os.path.relpath(path, output_dir)] = (stat.st_size, stat.st_mtime)
+    return files
+
+
+def render_previews(path, sizes):
+    """WebP renditions of an image (first frame) or video (frame at 1 s),
+    {size: bytes}, empty for other files."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in IMAGE_EXTENSIONS | VIDEO_EXTENSIONS:
+        return {}
+    from PIL import Image
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = path
+        if extension in VIDEO_EXTENSIONS:
+            source = os.path.join(tmp, "frame.png")
+            subprocess.run(
+                ["ffmpeg", "-loglevel", "error", "-ss", "1", "-i", path, "-frames:v", "1", source],
+                check=True)
+            if not os.path.exists(source):
+                # Shorter than a second
+                subprocess.run(
+                    ["ffmpeg", "-loglevel", "error", "-i", path, "-frames:v", "1", source],
+                    check=True)
+        renditions = {}
+        with Image.open(source) as image:
+            image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+            for size in sizes:
+                rendition = image.copy()
+                rendition.thumbnail((size, size))
+                output = os.path.join(tmp, f"{size}.webp")
+                rendition.save(output, "WEBP", quality=80)
+                with open(output, "rb") as f:
+                    renditions[size] = f.read()
+        return renditions
+
+
+class Offloader:
+    """Uploads new outputs and applies the local retention. Uploaded files
+    are recorded in STATE_FILE of the output directory, so a restarted
+    sidecar does not upload them again."""
+
+    def __init__(self, s3, bucket, output_dir=OUTPUT_DIR, retention_hours=RETENTION_HOURS,
+                 local_max_bytes=int(LOCAL_MAX_GB * 1024 ** 3)):
+        self.s3 = s3
+        self.bucket = bucket
+        self.output_dir = output_dir
+        self.retention_seconds = retention_hours * 3600
+        self.local_max_bytes = local_max_bytes
+        self.state_path = os.path.join(output_dir, STATE_FILE)
+        self.uploaded = {}
+        if os.path.exists(self.state_path):
+            with open(self.state_path) as f:
+                self.uploaded = json.load(f)
+
+    def _save(self):
+        with open(self.state_path + ".tmp", "w") as f:
+            json.dump(self.uploaded, f)
+        os.replace(self.state_path + ".tmp", self.state_path)
+
+    def upload(self, relative_path):
+        path = os.path.join(self.output_dir, relative_path)
+        content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        self.s3.upload_file(path, self.bucket, object_key(OUTPUT_PREFIX, relative_path),
+                            ExtraArgs={"ContentType": content_type}, Config=TRANSFER_CONFIG)
+        try:
+            renditions = render_previews(path, [PREVIEW_SIZE, THUMBNAIL_SIZE])
+        except Exception as e:
+            log(f"No preview for {relative_path}: {e}")
+            renditions = {}
+        for size, prefix in [(PREVIEW_SIZE, PREVIEW_PREFIX), (THUMBNAIL_SIZE, THUMBNAIL_PREFIX)]:
+            if size in renditions:
+                self.s3.put_object(Bucket=self.bucket, Key=object_key(prefix, relative_path, ".webp"),
+                                   Body=renditions[size], ContentType="image/webp")
+
+    def offload(self, now=None):
+        """Upload the new files, then delete uploaded files past the
+        retention or over the size budget. Returns (uploaded, deleted)."""
+        now = time.time() if now is None else now
+        files = scan(self.output_dir, now)
+        uploaded = []
+        for relative_path, (size, mtime) in sorted(files.items(), key=lambda item: item[1][1]):
+            if self.uploaded.get(relative_path) == [size, mtime]:
+                continue
+            try:
+                self.upload(relative_path)
+            except Exception as e:
+                log(f"Error uploading {relative_path}: {e}")
+                continue
+            self.uploaded[relative_path] = [size, mtime]
+            uploaded.append(relative_path)
+        if uploaded:
+            self._save()
+
+        deleted = []
+        local_bytes = sum(size for size, _ in files.values())
+        for relative_path, (size, mtime) in sorted(files.items(), key=lambda item: item[1][1]):
+            if self.uploaded.get(relative_path) != [size, mtime]:
+                continue
+            expired = now - mtime >= self.retention_seconds
+            over_budget = self.local_max_bytes and local_bytes > self.local_max_bytes
+            if not (expired or over_budget):
+                continue
+            os.remove(os.path.join(self.output_dir, relative_path))
+            local_bytes -= size
+            deleted.append(relative_path)
+        # Forget the files deleted here or by the user
+        forgotten = [relative_path for relative_path in self.uploaded
+                     if relative_path not in files or relative_path in deleted]
+        for relative_path in forgotten:
+            del self.uploaded[relative_path]
+        if forgotten:
+            self._save()
+        return uploaded, deleted
+
+
+def main():
+    offloader = Offloader(boto3.client("s3"), os.environ["OUTPUT_BUCKET_NAME"])
+    log(f"Offloading {OUTPUT_DIR} to s3://{offloader.bucket}/{OUTPUT_PREFIX}")
+    while True:
+        try:
+            uploaded, deleted = offloader.offload()
+            if uploaded or deleted:
+                log(f"Uploaded {len(uploaded)}, deleted {len(deleted)} local outputs")
+        except Exception as e:
+            log(f"Error offloading outputs: {e}")
+        time.sleep(INTERVAL_SECONDS)
+
+
+if __name__ == "__main__":
+    main()
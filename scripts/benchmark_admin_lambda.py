@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Cold-start and warm-latency benchmark for the admin Lambda.
+
+Compares the consolidated router (one function, clients created once per
+container) with the previous layout (one function per handler, clients
+created on every invocation). All AWS calls are answered by a botocore
+"before-call" stub, so no credentials or network access are needed.
+
+    python scripts/benchmark_admin_lambda.py [--iterations 200]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ADMIN_LAMBDA_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "..", "comfyui_aws_stack", "lambda", "admin_lambda")
+
+ENVIRONMENT = {
+    "AWS_DEFAULT_REGION": "us-east-1",
+    "AWS_ACCESS_KEY_ID": "benchmark",
+    "AWS_SECRET_ACCESS_KEY": "benchmark",
+    "ASG_NAME": "benchmark-asg",
+    "ECS_CLUSTER_NAME": "benchmark-cluster",
+    "ECS_SERVICE_NAME": "benchmark-service",
+    "CLUSTER_STATE_TABLE_NAME": "benchmark-cluster-state",
+    "CLUSTER_STATE_TTL_SECONDS": "60",
+    "LISTENER_RULE_ARN_PARAMETER": "/benchmark/admin/listener-rule-arn",
+    "REDIRECT_URL": "https://example.com/logout",
+}
+
+
+def _alb_event(path):
+    return {
+        "requestContext": {"elb": {"targetGroupArn": "benchmark"}},
+        "httpMethod": "GET",
+        "path": path,
+        "queryStringParameters": {"phase": "stopped"},
+        "headers": {},
+        "body": "",
+        "isBase64Encoded": False,
+    }
+
+
+# (legacy module, event) for every entry point of the admin Lambda
+ENTRY_POINTS = [
+    ("admin", _alb_event("/admin")),
+    ("status", _alb_event("/admin/status")),
+    ("scaleup_trigger", _alb_event("/admin/scaleup")),
+    ("restart_docker", _alb_event("/admin/restart")),
+    ("shutdown", _alb_event("/admin/shutdown")),
+    ("signout", _alb_event("/signout")),
+    ("scaleup_listener", {"source": "aws.ecs", "detail-type": "ECS Task State Change",
+                          "detail": {"lastStatus": "RUNNING", "healthStatus": "HEALTHY"}}),
+    ("scalein_listener", {"source": "aws.autoscaling",
+                          "detail-type": "EC2 Instance-terminate Lifecycle Action", "detail": {}}),
+]
+
+# Canned responses keyed by "<service>.<operation>"
+CLUSTER_STATE_ITEM = {
+    "id": {"S": "cluster"},
+    "desired_capacity": {"N": "1"},
+    "instances": {"L": [{"S": "i-0123456789abcdef0"}]},
+    "service_desired_count": {"N": "1"},
+    "running_count": {"N": "1"},
+    "updated_at": {"N": "9999999999"},
+    "phase": {"S": "ready"},
+}
+
+RESPONSES = {
+    "auto-scaling.DescribeAutoScalingGroups": {
+        "AutoScalingGroups": [{"DesiredCapacity": 1, "Instances": [{"InstanceId": "i-0123456789abcdef0"}]}]},
+    "auto-scaling.SetDesiredCapacity": {},
+    "ecs.DescribeServices": {"services": [{"desiredCount": 1, "runningCount": 1}]},
+    "ecs.UpdateService": {},
+    "dynamodb.GetItem": {"Item": CLUSTER_STATE_ITEM},
+    "dynamodb.UpdateItem": {"Attributes": CLUSTER_STATE_ITEM},
+    "ssm.GetParameter": {"Parameter": {"Value": "arn:aws:elasticloadbalancing:us-east-1:123456789012:listener-rule/app/benchmark"}},
+    "ssm.SendCommand": {"Command": {"CommandId": "benchmark"}},
+    "elastic-load-balancing-v2.ModifyRule": {},
+}
+
+
+class _StubHttpResponse:
+    status_code = 200
+    headers = {}
+
+
+def _stub_botocore():
+    """Answer every API call from RESPONSES before it reaches the network."""
+    import boto3
+
+    def before_call(model, **kwargs):
+        key = f"{model.service_model.service_id.hyphenize()}.{model.name}"
+        response = json.loads(json.dumps(RESPONSES[key]))
+        response["ResponseMetadata"] = {"HTTPStatusCode": 200}
+        return _StubHttpResponse(), response
+
+    boto3.setup_default_session()
+    boto3.DEFAULT_SESSION.events.register("before-call", before_call)
+
+
+def _cold_start(module_name, event):
+    """Child process: import the handler module and serve one event."""
+    start = time.perf_counter()
+    _stub_botocore()
+    sys.path.insert(0, ADMIN_LAMBDA_DIR)
+    module = __import__(module_name)
+    with contextlib.redirect_stdout(io.StringIO()):
+        module.handler(event, None)
+    print(json.dumps({"seconds": time.perf_counter() - start}))
+
+
+def measure_cold_start(module_name, event, repeat):
+    samples = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, __file__, "--cold-start", module_name, json.dumps(event)],
+            env={**os.environ, **ENVIRONMENT}, capture_output=True, text=True, check=True)
+        samples.append(json.loads(output.stdout.strip().splitlines()[-1])["seconds"])
+    return statistics.median(samples)
+
+
+def measure_warm(iterations, reuse_clients):
+    import clients
+    import router
+
+    latencies = {}
+    for module_name, event in ENTRY_POINTS:
+        samples = []
+        for _ in range(iterations):
+            if not reuse_clients:
+                # Previous behaviour: every invocation built new clients
+                clients._clients.clear()
+                clients._resources.clear()
+                clients._parameters.clear()
+                sys.modules["cluster_state"]._tables.clear()
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                router.handler(event, None)
+                samples.append(time.perf_counter() - start)
+        samples.sort()
+        latencies[module_name] = (statistics.median(samples), samples[int(len(samples) * 0.95) - 1])
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=200,
+                        help="warm invocations per entry point")
+    parser.add_argument("--cold-repeat", type=int, default=3,
+                        help="cold starts per entry point (median is reported)")
+    parser.add_argument("--cold-start", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.cold_start:
+        _cold_start(args.cold_start[0], json.loads(args.cold_start[1]))
+        return
+
+    os.environ.update(ENVIRONMENT)
+    _stub_botocore()
+    sys.path.insert(0, ADMIN_LAMBDA_DIR)
+
+    print("Cold start (import + first invocation, median ms)")
+    legacy_cold_total = 0
+    for module_name, event in ENTRY_POINTS:
+        legacy = measure_cold_start(module_name, event, args.cold_repeat)
+        legacy_cold_total += legacy
+        print(f"  {module_name:<18} {legacy * 1000:8.1f}")
+    router_cold = measure_cold_start("router", ENTRY_POINTS[0][1], args.cold_repeat)
+    print(f"  {'router':<18} {router_cold * 1000:8.1f}")
+
+    print("\nWarm latency per invocation (ms, p50 / p95)")
+    print(f"  {'entry point':<18} {'per-call clients':>20} {'shared clients':>20}")
+    legacy_warm = measure_warm(args.iterations, reuse_clients=False)
+    router_warm = measure_warm(args.iterations, reuse_clients=True)
+    for module_name, _ in ENTRY_POINTS:
+        legacy_p50, legacy_p95 = legacy_warm[module_name]
+        router_p50, router_p95 = router_warm[module_name]
+        print(f"  {module_name:<18} {legacy_p50 * 1000:9.2f} / {legacy_p95 * 1000:7.2f}"
+              f" {router_p50 * 1000:9.2f} / {router_p95 * 1000:7.2f}")
+
+    # One pass over every entry point on fresh containers: separate
+    # functions pay one cold start each, the router pays a single one
+    legacy_session = legacy_cold_total
+    router_session = router_cold + sum(
+        router_warm[module_name][0] for module_name, _ in ENTRY_POINTS[1:])
+    print("\nFirst use of every entry point (ms)")
+    print(f"  separate functions {legacy_session * 1000:8.1f}")
+    print(f"  router             {router_session * 1000:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Container startup times of the ComfyUI image with a full pull and with SOCI.
+
+Run as root on a GPU instance deployed with soci_index=True (connect with
+SSM Session Manager). The image of the task definition is the SOCI-enabled
+image (its tag ends with -soci). The image asset it was built from has the
+same layers but no index, so the SOCI snapshotter pulls it in full:
+
+    python3 benchmark_image_pull.py 123456789012.dkr.ecr.us-east-1.amazonaws.com/cdk-...:0123abcd-soci
+
+Each run removes the image and drops the page cache, pulls the image and
+starts a container that imports torch and initializes CUDA, the first
+thing ComfyUI does. With SOCI the pull only fetches the manifests and the
+files are fetched while the container starts, so compare ready_seconds.
+Full and lazy runs alternate. Results are printed and appended to
+--output as JSON lines.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import tempfile
+import time
+
+SOCI_TAG_SUFFIX = "-soci"
+
+# First work of ComfyUI main.py
+STARTUP_COMMAND = ["python", "-c", "import torch; torch.cuda.init()"]
+
+
+def timed(command):
+    start = time.perf_counter()
+    subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def drop_page_cache():
+    subprocess.run(["sync"], check=True)
+    with open("/proc/sys/vm/drop_caches", "w") as f:
+        f.write("3\n")
+
+
+def benchmark(image, mode):
+    subprocess.run(["docker", "rmi", "-f", image], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    drop_page_cache()
+    pull_seconds = timed(["docker", "pull", "--quiet", image])
+    start_seconds = timed(["docker", "run", "--rm", "--gpus", "all", image] + STARTUP_COMMAND)
+    return {
+        "mode": mode,
+        "image": image,
+        "pull_seconds": round(pull_seconds, 1),
+        "start_seconds": round(start_seconds, 1),
+        "ready_seconds": round(pull_seconds + start_seconds, 1),
+    }
+
+
+def summarize(results):
+    """Median pull, start and ready times per mode, and the speedup of
+    SOCI on the time to ready."""
+    summary = {}
+    for mode in ("full", "soci"):
+        runs = [result for result in results if result["mode"] == mode]
+        if runs:
+            summary[mode] = {key: round(statistics.median(run[key] for run in runs), 1)
+                             for key in ("pull_seconds", "start_seconds", "ready_seconds")}
+    if "full" in summary and "soci" in summary and summary["soci"]["ready_seconds"]:
+        summary["speedup"] = round(summary["full"]["ready_seconds"] / summary["soci"]["ready_seconds"], 1)
+    return summary
+
+
+def format_summary(summary):
+    lines = [f"{'mode':6} {'pull s':>8} {'start s':>8} {'ready s':>8}"]
+    for mode in ("full", "soci"):
+        if mode in summary:
+            row = summary[mode]
+            lines.append(f"{mode:6} {row['pull_seconds']:>8} {row['start_seconds']:>8} {row['ready_seconds']:>8}")
+    if "speedup" in summary:
+        lines.append(f"SOCI is {summary['speedup']}x faster to ready")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("image", help="SOCI-enabled image of the task definition")
+    parser.add_argument("--full-image",
+                        help="image pulled in full (default: the image without the -soci suffix)")
+    parser.add_argument("--runs", type=int, default=3, help="runs per mode (default: %(default)s)")
+    parser.add_argument("--output", default=os.path.join(tempfile.gettempdir(), "image_pull_results.jsonl"))
+    args = parser.parse_args()
+
+    # Python 3.7 on the Amazon Linux 2 hosts, no str.removesuffix
+    full_image = args.full_image or (
+        args.image[:-len(SOCI_TAG_SUFFIX)] if args.image.endswith(SOCI_TAG_SUFFIX) else args.image)
+    results = []
+    for _ in range(args.runs):
+        for image, mode in [(full_image, "full"), (args.image, "soci")]:
+            results.append(benchmark(image, mode))
+            print(json.dumps(results[-1]))
+            with open(args.output, "a") as f:
+                f.write(json.dumps(results[-1]) + "\n")
+    print(format_summary(summarize(results)))
+
+
+if __name__ == "__main__":
+    main()
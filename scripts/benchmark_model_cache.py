@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Checkpoint load times with and without the NVMe model cache.
+
+Run in the ComfyUI container of an instance deployed with model_cache=True
+(copy the script with `docker cp`). Each checkpoint is loaded from the EBS
+volume, copied to the cache (first access) and loaded from the cache. The
+page cache of the file is dropped before each load, so the disks are
+measured rather than RAM:
+
+    python benchmark_model_cache.py models/checkpoints/sd_xl_base_1.0.safetensors
+
+Loads go through safetensors when it is installed (--read-only to only
+read the files). Results are printed and appended to --output as JSON lines.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+DEFAULT_CACHE_DIR = os.environ.get("MODEL_CACHE_DIR", "/opt/model-cache")
+
+# The launcher is in the image, or in the repository when run from a checkout
+for path in ["/home/user/opt/model_cache",
+             os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          "..", "comfyui_aws_stack", "docker", "model_cache")]:
+    sys.path.insert(0, path)
+
+from model_cache import ModelCache  # noqa: E402
+
+
+def drop_page_cache(path):
+    """Evict the file from the page cache, no root needed for clean pages."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+
+
+def read_file(path, buffer_bytes=16 * 1024 * 1024):
+    with open(path, "rb", buffering=0) as f:
+        while f.read(buffer_bytes):
+            pass
+
+
+def load_checkpoint(path, read_only=False):
+    """Seconds to load a checkpoint from cold storage."""
+    drop_page_cache(path)
+    start = time.perf_counter()
+    if read_only or not path.endswith(".safetensors"):
+        read_file(path)
+    else:
+        from safetensors.torch import load_file
+        load_file(path, device="cpu")
+    return time.perf_counter() - start
+
+
+def benchmark(cache, path, read_only=False):
+    size = os.path.getsize(path)
+    cached = cache.cached_path(path)
+    if os.path.exists(cached):
+        # Start from a miss
+        os.remove(cached)
+        cache.entries.pop(cached, None)
+    source_seconds = load_checkpoint(path, read_only)
+
+    drop_page_cache(path)
+    start = time.perf_counter()
+    cached = cache.path(path)
+    fill_seconds = time.perf_counter() - start
+    cached_seconds = load_checkpoint(cached, read_only)
+
+    mib = size / (1024 * 1024)
+    return {
+        "checkpoint": os.path.basename(path),
+        "size_mib": round(mib),
+        "source_seconds": round(source_seconds, 2),
+        "fill_seconds": round(fill_seconds, 2),
+        "cached_seconds": round(cached_seconds, 2),
+        "source_mib_per_second": round(mib / source_seconds),
+        "cached_mib_per_second": round(mib / cached_seconds),
+        "speedup": round(source_seconds / cached_seconds, 1),
+    }
+
+
+def format_results(results):
+    lines = [f"{'checkpoint':40} {'MiB':>7} {'EBS s':>7} {'fill s':>7} {'NVMe s':>7} {'speedup':>8}"]
+    for result in results:
+        lines.append(
+            f"{result['checkpoint'][:40]:40} {result['size_mib']:>7} {result['source_seconds']:>7} "
+            f"{result['fill_seconds']:>7} {result['cached_seconds']:>7} {result['speedup']:>7}x")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("checkpoints", nargs="+")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR,
+                        help="directory on the instance store (default: %(default)s)")
+    parser.add_argument("--read-only", action="store_true",
+                        help="read the files instead of loading them with safetensors")
+    parser.add_argument("--output", default=os.path.join(tempfile.gettempdir(), "model_cache_results.jsonl"))
+    args = parser.parse_args()
+
+    cache = ModelCache(args.cache_dir)
+    results = []
+    for path in args.checkpoints:
+        results.append(benchmark(cache, os.path.abspath(path), args.read_only))
+        with open(args.output, "a") as f:
+            f.write(json.dumps(results[-1]) + "\n")
+    print(format_results(results))
+
+
+if __name__ == "__main__":
+    main()
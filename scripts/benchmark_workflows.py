@@ -0,0 +1,496 @@
+#!/usr/bin/env python3
+"""
+Workflow benchmark for choosing the ComfyUI instance types.
+
+Replays API-format (or UI-format) workflows against a ComfyUI endpoint and
+records, per run, the end-to-end latency, the sampler iterations/s, the peak
+VRAM and the time spent in model loader nodes. The report joins the results
+of every instance type with on-demand and Spot prices and ranks the instance
+types by cost per output (image or clip).
+
+    # On each instance type (e.g. through an SSM port forward to 8181)
+    python scripts/benchmark_workflows.py run --endpoint http://localhost:8181 \\
+        --instance-type g5.xlarge --workflow workflow_api.json --repeat 3
+
+    python scripts/benchmark_workflows.py report [--fetch-prices us-east-1]
+
+Only the standard library is used (boto3 for --fetch-prices).
+"""
+import argparse
+import base64
+import json
+import os
+import random
+import socket
+import ssl
+import statistics
+import struct
+import sys
+import threading
+import time
+import urllib.parse
+import urllib.request
+import uuid
+from datetime import datetime, timezone
+
+PRICES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "instance_prices.json")
+
+# Seed inputs are randomized per run, ComfyUI would otherwise return the
+# cached result of an identical prompt
+SEED_INPUTS = ("seed", "noise_seed")
+
+# UI-format workflows: nodes that only exist in the frontend, and the mode of
+# muted / bypassed nodes
+FRONTEND_ONLY_NODES = {"Note", "MarkdownNote", "Reroute", "PrimitiveNode"}
+MODE_MUTED = 2
+MODE_BYPASSED = 4
+WIDGET_TYPES = {"INT", "FLOAT", "STRING", "BOOLEAN", "COMBO"}
+CONTROL_AFTER_GENERATE = {"fixed", "increment", "decrement", "randomize"}
+
+# Output keys of /history counted as one image or clip per file
+OUTPUT_KEYS = ("images", "gifs", "videos", "audio")
+
+
+class WebSocket:
+    """Minimal client for the ComfyUI websocket (text messages only)."""
+
+    def __init__(self, url, headers=None, timeout=600):
+        parsed = urllib.parse.urlsplit(url)
+        secure = parsed.scheme in ("https", "wss")
+        port = parsed.port or (443 if secure else 80)
+        sock = socket.create_connection((parsed.hostname, port), timeout=timeout)
+        if secure:
+            sock = ssl.create_default_context().wrap_socket(sock, server_hostname=parsed.hostname)
+        self._sock = sock
+        self._file = sock.makefile("rb")
+
+        key = base64.b64encode(os.urandom(16)).decode()
+        lines = [
+            f"GET {parsed.path or '/'}{'?' + parsed.query if parsed.query else ''} HTTP/1.1",
+            f"Host: {parsed.netloc}",
+            "Upgrade: websocket",
+            "Connection: Upgrade",
+            f"Sec-WebSocket-Key: {key}",
+            "Sec-WebSocket-Version: 13",
+        ] + [f"{name}: {value}" for name, value in (headers or {}).items()]
+        sock.sendall(("\r\n".join(lines) + "\r\n\r\n").encode())
+
+        status = self._file.readline().decode()
+        if " 101 " not in status:
+            raise ConnectionError(f"Websocket upgrade failed: {status.strip()}")
+        while self._file.readline() not in (b"\r\n", b""):
+            pass
+
+    def _send(self, opcode, payload=b""):
+        mask = os.urandom(4)
+        header = bytes([0x80 | opcode])
+        if len(payload) < 126:
+            header += bytes([0x80 | len(payload)])
+        elif len(payload) < 1 << 16:
+            header += bytes([0x80 | 126]) + struct.pack("!H", len(payload))
+        else:
+            header += bytes([0x80 | 127]) + struct.pack("!Q", len(payload))
+        masked = bytes(byte ^ mask[i % 4] for i, byte in enumerate(payload))
+        self._sock.sendall(header + mask + masked)
+
+    def _frame(self):
+        first, second = self._file.read(2)
+        length = second & 0x7F
+        if length == 126:
+            length = struct.unpack("!H", self._file.read(2))[0]
+        elif length == 127:
+            length = struct.unpack("!Q", self._file.read(8))[0]
+        mask = self._file.read(4) if second & 0x80 else None
+        payload = self._file.read(length)
+        if mask:
+            payload = bytes(byte ^ mask[i % 4] for i, byte in enumerate(payload))
+        return bool(first & 0x80), first & 0x0F, payload
+
+    def receive(self):
+        """Next text message, binary messages (previews) are skipped."""
+        message, message_opcode = b"", None
+        while True:
+            fin, opcode, payload = self._frame()
+            if opcode == 0x8:
+                raise ConnectionError("Websocket closed by ComfyUI")
+            if opcode == 0x9:
+                self._send(0xA, payload)
+                continue
+            if opcode in (0x1, 0x2):
+                message, message_opcode = payload, opcode
+            elif opcode == 0x0:
+                message += payload
+            if fin and message_opcode == 0x1:
+                return message.decode()
+            if fin:
+                message, message_opcode = b"", None
+
+    def close(self):
+        try:
+            self._send(0x8)
+        finally:
+            self._sock.close()
+
+
+class ComfyUIClient:
+
+    def __init__(self, endpoint, headers=None, timeout=600):
+        self.endpoint = endpoint.rstrip("/")
+        self.headers = headers or {}
+        self.timeout = timeout
+
+    def request(self, method, path, body=None):
+        request = urllib.request.Request(
+            f"{self.endpoint}{path}", method=method,
+            data=None if body is None else json.dumps(body).encode(),
+            headers={"Content-Type": "application/json", **self.headers})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            payload = response.read()
+        return json.loads(payload) if payload else None
+
+    def websocket(self, client_id):
+        url = self.endpoint.replace("http", "ws", 1) + f"/ws?clientId={client_id}"
+        return WebSocket(url, self.headers, self.timeout)
+
+
+def ui_to_api(workflow, object_info):
+    """Convert a UI-format workflow (as saved by the ComfyUI menu) to the API
+    format, using the node input definitions of /object_info."""
+    nodes = {node["id"]: node for node in workflow["nodes"]}
+    links = {link[0]: (link[1], link[2]) for link in workflow["links"]}
+
+    def source(link_id):
+        origin_id, slot = links[link_id]
+        origin = nodes[origin_id]
+        if origin["type"] == "Reroute":
+            return source(origin["inputs"][0]["link"])
+        if origin.get("mode") == MODE_BYPASSED:
+            # A bypassed node passes its input of the same type through
+            output_type = origin["outputs"][slot]["type"]
+            for node_input in origin.get("inputs", []):
+                if node_input["type"] == output_type and node_input.get("link") is not None:
+                    return source(node_input["link"])
+        return [str(origin_id), slot]
+
+    prompt = {}
+    for node in workflow["nodes"]:
+        if node["type"] in FRONTEND_ONLY_NODES or node.get("mode") in (MODE_MUTED, MODE_BYPASSED):
+            continue
+        if node["type"] not in object_info:
+            raise ValueError(f"Node type {node['type']} is not installed on the ComfyUI endpoint")
+        definition = object_info[node["type"]]["input"]
+
+        # Links from primitive nodes are already reflected in the widget values
+        linked = {node_input["name"]: node_input["link"] for node_input in node.get("inputs", [])
+                  if node_input.get("link") is not None
+                  and nodes[links[node_input["link"]][0]]["type"] != "PrimitiveNode"}
+        values = node.get("widgets_values") or []
+        if isinstance(values, dict):
+            values = [values.get(name) for name in
+                      list(definition.get("required", {})) + list(definition.get("optional", {}))]
+        values = list(values)
+
+        inputs = {}
+        for name, spec in [*definition.get("required", {}).items(), *definition.get("optional", {}).items()]:
+            input_type, options = spec[0], spec[1] if len(spec) > 1 else {}
+            if isinstance(input_type, list) or input_type in WIDGET_TYPES:
+                # Widgets converted to inputs keep their place in the values
+                value = values.pop(0) if values else None
+                if name in linked:
+                    inputs[name] = source(linked[name])
+                elif value is not None:
+                    inputs[name] = value
+                if values and (options.get("control_after_generate") or name in SEED_INPUTS) \
+                        and values[0] in CONTROL_AFTER_GENERATE:
+                    values.pop(0)
+                if values and options.get("image_upload"):
+                    values.pop(0)
+            elif name in linked:
+                inputs[name] = source(linked[name])
+        prompt[str(node["id"])] = {"class_type": node["type"], "inputs": inputs}
+    return prompt
+
+
+def load_workflow(path, client):
+    with open(path) as f:
+        workflow = json.load(f)
+    if "nodes" in workflow and "links" in workflow:
+        workflow = ui_to_api(workflow, client.request("GET", "/object_info"))
+    return workflow
+
+
+def with_seeds(workflow, seed):
+    """Copy of an API-format workflow with every seed input set."""
+    prompt = json.loads(json.dumps(workflow))
+    for node in prompt.values():
+        for name in SEED_INPUTS:
+            if isinstance(node["inputs"].get(name), int):
+                node["inputs"][name] = seed
+    return prompt
+
+
+class VramSampler(threading.Thread):
+    """Poll /system_stats and keep the peak VRAM used by the first GPU."""
+
+    def __init__(self, client, interval=0.5):
+        super().__init__(daemon=True)
+        self.client = client
+        self.interval = interval
+        self.peak_mib = 0
+        self._stopped = threading.Event()
+
+    def sample(self):
+        try:
+            device = self.client.request("GET", "/system_stats")["devices"][0]
+            used = (device["vram_total"] - device["vram_free"]) / (1024 * 1024)
+            self.peak_mib = max(self.peak_mib, round(used))
+        except Exception:
+            pass
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            self.sample()
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+        self.sample()
+
+
+def count_outputs(outputs):
+    return sum(len(node_output.get(key, [])) for node_output in outputs.values()
+               for key in OUTPUT_KEYS)
+
+
+def run_prompt(client, websocket, client_id, prompt):
+    """Submit one prompt and follow its execution on the websocket."""
+    vram = VramSampler(client)
+    vram.start()
+    start = time.perf_counter()
+    prompt_id = client.request("POST", "/prompt", {"prompt": prompt, "client_id": client_id})["prompt_id"]
+
+    node_seconds = {}
+    current, node_started = None, start
+    progress = {}
+    while True:
+        message = json.loads(websocket.receive())
+        data = message.get("data", {})
+        if data.get("prompt_id") != prompt_id:
+            continue
+        now = time.perf_counter()
+        if message["type"] == "executing" or message["type"] == "execution_success":
+            if current is not None:
+                node_seconds[current] = node_seconds.get(current, 0) + now - node_started
+            current, node_started = data.get("node"), now
+            if current is None:
+                break
+        elif message["type"] == "progress":
+            first = progress.setdefault(data["node"], [now, data["value"], now, data["value"]])
+            first[2], first[3] = now, data["value"]
+        elif message["type"] == "execution_error":
+            vram.stop()
+            raise RuntimeError(f"{data.get('node_type')}: {data.get('exception_message')}")
+    latency = time.perf_counter() - start
+    vram.stop()
+
+    history = client.request("GET", f"/history/{prompt_id}")[prompt_id]
+    steps = sum(last_value - first_value for _, first_value, _, last_value in progress.values())
+    sampling_seconds = sum(last - first for first, _, last, _ in progress.values())
+    return {
+        "prompt_id": prompt_id,
+        "latency_seconds": round(latency, 3),
+        "iterations_per_second": round(steps / sampling_seconds, 3) if sampling_seconds else None,
+        "peak_vram_mib": vram.peak_mib,
+        "model_load_seconds": round(sum(
+            seconds for node_id, seconds in node_seconds.items()
+            if "Loader" in prompt.get(node_id, {}).get("class_type", "")), 3),
+        "outputs": count_outputs(history.get("outputs", {})),
+    }
+
+
+def benchmark(client, instance_type, workflow_paths, repeat=3):
+    """Run every workflow once cold (models unloaded) and `repeat` times warm."""
+    client_id = str(uuid.uuid4())
+    websocket = client.websocket(client_id)
+    results = []
+    try:
+        for path in workflow_paths:
+            workflow = load_workflow(path, client)
+            client.request("POST", "/free", {"unload_models": True, "free_memory": True})
+            for run in range(repeat + 1):
+                result = run_prompt(client, websocket, client_id,
+                                    with_seeds(workflow, random.randint(0, 2 ** 32 - 1)))
+                results.append({
+                    "workflow": os.path.basename(path),
+                    "instance_type": instance_type,
+                    "run": run,
+                    "cold": run == 0,
+                    **result,
+                })
+                print(json.dumps(results[-1]), file=sys.stderr)
+    finally:
+        websocket.close()
+    return results
+
+
+def fetch_prices(region, instance_types):
+    """On-demand (Linux, shared tenancy) and current lowest Spot prices."""
+    import boto3
+
+    prices = {}
+    pricing = boto3.client("pricing", region_name="us-east-1")
+    ec2 = boto3.client("ec2", region_name=region)
+    for instance_type in instance_types:
+        filters = {"instanceType": instance_type, "regionCode": region, "operatingSystem": "Linux",
+                   "tenancy": "Shared", "preInstalledSw": "NA", "capacitystatus": "Used"}
+        products = pricing.get_products(ServiceCode="AmazonEC2", Filters=[
+            {"Type": "TERM_MATCH", "Field": field, "Value": value} for field, value in filters.items()
+        ])["PriceList"]
+        entry = {}
+        for product in map(json.loads, products):
+            for term in product["terms"]["OnDemand"].values():
+                for dimension in term["priceDimensions"].values():
+                    entry["on_demand"] = float(dimension["pricePerUnit"]["USD"])
+        spot = ec2.describe_spot_price_history(
+            InstanceTypes=[instance_type], ProductDescriptions=["Linux/UNIX"],
+            StartTime=datetime.now(timezone.utc))["SpotPriceHistory"]
+        if spot:
+            entry["spot"] = min(float(item["SpotPrice"]) for item in spot)
+        prices[instance_type] = entry
+    return prices
+
+
+def summarize(results, prices):
+    """Per workflow and instance type, the median of the warm runs and the
+    cost per output at the on-demand and Spot price."""
+    groups = {}
+    for result in results:
+        groups.setdefault((result["workflow"], result["instance_type"]), []).append(result)
+
+    rows = []
+    for (workflow, instance_type), runs in sorted(groups.items()):
+        warm = [run for run in runs if not run["cold"]] or runs
+        cold = [run for run in runs if run["cold"]]
+        latency = statistics.median(run["latency_seconds"] for run in warm)
+        speeds = [run["iterations_per_second"] for run in warm if run["iterations_per_second"]]
+        outputs = max(statistics.median(run["outputs"] for run in warm), 1)
+        row = {
+            "workflow": workflow,
+            "instance_type": instance_type,
+            "latency_seconds": round(latency, 3),
+            "iterations_per_second": round(statistics.median(speeds), 3) if speeds else None,
+            "peak_vram_mib": max(run["peak_vram_mib"] for run in runs),
+            "model_load_seconds": cold[0]["model_load_seconds"] if cold else None,
+            "outputs_per_run": outputs,
+        }
+        for price_type in ("on_demand", "spot"):
+            price = prices.get(instance_type, {}).get(price_type)
+            row[f"{price_type}_cost_per_output"] = (
+                round(price * latency / 3600 / outputs, 6) if price is not None else None)
+        rows.append(row)
+    return rows
+
+
+def rank(rows, price_type="spot"):
+    """Instance types ordered by their total cost per output over all
+    workflows. Instance types that did not run every workflow, or have no
+    price, are left out."""
+    workflows = {row["workflow"] for row in rows}
+    totals = {}
+    for row in rows:
+        cost = row[f"{price_type}_cost_per_output"]
+        if cost is None:
+            cost = row["on_demand_cost_per_output"]
+        if cost is None:
+            continue
+        total = totals.setdefault(row["instance_type"], {"cost": 0, "workflows": set()})
+        total["cost"] += cost
+        total["workflows"].add(row["workflow"])
+    ranked = [(total["cost"], instance_type) for instance_type, total in totals.items()
+              if total["workflows"] == workflows]
+    return [instance_type for _, instance_type in sorted(ranked)]
+
+
+def format_report(rows, ranking):
+    def cell(value, fmt="{}"):
+        return "-" if value is None else fmt.format(value)
+
+    lines = []
+    for workflow in sorted({row["workflow"] for row in rows}):
+        workflow_rows = sorted(
+            (row for row in rows if row["workflow"] == workflow),
+            key=lambda row: (row["spot_cost_per_output"] or row["on_demand_cost_per_output"] or float("inf")))
+        lines += [
+            f"## {workflow}",
+            "",
+            "| Instance type | Latency (s) | it/s | Peak VRAM (MiB) | Model load (s) | On-demand $/output | Spot $/output |",
+            "| --- | ---: | ---: | ---: | ---: | ---: | ---: |",
+        ]
+        lines += [
+            f"| {row['instance_type']} | {row['latency_seconds']:.2f} | {cell(row['iterations_per_second'], '{:.2f}')} "
+            f"| {row['peak_vram_mib']} | {cell(row['model_load_seconds'], '{:.2f}')} "
+            f"| {cell(row['on_demand_cost_per_output'], '{:.5f}')} | {cell(row['spot_cost_per_output'], '{:.5f}')} |"
+            for row in workflow_rows
+        ]
+        lines.append("")
+    lines += [
+        "## Suggested instance_types",
+        "",
+        "Ordered by total cost per output over all workflows (Spot price where known):",
+        "",
+        f"    instance_types={json.dumps(ranking)}",
+    ]
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="benchmark workflows on one instance type")
+    run_parser.add_argument("--endpoint", default="http://localhost:8181")
+    run_parser.add_argument("--instance-type", required=True,
+                            help="instance type running the endpoint (recorded with the results)")
+    run_parser.add_argument("--workflow", action="append", required=True,
+                            help="API-format or UI-format workflow JSON (repeatable)")
+    run_parser.add_argument("--repeat", type=int, default=3, help="warm runs per workflow")
+    run_parser.add_argument("--header", action="append", default=[],
+                            help="extra HTTP header, e.g. 'Cookie: AWSELBAuthSessionCookie-0=...'")
+    run_parser.add_argument("--results", default="benchmark_results.jsonl",
+                            help="JSON lines file the runs are appended to")
+
+    report_parser = commands.add_parser("report", help="price-performance report of the results")
+    report_parser.add_argument("--results", default="benchmark_results.jsonl")
+    report_parser.add_argument("--prices", default=PRICES_FILE,
+                               help="JSON file of {instance_type: {on_demand, spot}} USD per hour")
+    report_parser.add_argument("--fetch-prices", metavar="REGION",
+                               help="read current prices from the AWS Price List and Spot price history")
+    report_parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        client = ComfyUIClient(args.endpoint, dict(
+            header.split(": ", 1) for header in args.header))
+        results = benchmark(client, args.instance_type, args.workflow, args.repeat)
+        with open(args.results, "a") as f:
+            for result in results:
+                f.write(json.dumps(result) + "\n")
+        return
+
+    with open(args.results) as f:
+        results = [json.loads(line) for line in f if line.strip()]
+    if args.fetch_prices:
+        prices = fetch_prices(args.fetch_prices, sorted({result["instance_type"] for result in results}))
+    else:
+        with open(args.prices) as f:
+            prices = json.load(f)
+    rows = summarize(results, prices)
+    ranking = rank(rows)
+    if args.json:
+        print(json.dumps({"rows": rows, "instance_types": ranking}, indent=2))
+    else:
+        print(format_report(rows, ranking))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Regenerate comfyui_aws_stack/instance_types.json, the instance capability
+table the stack derives the task memory, swap and ComfyUI VRAM flags from.
+
+Describes the NVIDIA GPU instance families with EC2 DescribeInstanceTypes
+(needs AWS credentials, any region offering the families):
+
+    python scripts/generate_instance_types.py [--families g4dn g5 g6 gr6 g6e]
+"""
+import argparse
+import json
+import os
+
+import boto3
+
+INSTANCE_TYPES_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "..", "comfyui_aws_stack", "instance_types.json")
+
+FAMILIES = ["g4dn", "g5", "g6", "gr6", "g6e"]
+
+
+def capabilities(instance_type):
+    """Table entry of a DescribeInstanceTypes result."""
+    gpus = instance_type["GpuInfo"]["Gpus"]
+    return {
+        "vcpus": instance_type["VCpuInfo"]["DefaultVCpus"],
+        "memory_mib": instance_type["MemoryInfo"]["SizeInMiB"],
+        "gpus": sum(gpu["Count"] for gpu in gpus),
+        "gpu_memory_mib": min(gpu["MemoryInfo"]["SizeInMiB"] for gpu in gpus),
+        "instance_storage_gb": instance_type.get("InstanceStorageInfo", {}).get("TotalSizeInGB", 0),
+    }
+
+
+def sort_key(name):
+    family, size = name.split(".")
+    # xlarge, 2xlarge, ..., 48xlarge, metal
+    multiplier = size[:-len("xlarge")] if size.endswith("xlarge") else "1000"
+    return FAMILIES.index(family), int(multiplier or 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--region", default=os.environ.get("AWS_REGION", "us-east-1"))
+    parser.add_argument("--families", nargs="+", default=FAMILIES)
+    args = parser.parse_args()
+    FAMILIES[:] = args.families
+
+    ec2 = boto3.client("ec2", region_name=args.region)
+    table = {}
+    paginator = ec2.get_paginator("describe_instance_types")
+    for page in paginator.paginate(Filters=[
+            {"Name": "instance-type", "Values": [f"{family}.*" for family in args.families]}]):
+        for instance_type in page["InstanceTypes"]:
+            table[instance_type["InstanceType"]] = capabilities(instance_type)
+
+    # One line per instance type keeps the diffs readable
+    with open(INSTANCE_TYPES_FILE, "w") as f:
+        f.write("{\n" + ",\n".join(
+            f'  "{name}": {json.dumps(table[name])}'
+            for name in sorted(table, key=sort_key)) + "\n}\n")
+    print(f"Wrote {len(table)} instance types to {os.path.normpath(INSTANCE_TYPES_FILE)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Compressed size and layer breakdown of the ComfyUI image.
+
+Instances pull the compressed layers from ECR on every scale-up, so the
+compressed size is what the pull time depends on. The image is exported
+with `docker save` and every layer is gzip-compressed as `docker push`
+does:
+
+    python image_size.py comfyui-aws:latest [--budget-gib 5] [--output report.json]
+
+Exits with 1 when the compressed size is over the budget.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tarfile
+import tempfile
+import zlib
+
+# Compressed size budget of the runtime image
+BUDGET_GIB = 5.0
+
+GIB = 1024 ** 3
+READ_BYTES = 16 * 1024 * 1024
+
+
+def compressed_size(f):
+    """gzip size of a stream, at the default level of docker push."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    size = 0
+    for data in iter(lambda: f.read(READ_BYTES), b""):
+        size += len(compressor.compress(data))
+    return size + len(compressor.flush())
+
+
+def layer_report(saved_image):
+    """Layers of an image saved with `docker save`, with the instruction
+    that created them, their size and their compressed size."""
+    with tarfile.open(saved_image) as tar:
+        [manifest] = json.load(tar.extractfile("manifest.json"))
+        config = json.load(tar.extractfile(manifest["Config"]))
+        # Instructions without a layer (ENV, WORKDIR...) are marked empty
+        instructions = [step.get("created_by", "") for step in config.get("history", [])
+                        if not step.get("empty_layer")]
+        if len(instructions) != len(manifest["Layers"]):
+            instructions = [""] * len(manifest["Layers"])
+        layers = []
+        for name, created_by in zip(manifest["Layers"], instructions):
+            member = tar.getmember(name)
+            layers.append({
+                "created_by": created_by,
+                "size": member.size,
+                "compressed_size": compressed_size(tar.extractfile(member)),
+            })
+    return layers
+
+
+def format_report(layers):
+    lines = [f"{'Compressed':>12} {'Size':>12}  Created by"]
+    for layer in sorted(layers, key=lambda layer: layer["compressed_size"], reverse=True):
+        created_by = " ".join(layer["created_by"].split())
+        lines.append(f"{layer['compressed_size'] / GIB:10.2f}Gi {layer['size'] / GIB:10.2f}Gi  {created_by[:100]}")
+    total = sum(layer["compressed_size"] for layer in layers)
+    lines.append(f"{total / GIB:10.2f}Gi {sum(layer['size'] for layer in layers) / GIB:10.2f}Gi  "
+                 f"total ({len(layers)} layers)")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("image", help="local image, e.g. comfyui-aws:latest")
+    parser.add_argument("--budget-gib", type=float, default=BUDGET_GIB,
+                        help="compressed size budget (default: %(default)s)")
+    parser.add_argument("--output", help="write the layers as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        saved_image = os.path.join(tmp, "image.tar")
+        subprocess.run(["docker", "save", "-o", saved_image, args.image], check=True)
+        layers = layer_report(saved_image)
+
+    print(format_report(layers))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(layers, f, indent=2)
+
+    total = sum(layer["compressed_size"] for layer in layers) / GIB
+    if total > args.budget_gib:
+        print(f"{args.image} is {total:.2f} GiB compressed, over the {args.budget_gib} GiB budget")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,7 @@
+# The models below are also listed in comfyui_aws_stack/docker/comfyui_config/models.json,
+# which the model downloader fetches in parallel at container start (download_models=True)
+# or from the admin page ("Download Models"). See docs/DEPLOY_OPTION.md.
+
 # 1. SSM into EC2
 aws ssm start-session --target "$(aws ec2 describe-instances --filters "Name=tag:Name,Values=ComfyUIStack/Host" "Name=instance-state-name,Values=running" --query 'Reservations[*].Instances[*].[InstanceId]' --output text)" --region $AWS_DEFAULT_REGION
 
@@ -0,0 +1,115 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "comfyui_aws_stack", "lambda", "admin_lambda"))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+import router  # noqa: E402
+import status  # noqa: E402
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class FakeContext:
+    def __init__(self, remaining_seconds):
+        self.remaining_seconds = remaining_seconds
+
+    def get_remaining_time_in_millis(self):
+        return self.remaining_seconds * 1000
+
+
+def state(desired_capacity, running_count):
+    return {"desired_capacity": desired_capacity, "running_count": running_count, "phase": None}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(status, "time", fake)
+    return fake
+
+
+def poll(phase, context=None):
+    response = status.handler({"queryStringParameters": {"phase": phase}}, context)
+    return response["statusCode"], json.loads(response["body"])
+
+
+def test_status_returns_at_once_when_the_phase_differs(clock, monkeypatch):
+    monkeypatch.setattr(status, "get_cluster_state", lambda: state(1, 0))
+
+    assert poll("stopped") == (200, {"phase": "instance_launching", "desired_capacity": 1, "running_count": 0})
+    assert clock.now == 1000.0
+
+
+def test_status_returns_when_the_phase_changes(clock, monkeypatch):
+    monkeypatch.setattr(status, "get_cluster_state", lambda: state(1, 1) if clock.now >= 1003 else state(1, 0))
+
+    assert poll("instance_launching")[1]["phase"] == "ready"
+    assert clock.now == 1003.0
+
+
+def test_status_times_out_at_the_deadline(clock, monkeypatch):
+    monkeypatch.setattr(status, "get_cluster_state", lambda: state(0, 0))
+
+    assert poll("stopped") == (200, {"phase": "stopped", "desired_capacity": 0, "running_count": 0})
+    assert clock.now - 1000 <= status.LONG_POLL_SECONDS
+    assert clock.now - 1000 >= status.LONG_POLL_SECONDS - status.POLL_INTERVAL_SECONDS
+
+    # Within the remaining time of the function
+    clock.now = 1000.0
+    poll("stopped", FakeContext(remaining_seconds=10))
+    assert clock.now - 1000 <= 10 - 5
+
+
+def test_status_error(clock, monkeypatch):
+    def unreachable():
+        raise RuntimeError("describe failed")
+
+    monkeypatch.setattr(status, "get_cluster_state", unreachable)
+
+    assert poll("stopped") == (500, {"error": "Unable to determine the status of ComfyUI."})
+
+
+def alb_request(path):
+    return {"requestContext": {"elb": {"targetGroupArn": "arn"}}, "path": path}
+
+
+def test_requests_are_dispatched_on_the_path(monkeypatch):
+    calls = []
+    monkeypatch.setitem(router.PATH_HANDLERS, "/admin/status",
+                        lambda event, context: calls.append(event["path"]) or {"statusCode": 200})
+
+    assert router.handler(alb_request("/admin/status/"), None) == {"statusCode": 200}
+    assert calls == ["/admin/status/"]
+
+
+def test_unknown_path_is_not_found():
+    response = router.handler(alb_request("/admin/unknown"), None)
+
+    assert response["statusCode"] == 404
+    assert "/admin/unknown" in json.loads(response["body"])
+
+
+def test_events_are_dispatched_on_the_source_and_detail_type(monkeypatch):
+    key = ("aws.ecs", "ECS Task State Change")
+    monkeypatch.setitem(router.EVENT_HANDLERS, key, lambda event, context: {"statusCode": 202})
+
+    assert router.handler({"source": key[0], "detail-type": key[1], "detail": {}}, None) == {"statusCode": 202}
+
+
+def test_unknown_event_is_an_error():
+    with pytest.raises(ValueError, match="EC2 Instance State-change Notification events from aws.ec2"):
+        router.handler({"source": "aws.ec2", "detail-type": "EC2 Instance State-change Notification"}, None)
+
@@ -0,0 +1,225 @@
+import base64
+import hashlib
+import http.server
+import json
+import os
+import queue
+import struct
+import sys
+import threading
+import time
+import uuid
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "scripts"))
+
+import benchmark_workflows  # noqa: E402
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(__file__), "..", "docs", "comfyui_examples")
+TXT2GIF_WORKFLOW = os.path.join(EXAMPLES_DIR, "programmable_pipeline", "workflow_api_txt2gif.json")
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+VRAM_TOTAL = 16 * 1024 ** 3
+VRAM_USED = 6 * 1024 ** 3
+SAMPLER_STEPS = 10
+
+
+class MockComfyUI(http.server.ThreadingHTTPServer):
+    """Answers the ComfyUI API calls used by the benchmark and plays a fake
+    execution (loader, sampler progress, save) on the websocket."""
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), MockComfyUIHandler)
+        self.prompts = []
+        self.messages = queue.Queue()
+        self.vram_used = 0
+
+    @property
+    def endpoint(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def execute(self, prompt_id, prompt):
+        def send(message_type, delay=0.0, **data):
+            self.messages.put((delay, json.dumps({"type": message_type, "data": data})))
+
+        self.messages.put((0, "status"))
+        self.messages.put((0, b"\x00\x00\x00\x01preview"))
+        loader = next(node_id for node_id, node in prompt.items() if "Loader" in node["class_type"])
+        send("executing", node=loader, prompt_id=prompt_id)
+        send("executing", delay=0.05, node="sampler", prompt_id=prompt_id)
+        for step in range(1, SAMPLER_STEPS + 1):
+            send("progress", delay=0.01, value=step, max=SAMPLER_STEPS, node="sampler", prompt_id=prompt_id)
+        send("executing", node="save", prompt_id=prompt_id)
+        send("executing", delay=0.01, node=None, prompt_id=prompt_id)
+
+
+class MockComfyUIHandler(http.server.BaseHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+    def _json(self, body):
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _frame(self, payload):
+        opcode = 0x2 if isinstance(payload, bytes) else 0x1
+        payload = payload if isinstance(payload, bytes) else payload.encode()
+        header = bytes([0x80 | opcode])
+        if len(payload) < 126:
+            header += bytes([len(payload)])
+        else:
+            header += bytes([126]) + struct.pack("!H", len(payload))
+        self.wfile.write(header + payload)
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path.startswith("/ws"):
+            accept = base64.b64encode(hashlib.sha1(
+                (self.headers["Sec-WebSocket-Key"] + WEBSOCKET_GUID).encode()).digest()).decode()
+            self.send_response(101)
+            self.send_header("Upgrade", "websocket")
+            self.send_header("Connection", "Upgrade")
+            self.send_header("Sec-WebSocket-Accept", accept)
+            self.end_headers()
+            while True:
+                delay, message = self.server.messages.get()
+                if message is None:
+                    return
+                time.sleep(delay)
+                if message == "status":
+                    message = json.dumps({"type": "status", "data": {"status": {}}})
+                else:
+                    self.server.vram_used = VRAM_USED
+                self._frame(message)
+        elif self.path == "/system_stats":
+            self._json({"devices": [{"vram_total": VRAM_TOTAL,
+                                     "vram_free": VRAM_TOTAL - self.server.vram_used}]})
+        elif self.path.startswith("/history/"):
+            prompt_id = self.path.rsplit("/", 1)[1]
+            self._json({prompt_id: {"outputs": {
+                "save": {"images": [{"filename": "a.png"}, {"filename": "b.png"}]}}}})
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if self.path == "/prompt":
+            prompt_id = str(uuid.uuid4())
+            self.server.prompts.append(body["prompt"])
+            self.server.execute(prompt_id, body["prompt"])
+            self._json({"prompt_id": prompt_id, "number": len(self.server.prompts), "node_errors": {}})
+        elif self.path == "/free":
+            self.server.vram_used = 0
+            self._json({})
+        else:
+            self.send_error(404)
+
+
+@pytest.fixture
+def comfyui():
+    server = MockComfyUI()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.messages.put((0, None))
+    server.shutdown()
+
+
+def test_benchmark_against_mock_comfyui(comfyui):
+    client = benchmark_workflows.ComfyUIClient(comfyui.endpoint)
+
+    results = benchmark_workflows.benchmark(client, "g5.xlarge", [TXT2GIF_WORKFLOW], repeat=2)
+
+    assert [(result["run"], result["cold"]) for result in results] == [(0, True), (1, False), (2, False)]
+    for result in results:
+        assert result["workflow"] == "workflow_api_txt2gif.json"
+        assert result["instance_type"] == "g5.xlarge"
+        assert result["outputs"] == 2
+        assert result["peak_vram_mib"] == VRAM_USED // (1024 * 1024)
+        assert result["model_load_seconds"] >= 0.04
+        assert 0 < result["iterations_per_second"] <= 100 * SAMPLER_STEPS
+        assert result["latency_seconds"] >= result["model_load_seconds"]
+    # Every run gets a new seed so ComfyUI does not serve it from its cache
+    seeds = [prompt["15"]["inputs"]["seed"] for prompt in comfyui.prompts]
+    assert len(set(seeds)) == 3
+
+
+def test_ui_workflow_is_converted_with_object_info():
+    workflow = {
+        "nodes": [
+            {"id": 1, "type": "CheckpointLoaderSimple", "mode": 0, "widgets_values": ["sd_xl_base_1.0.safetensors"],
+             "outputs": [{"type": "MODEL"}, {"type": "CLIP"}, {"type": "VAE"}]},
+            {"id": 2, "type": "Reroute", "mode": 0, "inputs": [{"name": "", "type": "*", "link": 1}]},
+            {"id": 3, "type": "KSamplerAdvanced", "mode": 0,
+             "inputs": [{"name": "model", "type": "MODEL", "link": 2},
+                        {"name": "steps", "type": "INT", "link": 3, "widget": {"name": "steps"}}],
+             "widgets_values": ["enable", 1234, "randomize", 20, 7, "euler", "normal"]},
+            {"id": 4, "type": "PrimitiveNode", "mode": 0, "widgets_values": [30]},
+            {"id": 5, "type": "LoadImage", "mode": 0, "widgets_values": ["face.jpg", "image"]},
+            {"id": 6, "type": "Note", "mode": 0, "widgets_values": ["comment"]},
+            {"id": 7, "type": "SaveImage", "mode": 2, "widgets_values": ["muted"]},
+        ],
+        "links": [[1, 1, 0, 2, 0, "MODEL"], [2, 2, 0, 3, 0, "MODEL"], [3, 4, 0, 3, 1, "INT"]],
+    }
+    object_info = {
+        "CheckpointLoaderSimple": {"input": {"required": {"ckpt_name": [["sd_xl_base_1.0.safetensors"]]}}},
+        "KSamplerAdvanced": {"input": {"required": {
+            "model": ["MODEL"],
+            "add_noise": [["enable", "disable"]],
+            "noise_seed": ["INT", {"default": 0, "control_after_generate": True}],
+            "steps": ["INT", {"default": 20}],
+            "cfg": ["FLOAT", {"default": 8.0}],
+            "sampler_name": [["euler", "ddim"]],
+            "scheduler": [["normal", "karras"]],
+        }}},
+        "LoadImage": {"input": {"required": {"image": [["face.jpg"], {"image_upload": True}]}}},
+        "SaveImage": {"input": {"required": {"images": ["IMAGE"]}}},
+    }
+
+    prompt = benchmark_workflows.ui_to_api(workflow, object_info)
+
+    assert prompt == {
+        "1": {"class_type": "CheckpointLoaderSimple", "inputs": {"ckpt_name": "sd_xl_base_1.0.safetensors"}},
+        "3": {"class_type": "KSamplerAdvanced", "inputs": {
+            "model": ["1", 0], "add_noise": "enable", "noise_seed": 1234, "steps": 20,
+            "cfg": 7, "sampler_name": "euler", "scheduler": "normal"}},
+        "5": {"class_type": "LoadImage", "inputs": {"image": "face.jpg"}},
+    }
+
+
+def test_report_ranks_instance_types_by_cost_per_output():
+    def result(workflow, instance_type, latency, cold=False):
+        return {"workflow": workflow, "instance_type": instance_type, "cold": cold,
+                "latency_seconds": latency, "iterations_per_second": 10.0, "peak_vram_mib": 9000,
+                "model_load_seconds": 4.0, "outputs": 1}
+
+    results = [
+        result("txt2gif.json", "g4dn.xlarge", 100.0, cold=True),
+        result("txt2gif.json", "g4dn.xlarge", 36.0),
+        result("txt2gif.json", "g5.xlarge", 12.0),
+        result("face-swap.json", "g4dn.xlarge", 18.0),
+        result("face-swap.json", "g5.xlarge", 6.0),
+        # Not run for every workflow, left out of the suggestion
+        result("txt2gif.json", "g6.xlarge", 1.0),
+    ]
+    prices = {"g4dn.xlarge": {"on_demand": 0.5, "spot": 0.2},
+              "g5.xlarge": {"on_demand": 1.0, "spot": 0.45},
+              "g6.xlarge": {"on_demand": 0.8}}
+
+    rows = benchmark_workflows.summarize(results, prices)
+    g4dn = next(row for row in rows
+                if row["workflow"] == "txt2gif.json" and row["instance_type"] == "g4dn.xlarge")
+
+    # Cold runs only contribute the model load time
+    assert g4dn["latency_seconds"] == 36.0
+    assert g4dn["on_demand_cost_per_output"] == 0.005
+    assert g4dn["spot_cost_per_output"] == 0.002
+    assert benchmark_workflows.rank(rows) == ["g5.xlarge", "g4dn.xlarge"]
+    assert 'instance_types=["g5.xlarge", "g4dn.xlarge"]' in benchmark_workflows.format_report(
+        rows, benchmark_workflows.rank(rows))
@@ -0,0 +1,129 @@
+import os
+import sys
+import time
+from decimal import Decimal
+
+import pytest
+from botocore.exceptions import ClientError
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "comfyui_aws_stack", "lambda", "admin_lambda"))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+import cluster_state  # noqa: E402
+
+
+class FakeTable:
+    """DynamoDB table holding the single cluster item, with the
+    attribute_exists(id) condition of update_cluster_state."""
+
+    def __init__(self, item=None):
+        self.item = item
+        self.updates = []
+
+    def get_item(self, Key):
+        return {"Item": dict(self.item)} if self.item else {}
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeValues, ConditionExpression=None,
+                    ExpressionAttributeNames=None, ReturnValues=None):
+        self.updates.append(Key)
+        if ConditionExpression == "attribute_exists(id)" and self.item is None:
+            raise ClientError({"Error": {"Code": "ConditionalCheckFailedException", "Message": ""}}, "UpdateItem")
+        names = ExpressionAttributeNames or {}
+        item = dict(self.item or {"id": Key["id"]})
+        for assignment in UpdateExpression[len("SET "):].split(", "):
+            name, value = assignment.split(" = ")
+            item[names.get(name, name)] = ExpressionAttributeValues[value]
+        self.item = item
+        return {"Attributes": dict(item)}
+
+
+class FakeAutoScaling:
+    def describe_auto_scaling_groups(self, AutoScalingGroupNames):
+        return {"AutoScalingGroups": [{"DesiredCapacity": 1, "Instances": [{"InstanceId": "i-0123"}]}]}
+
+
+class FakeEcs:
+    def describe_services(self, cluster, services):
+        return {"services": [{"desiredCount": 1, "runningCount": 0}]}
+
+
+def item(age, **fields):
+    return {"id": cluster_state.CLUSTER_STATE_KEY, "desired_capacity": Decimal(0), "instances": [],
+            "service_desired_count": Decimal(0), "running_count": Decimal(0),
+            "updated_at": Decimal(str(time.time() - age)), **fields}
+
+
+@pytest.fixture
+def table(monkeypatch):
+    def install(cached=None):
+        fake = FakeTable(cached)
+        monkeypatch.setattr(cluster_state, "_table", lambda: fake)
+        return fake
+
+    monkeypatch.setenv("ASG_NAME", "ComfyASG")
+    monkeypatch.setenv("ECS_CLUSTER_NAME", "ComfyUICluster")
+    monkeypatch.setenv("ECS_SERVICE_NAME", "ComfyUIService")
+    monkeypatch.setenv("CLUSTER_STATE_TTL_SECONDS", "60")
+    clients = {"autoscaling": FakeAutoScaling(), "ecs": FakeEcs()}
+    monkeypatch.setattr(cluster_state, "client", lambda name: clients[name])
+    return install
+
+
+def test_fresh_cache_is_returned(table):
+    fake = table(item(10, phase="ready"))
+
+    state = cluster_state.get_cluster_state()
+
+    assert state["desired_capacity"] == 0 and state["phase"] == "ready"
+    assert fake.updates == []
+
+
+def test_expired_cache_is_refreshed_keeping_the_phase(table):
+    fake = table(item(61, phase="task_placed"))
+
+    state = cluster_state.get_cluster_state()
+
+    assert state["desired_capacity"] == 1
+    assert state["instances"] == ["i-0123"]
+    assert state["phase"] == "task_placed"
+    assert time.time() - state["updated_at"] < 5
+    assert len(fake.updates) == 1
+
+
+def test_missing_cache_is_refreshed(table):
+    table(None)
+
+    state = cluster_state.get_cluster_state()
+
+    assert state["desired_capacity"] == 1 and state["phase"] is None
+
+
+def test_unreachable_cache_falls_back_to_the_describe_apis(table, monkeypatch):
+    def unreachable():
+        raise ClientError({"Error": {"Code": "ResourceNotFoundException", "Message": ""}}, "GetItem")
+
+    monkeypatch.setattr(cluster_state, "_table", unreachable)
+
+    state = cluster_state.get_cluster_state()
+
+    assert state["desired_capacity"] == 1 and state["phase"] is None
+
+
+def test_update_keeps_the_timestamp(table):
+    cached = item(30)
+    fake = table(cached)
+
+    cluster_state.update_cluster_state(desired_capacity=1, phase="instance_launching")
+
+    assert fake.item["desired_capacity"] == 1
+    assert fake.item["phase"] == "instance_launching"
+    assert fake.item["updated_at"] == cached["updated_at"]
+
+
+def test_update_without_a_cached_item_is_ignored(table, capsys):
+    fake = table(None)
+
+    cluster_state.update_cluster_state(desired_capacity=1)
+
+    assert fake.item is None
+    assert "ConditionalCheckFailedException" in capsys.readouterr().out
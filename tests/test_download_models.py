@@ -0,0 +1,159 @@
+import hashlib
+import http.server
+import json
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "comfyui_aws_stack", "docker", "model_downloader"))
+
+import download_models  # noqa: E402
+
+CONFIG = os.path.join(os.path.dirname(__file__), "..", "comfyui_aws_stack", "docker",
+                      "comfyui_config", "extra_model_paths.yaml")
+MANIFEST = os.path.join(os.path.dirname(__file__), "..", "comfyui_aws_stack", "docker",
+                        "comfyui_config", "models.json")
+CHUNK = 1024
+MODEL = bytes(range(256)) * 20  # 5 chunks
+
+
+class ModelServer(http.server.ThreadingHTTPServer):
+    """Serves MODEL on every path, with or without range support."""
+
+    def __init__(self, ranges=True):
+        super().__init__(("127.0.0.1", 0), ModelHandler)
+        self.ranges = ranges
+        self.requests = []
+
+    def url(self, name="model.safetensors"):
+        return f"http://127.0.0.1:{self.server_address[1]}/{name}"
+
+
+class ModelHandler(http.server.BaseHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        requested = self.headers.get("Range")
+        self.server.requests.append(requested)
+        if requested and self.server.ranges:
+            start, end = requested.split("=")[1].split("-")
+            start, end = int(start), int(end or len(MODEL) - 1)
+            body = MODEL[start:end + 1]
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(MODEL)}")
+        else:
+            body = MODEL
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve(ranges=True):
+    server = ModelServer(ranges)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+@pytest.fixture
+def server():
+    server = serve()
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def folders(tmp_path):
+    return {"checkpoints": str(tmp_path / "checkpoints"), "loras": str(tmp_path / "loras")}
+
+
+def model(server, **fields):
+    return {"name": "model.safetensors", "url": server.url(), "folder": "checkpoints",
+            "sha256": hashlib.sha256(MODEL).hexdigest(), "size": len(MODEL), **fields}
+
+
+def test_parallel_ranged_download(server, folders):
+    assert download_models.download(model(server), folders, connections=4, chunk_bytes=CHUNK) == "downloaded"
+
+    target = os.path.join(folders["checkpoints"], "model.safetensors")
+    with open(target, "rb") as f:
+        assert f.read() == MODEL
+    # Probe plus one request per chunk
+    assert sorted(server.requests[1:]) == sorted(
+        f"bytes={start}-{min(start + CHUNK, len(MODEL)) - 1}" for start in range(0, len(MODEL), CHUNK))
+    assert os.listdir(folders["checkpoints"]) == ["model.safetensors"]
+
+
+def test_interrupted_download_resumes(server, folders):
+    target = os.path.join(folders["checkpoints"], "model.safetensors")
+    os.makedirs(folders["checkpoints"])
+    with open(target + ".download", "wb") as f:
+        f.write(MODEL[:2 * CHUNK] + b"\x00" * (len(MODEL) - 2 * CHUNK))
+    with open(target + ".download.json", "w") as f:
+        json.dump({"url": server.url(), "size": len(MODEL), "chunk_bytes": CHUNK, "done": [0, 1]}, f)
+
+    download_models.download(model(server), folders, chunk_bytes=CHUNK)
+
+    with open(target, "rb") as f:
+        assert f.read() == MODEL
+    assert f"bytes=0-{CHUNK - 1}" not in server.requests
+    assert len(server.requests) == 1 + 3
+
+
+def test_checksum_mismatch_is_rejected(server, folders):
+    with pytest.raises(ValueError, match="sha256"):
+        download_models.download(model(server, sha256="0" * 64), folders, chunk_bytes=CHUNK)
+    assert os.listdir(folders["checkpoints"]) == []
+
+
+def test_present_models_are_skipped(server, folders):
+    os.makedirs(folders["checkpoints"])
+    with open(os.path.join(folders["checkpoints"], "model.safetensors"), "wb") as f:
+        f.write(MODEL)
+
+    assert download_models.download(model(server), folders) == "present"
+    assert server.requests == []
+
+
+def test_servers_without_ranges_are_streamed(folders):
+    server = serve(ranges=False)
+    try:
+        assert download_models.download(model(server, sha256=None), folders) == "downloaded"
+    finally:
+        server.shutdown()
+    with open(os.path.join(folders["checkpoints"], "model.safetensors"), "rb") as f:
+        assert f.read() == MODEL
+
+
+def test_failures_do_not_stop_the_other_models(server, folders):
+    models = [model(server, name="bad.safetensors", size=1), model(server)]
+
+    assert download_models.download_all(models, folders) == ["bad.safetensors"]
+    assert os.path.exists(os.path.join(folders["checkpoints"], "model.safetensors"))
+
+
+def test_unpinned_models_are_reported_or_refused(server, folders, capsys):
+    models = [model(server, sha256=None)]
+
+    assert download_models.download_all(models, folders) == []
+    assert "1 of 1 models have no sha256" in capsys.readouterr().out
+
+    os.remove(os.path.join(folders["checkpoints"], "model.safetensors"))
+    assert download_models.download_all(models, folders, require_sha256=True) == ["model.safetensors"]
+    assert "are not downloaded" in capsys.readouterr().out
+    assert os.listdir(folders["checkpoints"]) == []
+
+
+def test_manifest_folders_come_from_extra_model_paths():
+    folders = download_models.model_folders(CONFIG)
+    assert folders["checkpoints"] == "/home/user/opt/data/models/checkpoints/"
+
+    models = download_models.load_manifest(MANIFEST, folders)
+    assert len(models) == len({m["name"] for m in models})
+
+    with pytest.raises(ValueError, match="not a folder"):
+        download_models.load_manifest(MANIFEST, {"vae": "/tmp"})
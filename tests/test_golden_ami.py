@@ -0,0 +1,109 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "comfyui_aws_stack", "lambda", "golden_ami_lambda"))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+import golden_ami  # noqa: E402
+
+PIPELINE_ARN = "arn:aws:imagebuilder:us-east-1:123456789012:image-pipeline/comfyuihost-2c947a9b9c"
+IMAGE_ARN = "arn:aws:imagebuilder:us-east-1:123456789012:image/comfyuihost-2c947a9b9c/1.0.0/{}"
+
+
+class FakeImageBuilder:
+    class meta:
+        region_name = "us-east-1"
+
+    def __init__(self, images):
+        self.images = images
+
+    def get_image(self, imageBuildVersionArn):
+        return {"image": self.images[imageBuildVersionArn]}
+
+
+class FakeEc2:
+    def __init__(self, images):
+        self.images = images
+        self.deregistered = []
+        self.deleted_snapshots = []
+
+    def describe_images(self, Owners, Filters):
+        assert Owners == ["self"]
+        assert Filters == [{"Name": "tag:ComfyUIGoldenAmi", "Values": ["/ComfyUI/abc/GoldenAmi"]}]
+        return {"Images": self.images}
+
+    def deregister_image(self, ImageId):
+        self.deregistered.append(ImageId)
+
+    def delete_snapshot(self, SnapshotId):
+        self.deleted_snapshots.append(SnapshotId)
+
+
+class FakeSsm:
+    def __init__(self):
+        self.parameters = {}
+
+    def put_parameter(self, Name, Value, Type, DataType, Overwrite):
+        assert DataType == "aws:ec2:image" and Overwrite
+        self.parameters[Name] = Value
+
+
+def image(ami_id, pipeline_arn=PIPELINE_ARN):
+    return {
+        "sourcePipelineArn": pipeline_arn,
+        "outputResources": {"amis": [{"region": "us-west-2", "image": "ami-other-region"},
+                                     {"region": "us-east-1", "image": ami_id}]},
+    }
+
+
+def ami(ami_id, day):
+    return {"ImageId": ami_id, "CreationDate": f"2026-10-{day:02d}T03:00:00.000Z",
+            "BlockDeviceMappings": [{"DeviceName": "/dev/xvda", "Ebs": {"SnapshotId": f"snap-{ami_id}"}},
+                                    {"DeviceName": "/dev/sdb", "VirtualName": "ephemeral0"}]}
+
+
+def setenv(monkeypatch):
+    monkeypatch.setenv("PIPELINE_ARN", PIPELINE_ARN)
+    monkeypatch.setenv("AMI_PARAMETER_NAME", "/ComfyUI/abc/GoldenAmi")
+    monkeypatch.setenv("AMI_TAG", "ComfyUIGoldenAmi")
+    monkeypatch.setenv("KEEP_AMIS", "3")
+
+
+def test_pipeline_amis_are_published(monkeypatch):
+    setenv(monkeypatch)
+    monkeypatch.setattr(golden_ami, "ec2", FakeEc2([]))
+    ssm = FakeSsm()
+    monkeypatch.setattr(golden_ami, "ssm", ssm)
+    monkeypatch.setattr(golden_ami, "imagebuilder", FakeImageBuilder({
+        IMAGE_ARN.format(2): image("ami-0123"),
+        # The first AMI is published by the deployment
+        IMAGE_ARN.format(1): {k: v for k, v in image("ami-first").items() if k != "sourcePipelineArn"},
+        IMAGE_ARN.format(3): image("ami-other-pipeline", pipeline_arn=PIPELINE_ARN + "-other"),
+    }))
+
+    for number in (1, 3):
+        golden_ami.handler({"resources": [IMAGE_ARN.format(number)]}, None)
+    assert ssm.parameters == {}
+
+    golden_ami.handler({"resources": [IMAGE_ARN.format(2)]}, None)
+    assert ssm.parameters == {"/ComfyUI/abc/GoldenAmi": "ami-0123"}
+
+
+def test_only_the_newest_amis_are_kept(monkeypatch):
+    setenv(monkeypatch)
+    ec2 = FakeEc2([ami("ami-1", 4), ami("ami-4", 25), ami("ami-2", 11), ami("ami-5", 26), ami("ami-3", 18)])
+    monkeypatch.setattr(golden_ami, "ec2", ec2)
+    monkeypatch.setattr(golden_ami, "ssm", FakeSsm())
+    monkeypatch.setattr(golden_ami, "imagebuilder", FakeImageBuilder({IMAGE_ARN.format(5): image("ami-5")}))
+
+    golden_ami.handler({"resources": [IMAGE_ARN.format(5)]}, None)
+
+    assert ec2.deregistered == ["ami-2", "ami-1"]
+    assert ec2.deleted_snapshots == ["snap-ami-2", "snap-ami-1"]
+
+
+def test_published_ami_is_never_removed():
+    images = [ami("ami-1", 4), ami("ami-2", 11), ami("ami-3", 18)]
+
+    # Even when older than the AMIs kept
+    assert [image["ImageId"] for image in golden_ami.old_amis(images, 1, "ami-1")] == ["ami-2"]
@@ -0,0 +1,76 @@
+import datetime
+import os
+import stat
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "comfyui_aws_stack", "metrics"))
+
+import gpu_metrics  # noqa: E402
+
+# Two GPUs as printed by
+# nvidia-smi --query-gpu=index,<FIELDS> --format=csv,noheader,nounits
+FAKE_OUTPUT = """\
+0, 87, 45, 14210, 1150, 71, 1590, 5000, 68.52
+1, 0, 0, 3, 15357, 34, 300, 405, [N/A]
+"""
+
+
+@pytest.fixture
+def fake_nvidia_smi(tmp_path):
+    script = tmp_path / "nvidia-smi"
+    script.write_text(f"#!/bin/sh\ncat <<'EOF'\n{FAKE_OUTPUT}EOF\n")
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    return str(script)
+
+
+def test_sample_parses_every_gpu(fake_nvidia_smi):
+    gpus = gpu_metrics.sample(fake_nvidia_smi)
+
+    assert gpus["0"] == {
+        "GPUUtilization": 87.0,
+        "GPUMemoryUtilization": 45.0,
+        "VRAMUsed": 14210.0,
+        "VRAMFree": 1150.0,
+        "GPUTemperature": 71.0,
+        "SMClock": 1590.0,
+        "MemoryClock": 5000.0,
+        "PowerDraw": 68.52,
+    }
+    # Unsupported fields are skipped instead of failing the sample
+    assert "PowerDraw" not in gpus["1"]
+    assert gpus["1"]["VRAMFree"] == 15357.0
+
+
+def test_metric_data_is_high_resolution_per_gpu(fake_nvidia_smi):
+    timestamp = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+    dimensions = [{"Name": "InstanceId", "Value": "i-0123456789abcdef0"}]
+
+    metric_data = gpu_metrics.to_metric_data(
+        gpu_metrics.sample(fake_nvidia_smi), timestamp, dimensions)
+
+    assert len(metric_data) == 15
+    vram_used = next(datum for datum in metric_data
+                     if datum["MetricName"] == "VRAMUsed"
+                     and {"Name": "GPU", "Value": "0"} in datum["Dimensions"])
+    assert vram_used == {
+        "MetricName": "VRAMUsed",
+        "Dimensions": dimensions + [{"Name": "GPU", "Value": "0"}],
+        "Timestamp": timestamp,
+        "Value": 14210.0,
+        "Unit": "Megabytes",
+        "StorageResolution": 1,
+    }
+
+
+def test_publish_splits_large_batches():
+    calls = []
+
+    class FakeCloudWatch:
+        def put_metric_data(self, Namespace, MetricData):
+            calls.append((Namespace, len(MetricData)))
+
+    gpu_metrics.publish(FakeCloudWatch(), [{}] * 1500)
+
+    assert calls == [("ComfyUI/GPU", 1000), ("ComfyUI/GPU", 500)]
@@ -0,0 +1,77 @@
+import io
+import json
+import os
+import re
+import subprocess
+import sys
+import tarfile
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "scripts"))
+
+import image_size  # noqa: E402
+
+DOCKERFILE = os.path.join(os.path.dirname(__file__), "..", "comfyui_aws_stack", "docker", "Dockerfile")
+
+# Build tools that must stay in the build stage
+TOOLCHAIN = ["build-essential", "llvm", "cmake", "pyenv", "python-build", "-dev"]
+
+
+def add(tar, name, data):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    tar.addfile(info, io.BytesIO(data))
+
+
+def saved_image(path, layers, history):
+    with tarfile.open(path, "w") as tar:
+        for name, data in layers:
+            add(tar, name, data)
+        add(tar, "config.json", json.dumps({"history": history}).encode())
+        add(tar, "manifest.json", json.dumps(
+            [{"Config": "config.json", "Layers": [name for name, _ in layers]}]).encode())
+    return path
+
+
+def test_layers_are_matched_with_their_instructions(tmp_path):
+    path = saved_image(tmp_path / "image.tar", [
+        ("blobs/sha256/a", b"\x00" * 1024 * 1024),
+        ("blobs/sha256/b", os.urandom(64 * 1024)),
+    ], [
+        {"created_by": "ADD rootfs.tar.gz /"},
+        {"created_by": "ENV PATH=/opt/python/bin", "empty_layer": True},
+        {"created_by": "COPY /opt/python /opt/python"},
+    ])
+
+    base, python = image_size.layer_report(str(path))
+
+    assert (base["created_by"], base["size"]) == ("ADD rootfs.tar.gz /", 1024 * 1024)
+    assert base["compressed_size"] < 10 * 1024
+    assert python["created_by"] == "COPY /opt/python /opt/python"
+    assert python["compressed_size"] > 64 * 1024
+    report = image_size.format_report([base, python])
+    assert report.splitlines()[1].endswith("COPY /opt/python /opt/python")
+    assert "total (2 layers)" in report
+
+
+def test_runtime_stage_has_no_build_toolchain():
+    with open(DOCKERFILE) as f:
+        stages = re.split(r"^FROM ", f.read(), flags=re.MULTILINE)[1:]
+    assert len(stages) >= 2
+    runtime = "\n".join(line for line in stages[-1].splitlines() if not line.startswith("#"))
+
+    assert [tool for tool in TOOLCHAIN if tool in runtime] == []
+    assert "COPY --from=builder" in runtime
+
+
+@pytest.mark.skipif(not os.environ.get("COMFYUI_IMAGE"),
+                    reason="set COMFYUI_IMAGE to a built image (make docker-build)")
+def test_runtime_image_within_budget(tmp_path):
+    path = tmp_path / "image.tar"
+    subprocess.run(["docker", "save", "-o", str(path), os.environ["COMFYUI_IMAGE"]], check=True)
+
+    layers = image_size.layer_report(str(path))
+
+    assert sum(layer["compressed_size"] for layer in layers) <= image_size.BUDGET_GIB * image_size.GIB, \
+        image_size.format_report(layers)
@@ -0,0 +1,49 @@
+import pytest
+
+from comfyui_aws_stack.instance_capabilities import (
+    comfyui_settings,
+    load_instance_types,
+    task_settings,
+)
+
+
+def test_table_covers_the_default_instance_types():
+    table = load_instance_types()
+    for instance_type in ["g4dn.xlarge", "g5.xlarge", "g6.xlarge", "g6e.xlarge"]:
+        assert set(table[instance_type]) == {
+            "vcpus", "memory_mib", "gpus", "gpu_memory_mib", "instance_storage_gb"}
+
+
+def test_settings_follow_vram_and_ram():
+    # T4 16 GB, 16 GiB RAM: default VRAM mode, classic cache, swap for the
+    # models offloaded from the GPU
+    assert comfyui_settings("g4dn.xlarge") == {
+        "memory_reservation_mib": 14745,
+        "swap_mib": 8192,
+        "threads": 4,
+        "args": ["--normalvram"],
+    }
+    # L40S 48 GB, 32 GiB RAM: keep the models on the GPU
+    assert comfyui_settings("g6e.xlarge") == {
+        "memory_reservation_mib": 29491,
+        "swap_mib": 16384,
+        "threads": 4,
+        "args": ["--highvram", "--cache-lru", "10"],
+    }
+
+
+def test_multi_gpu_instances_share_ram_and_vcpus_per_gpu():
+    settings = comfyui_settings("g5.12xlarge")
+    assert settings["memory_reservation_mib"] == int(48 * 1024 * 0.9)
+    assert settings["threads"] == 12
+    assert settings["args"] == ["--normalvram", "--cache-lru", "10"]
+
+
+def test_task_fits_every_instance_type():
+    settings = task_settings(["g6e.xlarge", "g4dn.xlarge"])
+    assert settings == {"memory_reservation_mib": 14745, "max_swap_mib": 16384}
+
+
+def test_unknown_instance_type_is_rejected():
+    with pytest.raises(ValueError, match="p9.xlarge is not in instance_types.json"):
+        task_settings(["g5.xlarge", "p9.xlarge"])
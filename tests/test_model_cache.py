@@ -0,0 +1,95 @@
+import os
+import sys
+import types
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "comfyui_aws_stack", "docker", "model_cache"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "scripts"))
+
+import benchmark_model_cache  # noqa: E402
+import model_cache  # noqa: E402
+
+MIB = 1024 * 1024
+
+
+def write_model(directory, name, size_mib, fill=b"\x01"):
+    path = os.path.join(directory, name)
+    with open(path, "wb") as f:
+        f.write(fill * (size_mib * MIB))
+    return path
+
+
+def test_miss_copies_then_hits(tmp_path):
+    source = write_model(tmp_path, "sdxl.safetensors", 2)
+    cache = model_cache.ModelCache(str(tmp_path / "cache"), max_bytes=10 * MIB)
+
+    cached = cache.path(source)
+
+    assert cached.startswith(str(tmp_path / "cache"))
+    with open(cached, "rb") as f:
+        assert f.read() == b"\x01" * (2 * MIB)
+    assert cache.path(source) == cached
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_replaced_model_is_copied_again(tmp_path):
+    source = write_model(tmp_path, "sdxl.safetensors", 1)
+    cache = model_cache.ModelCache(str(tmp_path / "cache"), max_bytes=10 * MIB)
+    cached = cache.path(source)
+
+    write_model(tmp_path, "sdxl.safetensors", 2, fill=b"\x02")
+    os.utime(source, (0, os.stat(source).st_mtime + 10))
+
+    assert cache.path(source) == cached
+    assert os.path.getsize(cached) == 2 * MIB
+    assert cache.misses == 2
+
+
+def test_least_recently_used_models_are_evicted(tmp_path):
+    a, b, c = (write_model(tmp_path, name, 4) for name in ["a", "b", "c"])
+    cache = model_cache.ModelCache(str(tmp_path / "cache"), max_bytes=10 * MIB)
+    cache.path(a)
+    cache.path(b)
+    cache.path(a)
+
+    cache.path(c)
+
+    assert os.path.exists(cache.cached_path(a))
+    assert not os.path.exists(cache.cached_path(b))
+    assert cache.used_bytes == 8 * MIB
+    # Recency survives a restart through the access time
+    reloaded = model_cache.ModelCache(str(tmp_path / "cache"), max_bytes=10 * MIB)
+    assert list(reloaded.entries) == [cache.cached_path(a), cache.cached_path(c)]
+
+
+def test_models_larger_than_the_cache_are_loaded_from_the_source(tmp_path):
+    source = write_model(tmp_path, "flux.safetensors", 4)
+    cache = model_cache.ModelCache(str(tmp_path / "cache"), max_bytes=2 * MIB)
+
+    assert cache.path(source) == source
+    assert cache.used_bytes == 0
+
+
+def test_install_wraps_comfyui_model_paths(tmp_path):
+    checkpoint = write_model(tmp_path, "sdxl.safetensors", 1)
+    paths = {("checkpoints", "sdxl.safetensors"): checkpoint,
+             ("configs", "v1.yaml"): write_model(tmp_path, "v1.yaml", 1)}
+    folder_paths = types.SimpleNamespace(get_full_path=lambda folder, name: paths.get((folder, name)))
+    cache = model_cache.ModelCache(str(tmp_path / "cache"), max_bytes=10 * MIB)
+
+    model_cache.install(folder_paths, cache)
+
+    assert folder_paths.get_full_path("checkpoints", "sdxl.safetensors") == cache.cached_path(checkpoint)
+    assert folder_paths.get_full_path("configs", "v1.yaml") == paths[("configs", "v1.yaml")]
+    assert folder_paths.get_full_path("loras", "missing.safetensors") is None
+
+
+def test_benchmark_compares_source_and_cache(tmp_path):
+    source = write_model(tmp_path, "sdxl.ckpt", 2)
+    cache = model_cache.ModelCache(str(tmp_path / "cache"), max_bytes=10 * MIB)
+
+    result = benchmark_model_cache.benchmark(cache, source)
+
+    assert result["checkpoint"] == "sdxl.ckpt"
+    assert result["size_mib"] == 2
+    assert result["source_seconds"] >= 0 and result["cached_seconds"] >= 0
+    assert "sdxl.ckpt" in benchmark_model_cache.format_results([result])
@@ -0,0 +1,170 @@
+import os
+import sys
+import types
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "comfyui_aws_stack", "docker", "model_index"))
+
+import model_index  # noqa: E402
+
+MIB = 1024 * 1024
+
+
+def write_model(directory, name, size_mib, fill=b"\x01"):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, name)
+    with open(path, "wb") as f:
+        f.write(fill * (size_mib * MIB))
+    return path
+
+
+def comfyui_recursive_search(directory, excluded_dir_names=None):
+    """folder_paths.recursive_search of ComfyUI."""
+    if not os.path.isdir(directory):
+        return [], {}
+    excluded_dir_names = excluded_dir_names or []
+    result, dirs = [], {directory: os.path.getmtime(directory)}
+    for dirpath, subdirs, filenames in os.walk(directory, followlinks=True, topdown=True):
+        subdirs[:] = [d for d in subdirs if d not in excluded_dir_names]
+        for file_name in filenames:
+            result.append(os.path.relpath(os.path.join(dirpath, file_name), directory))
+        for d in subdirs:
+            path = os.path.join(dirpath, d)
+            dirs[path] = os.path.getmtime(path)
+    return result, dirs
+
+
+def test_unchanged_files_are_not_hashed_again(tmp_path):
+    write_model(tmp_path / "checkpoints", "sdxl.safetensors", 1)
+    write_model(tmp_path / "loras", "detail.safetensors", 1, fill=b"\x02")
+    index = model_index.ModelIndex(str(tmp_path / "index.json"))
+    index.scan([str(tmp_path / "checkpoints"), str(tmp_path / "loras")])
+    index.save()
+    assert index.hashed == 2
+
+    path = write_model(tmp_path / "loras", "detail.safetensors", 2, fill=b"\x03")
+    os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 10 ** 9))
+    index = model_index.ModelIndex(str(tmp_path / "index.json"))
+    index.scan([str(tmp_path / "checkpoints"), str(tmp_path / "loras")])
+
+    assert index.hashed == 1
+    assert index.files[path]["size"] == 2 * MIB
+
+
+def test_removed_and_partial_files_are_not_indexed(tmp_path):
+    path = write_model(tmp_path / "checkpoints", "sdxl.safetensors", 1)
+    write_model(tmp_path / "checkpoints", "flux.safetensors.download", 1)
+    index = model_index.ModelIndex(str(tmp_path / "index.json"))
+    index.scan([str(tmp_path / "checkpoints")])
+    assert list(index.files) == [path]
+
+    os.remove(path)
+    index.scan([str(tmp_path / "checkpoints")])
+    assert index.files == {}
+
+
+def test_copies_are_linked_to_the_first_file(tmp_path):
+    source = write_model(tmp_path / "checkpoints", "sdxl_vae.safetensors", 2)
+    copy = write_model(tmp_path / "vae", "sdxl_vae.safetensors", 2)
+    other = write_model(tmp_path / "vae", "other.safetensors", 2, fill=b"\x02")
+    index = model_index.ModelIndex(str(tmp_path / "index.json"))
+    index.scan([str(tmp_path / "checkpoints"), str(tmp_path / "vae")])
+
+    assert index.deduplicate() == (1, 2 * MIB)
+
+    with open(copy, "rb") as f:
+        assert f.read() == b"\x01" * (2 * MIB)
+    assert os.stat(other).st_nlink == 1
+    assert not os.path.exists(copy + ".dedup")
+    # Linked files are not hashed or linked again
+    index.scan([str(tmp_path / "checkpoints"), str(tmp_path / "vae")])
+    assert index.hashed == 3
+    assert index.deduplicate() == (0, 0)
+    if os.stat(copy).st_ino == os.stat(source).st_ino:
+        assert os.stat(source).st_nlink == 2
+
+
+def test_hardlink_without_reflink_support(tmp_path, monkeypatch):
+    def no_reflink(source, target):
+        open(target, "wb").close()
+        raise OSError(95, "Operation not supported")
+    monkeypatch.setattr(model_index, "reflink", no_reflink)
+    source = write_model(tmp_path / "checkpoints", "sdxl_vae.safetensors", 1)
+    copy = write_model(tmp_path / "vae", "sdxl_vae.safetensors", 1)
+
+    assert model_index.link(source, copy) == "hardlink"
+    assert os.stat(copy).st_ino == os.stat(source).st_ino
+    assert sorted(os.listdir(tmp_path / "vae")) == ["sdxl_vae.safetensors"]
+    # Not writable in place, replaceable
+    assert os.stat(copy).st_mode & 0o222 == 0
+    os.replace(write_model(tmp_path, "new.safetensors", 1, fill=b"\x02"), copy)
+    with open(source, "rb") as f:
+        assert f.read(1) == b"\x01"
+
+
+def test_small_and_changed_files_are_not_linked(tmp_path):
+    write_model(tmp_path / "embeddings", "a.pt", 0)
+    write_model(tmp_path / "checkpoints", "a.safetensors", 1)
+    changed = write_model(tmp_path / "vae", "a.safetensors", 1)
+    for name in ["a.yaml", "b.yaml"]:
+        with open(tmp_path / "embeddings" / name, "w") as f:
+            f.write("model: {}")
+    index = model_index.ModelIndex(str(tmp_path / "index.json"))
+    index.scan([str(tmp_path / "embeddings"), str(tmp_path / "checkpoints"), str(tmp_path / "vae")])
+    os.utime(changed, ns=(0, os.stat(changed).st_mtime_ns + 10 ** 9))
+
+    assert index.deduplicate() == (0, 0)
+
+
+def test_listings_match_comfyui(tmp_path):
+    write_model(tmp_path / "loras", "a.safetensors", 0)
+    write_model(tmp_path / "loras" / "sdxl", "b.safetensors", 0)
+    write_model(tmp_path / "loras" / ".git", "HEAD", 0)
+    index = model_index.ModelIndex(str(tmp_path / "index.json"))
+    index.scan([str(tmp_path / "loras")])
+    folder_paths = types.SimpleNamespace()
+    model_index.install(folder_paths, index)
+
+    for excluded in [None, [".git"]]:
+        files, dirs = folder_paths.recursive_search(str(tmp_path / "loras"), excluded_dir_names=excluded)
+        expected_files, expected_dirs = comfyui_recursive_search(str(tmp_path / "loras"), excluded)
+        assert sorted(files) == sorted(expected_files)
+        assert dirs == expected_dirs
+    assert folder_paths.recursive_search(str(tmp_path / "missing")) == ([], {})
+
+
+def test_only_changed_directories_are_listed(tmp_path, monkeypatch):
+    write_model(tmp_path / "loras", "a.safetensors", 0)
+    write_model(tmp_path / "loras" / "sdxl", "b.safetensors", 0)
+    index = model_index.ModelIndex(str(tmp_path / "index.json"))
+    index.scan([str(tmp_path / "loras")])
+    index.save()
+    folder_paths = types.SimpleNamespace()
+    model_index.install(folder_paths, model_index.ModelIndex(str(tmp_path / "index.json")))
+
+    listed = []
+    list_dir = model_index.list_dir
+    monkeypatch.setattr(model_index, "list_dir", lambda path, mtime: listed.append(path) or list_dir(path, mtime))
+
+    files, _ = folder_paths.recursive_search(str(tmp_path / "loras"))
+    assert sorted(files) == ["a.safetensors", os.path.join("sdxl", "b.safetensors")]
+    assert listed == []
+
+    write_model(tmp_path / "loras" / "sdxl", "c.safetensors", 0)
+    os.utime(tmp_path / "loras" / "sdxl", (0, os.path.getmtime(tmp_path / "loras" / "sdxl") + 1))
+    files, _ = folder_paths.recursive_search(str(tmp_path / "loras"))
+    assert os.path.join("sdxl", "c.safetensors") in files
+    assert listed == [str(tmp_path / "loras" / "sdxl")]
+
+
+def test_launcher_runs_the_next_launcher(tmp_path, monkeypatch):
+    main_py = tmp_path / "main.py"
+    main_py.write_text(f"import sys\nopen({str(tmp_path / 'argv')!r}, 'w').write(' '.join(sys.argv))\n")
+    launcher = tmp_path / "model_cache.py"
+    launcher.write_text("import runpy, sys\nsys.argv = sys.argv[1:]\nrunpy.run_path(sys.argv[0], run_name='__main__')\n")
+    monkeypatch.delenv("MODEL_INDEX_PATH", raising=False)
+    monkeypatch.setattr(sys, "argv", ["model_index.py", str(launcher), str(main_py), "--port", "8181"])
+    monkeypatch.setattr(sys, "path", list(sys.path))
+
+    model_index.main()
+
+    assert (tmp_path / "argv").read_text() == f"{main_py} --port 8181"
@@ -0,0 +1,66 @@
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "comfyui_aws_stack", "lambda", "admin_lambda"))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+import model_loads  # noqa: E402
+
+HOUR_MS = 3600 * 1000
+
+
+class FakeLogs:
+    """FilterLogEvents over timestamps, two events a page, with an empty
+    page and a nextToken before the last page of every window."""
+
+    def __init__(self, timestamps):
+        self.timestamps = sorted(timestamps)
+        self.calls = []
+
+    def filter_log_events(self, logGroupName, startTime, endTime, filterPattern, nextToken=None):
+        self.calls.append((startTime, endTime, nextToken))
+        matching = [t for t in self.timestamps if startTime <= t <= endTime]
+        page = int(nextToken or 0)
+        if page % 2:
+            return {"events": [], "nextToken": str(page + 1)}
+        offset = page // 2 * 2
+        response = {"events": [{"timestamp": t, "message": json.dumps({"event": "model_load", "time": t})}
+                               for t in matching[offset:offset + 2]]}
+        if offset + 2 < len(matching):
+            response["nextToken"] = str(page + 1)
+        return response
+
+
+def install(monkeypatch, timestamps, now):
+    fake = FakeLogs(timestamps)
+    monkeypatch.setattr(model_loads, "client", lambda name: fake)
+    monkeypatch.setattr(model_loads.time, "time", lambda: now / 1000)
+    return fake
+
+
+def test_newest_events_are_kept(monkeypatch):
+    now = 100 * HOUR_MS
+    # Five events an hour over the last three hours
+    timestamps = [now - hour * HOUR_MS - minute * 60 * 1000 for hour in range(3) for minute in range(1, 6)]
+    install(monkeypatch, timestamps, now)
+
+    events = model_loads.recent_events("/comfyui", max_events=7)
+
+    assert [event["time"] for event in events] == sorted(timestamps)[-7:]
+
+
+def test_calls_are_capped(monkeypatch):
+    now = 100 * HOUR_MS
+    fake = install(monkeypatch, [], now)
+
+    assert model_loads.recent_events("/comfyui") == []
+    # Windows of 1, 2, 4, 8 and the remaining 9 hours
+    assert [(end + 1 - start) // HOUR_MS for start, end, _ in fake.calls] == [1, 2, 4, 8, 9]
+
+    fake = install(monkeypatch, [now - minute * 1000 for minute in range(1, 100)], now)
+
+    events = model_loads.recent_events("/comfyui", max_calls=5)
+
+    assert len(fake.calls) == 5
+    assert len(events) == 6
@@ -0,0 +1,115 @@
+import importlib
+import json
+import os
+import sys
+import types
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "comfyui_aws_stack", "docker", "model_profiler"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "comfyui_aws_stack", "lambda", "admin_lambda"))
+
+import model_loads  # noqa: E402
+import model_profiler  # noqa: E402
+
+
+def events(capsys):
+    return [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+
+def test_model_load_event(tmp_path, capsys):
+    path = tmp_path / "checkpoints" / "sdxl.safetensors"
+    path.parent.mkdir()
+    path.write_bytes(b"\x01" * 4096)
+
+    def load_torch_file(ckpt, safe_load=False):
+        with open(ckpt, "rb") as f:
+            return {"weight": f.read(), "safe_load": safe_load}
+
+    result = model_profiler.profile_load(load_torch_file, path, safe_load=True)
+
+    assert result["safe_load"] is True
+    [event] = events(capsys)
+    assert event["event"] == "model_load"
+    assert (event["file"], event["folder"], event["source"], event["bytes"]) == (
+        "sdxl.safetensors", "checkpoints", "ebs", 4096)
+    assert event["read_seconds"] + event["deserialize_seconds"] <= event["load_seconds"] + 0.002
+    if model_profiler.storage_read_bytes() is not None:
+        # Just written, served from the page cache
+        assert event["page_cache_hit"] == 1
+
+
+def test_model_transfer_event(capsys, monkeypatch):
+    monkeypatch.setitem(sys.modules, "torch", types.SimpleNamespace(
+        cuda=types.SimpleNamespace(is_available=lambda: False)))
+
+    class Patcher:
+        def __init__(self, size, name=None):
+            self.size = size
+            self.model = type(name or "SDXL", (), {})()
+
+        def model_size(self):
+            return self.size
+
+    resident, loading = Patcher(1024), Patcher(3 * 1024 * 1024)
+    model_profiler.tag([loading], "/models/checkpoints/flux.safetensors")
+    model_management = types.SimpleNamespace(
+        current_loaded_models=[types.SimpleNamespace(model=resident)])
+    calls = []
+
+    model_profiler.profile_transfer(model_management, lambda models, **kwargs: calls.append(kwargs),
+                                    [resident, loading], minimum_memory_required=1)
+
+    assert calls == [{"minimum_memory_required": 1}]
+    [event] = events(capsys)
+    assert event["models"] == ["SDXL", "flux.safetensors"]
+    assert (event["loaded"], event["resident"], event["vram_hit"], event["bytes"]) == (1, 1, 0, 3 * 1024 * 1024)
+
+
+def test_modules_are_patched_on_import(tmp_path, monkeypatch):
+    package = tmp_path / "fakecomfy"
+    package.mkdir()
+    (package / "__init__.py").write_text("")
+    (package / "utils.py").write_text("def load_torch_file(ckpt):\n    return 'loaded'\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    def patch(module):
+        load = module.load_torch_file
+        module.load_torch_file = lambda ckpt: load(ckpt) + " and profiled"
+
+    finder = model_profiler.install({"fakecomfy.utils": patch})
+    try:
+        utils = importlib.import_module("fakecomfy.utils")
+    finally:
+        sys.meta_path.remove(finder)
+        sys.modules.pop("fakecomfy.utils", None)
+        sys.modules.pop("fakecomfy", None)
+
+    assert utils.load_torch_file("x") == "loaded and profiled"
+    assert finder.patches == {}
+
+
+def test_admin_summary():
+    log = [
+        {"event": "model_load", "file": "sdxl.safetensors", "folder": "checkpoints", "source": "ebs",
+         "page_cache_hit": 0, "load_seconds": 40, "read_seconds": 38, "deserialize_seconds": 2,
+         "read_mib_per_second": 160},
+        {"event": "model_load", "file": "sdxl.safetensors", "folder": "checkpoints", "source": "ebs",
+         "page_cache_hit": 1, "load_seconds": 4, "read_seconds": 0, "deserialize_seconds": 4,
+         "read_mib_per_second": 1600},
+        {"event": "model_load", "file": "<vae>.safetensors", "folder": "vae", "source": "nvme-cache",
+         "page_cache_hit": 0, "load_seconds": 1, "read_seconds": 0.5, "deserialize_seconds": 0.5,
+         "read_mib_per_second": 300},
+        {"event": "model_transfer", "loaded": 1, "vram_hit": 0, "transfer_seconds": 2,
+         "transfer_mib_per_second": 2500},
+        {"event": "model_transfer", "loaded": 0, "vram_hit": 1, "transfer_seconds": 0},
+    ]
+
+    summary = model_loads.summarize(log)
+
+    sdxl = summary["loads"][0]
+    assert (sdxl["file"], sdxl["loads"], sdxl["page_cache_hits"]) == ("sdxl.safetensors", 2, 1)
+    assert (sdxl["load_seconds"], sdxl["read_mib_per_second"]) == (22, 160)
+    assert summary["transfers"] == {"count": 2, "vram_hits": 1, "transfer_seconds": 2,
+                                    "transfer_mib_per_second": 2500}
+    html = model_loads.summary_html(summary)
+    assert "&lt;vae&gt;.safetensors" in html
+    assert "No model loads" in model_loads.summary_html(model_loads.summarize([]))
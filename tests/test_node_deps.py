@@ -0,0 +1,186 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "comfyui_aws_stack", "docker", "node_deps"))
+
+import node_deps  # noqa: E402
+
+CONSTRAINTS = ["numpy==1.26.4", "torch==2.7.0+cu126"]
+
+
+def write_node(custom_nodes_dir, node, requirements):
+    os.makedirs(os.path.join(custom_nodes_dir, node), exist_ok=True)
+    if requirements is not None:
+        with open(os.path.join(custom_nodes_dir, node, "requirements.txt"), "w") as f:
+            f.write(requirements)
+
+
+def test_requirements_of_enabled_nodes(tmp_path):
+    custom_nodes = str(tmp_path)
+    write_node(custom_nodes, "ComfyUI-Impact-Pack", "# segmentation\nsegment-anything\n\nscikit-image>=0.20  # filters\n")
+    write_node(custom_nodes, "comfyui-kjnodes", "-r extra.txt\n--extra-index-url https://example.com\ncolor-matcher\n")
+    write_node(custom_nodes, "ComfyUI-Manager.disabled", "GitPython\n")
+    write_node(custom_nodes, "no-requirements", None)
+    write_node(custom_nodes, "only-comments", "# nothing\n")
+
+    assert node_deps.node_requirements(custom_nodes) == {
+        "ComfyUI-Impact-Pack": ["segment-anything", "scikit-image>=0.20"],
+        "comfyui-kjnodes": ["color-matcher"],
+    }
+    assert node_deps.node_requirements(str(tmp_path / "missing")) == {}
+
+
+def test_lock_hash_covers_requirements_and_image_packages():
+    requirements = {"a": ["opencv-python"], "b": ["color-matcher"]}
+    digest = node_deps.lock_hash(requirements, CONSTRAINTS)
+
+    assert node_deps.lock_hash(dict(reversed(list(requirements.items()))), CONSTRAINTS) == digest
+    assert node_deps.lock_hash({**requirements, "c": ["rembg"]}, CONSTRAINTS) != digest
+    assert node_deps.lock_hash(requirements, ["numpy==2.1.0", "torch==2.7.0+cu126"]) != digest
+
+
+def test_packages_from_report():
+    report = {"install": [
+        {"metadata": {"name": "color-matcher", "version": "0.5.0"}, "is_direct": False,
+         "download_info": {"url": "https://files.pythonhosted.org/color_matcher-0.5.0-py3-none-any.whl"}},
+        {"metadata": {"name": "sam2", "version": "1.0"}, "is_direct": True,
+         "download_info": {"url": "https://github.com/facebookresearch/sam2",
+                           "vcs_info": {"vcs": "git", "commit_id": "2b90b9f"}}},
+    ]}
+
+    assert node_deps.packages_from_report(report) == [
+        {"name": "color-matcher", "version": "0.5.0", "requirement": "color-matcher==0.5.0"},
+        {"name": "sam2", "version": "1.0", "requirement": "sam2 @ git+https://github.com/facebookresearch/sam2@2b90b9f"},
+    ]
+
+
+def test_only_missing_wheels_are_downloaded(tmp_path):
+    deps = node_deps.NodeDeps(str(tmp_path))
+    os.makedirs(deps.wheelhouse)
+    open(os.path.join(deps.wheelhouse, "color_matcher-0.5.0-py3-none-any.whl"), "w").close()
+    packages = [{"name": "Color.Matcher", "version": "0.5.0"}, {"name": "color-matcher", "version": "0.6.0"},
+                {"name": "rembg", "version": "2.0.59"}]
+
+    assert deps.missing_wheels(packages) == packages[1:]
+
+
+def test_unchanged_lock_is_not_resolved_again(tmp_path, monkeypatch):
+    requirements = {"a": ["color-matcher"]}
+    deps = node_deps.NodeDeps(str(tmp_path))
+    env_dir = os.path.join(deps.envs_dir, "0123456789ab")
+    os.makedirs(env_dir)
+    deps.save_lock({"version": node_deps.LOCK_VERSION, "hash": node_deps.lock_hash(requirements, CONSTRAINTS),
+                    "env": "0123456789ab", "packages": [{"name": "color-matcher", "version": "0.5.0"}]})
+    updates = []
+    monkeypatch.setattr(deps, "update", lambda *args: updates.append(args) or env_dir)
+
+    assert deps.sync(requirements, CONSTRAINTS) == env_dir
+    assert updates == []
+
+    deps.sync({**requirements, "b": ["rembg"]}, CONSTRAINTS)
+    assert len(updates) == 1
+
+
+def test_failed_update_keeps_the_previous_environment(tmp_path, monkeypatch):
+    deps = node_deps.NodeDeps(str(tmp_path))
+    env_dir = os.path.join(deps.envs_dir, "0123456789ab")
+    os.makedirs(env_dir)
+    deps.save_lock({"version": node_deps.LOCK_VERSION, "hash": "old", "env": "0123456789ab", "packages": []})
+
+    def update(*args):
+        raise node_deps.DependencyError("No matching distribution found for rembg")
+
+    monkeypatch.setattr(deps, "update", update)
+
+    assert deps.sync({"a": ["rembg"]}, CONSTRAINTS) == env_dir
+    assert deps.load_lock()["hash"] == "old"
+
+
+def test_wheels_are_downloaded_one_at_a_time(tmp_path, monkeypatch):
+    deps = node_deps.NodeDeps(str(tmp_path))
+    os.makedirs(deps.wheelhouse)
+    calls = []
+
+    def pip(env_dir, *args):
+        if "rembg==2.0.59" in args:
+            raise node_deps.DependencyError("Failed building wheel")
+        calls.append(args)
+
+    monkeypatch.setattr(deps, "pip", pip)
+    packages = [{"name": name, "version": version, "requirement": f"{name}=={version}"}
+                for name, version in [("color-matcher", "0.5.0"), ("rembg", "2.0.59")]]
+
+    with pytest.raises(node_deps.DependencyError):
+        deps.fill_wheelhouse("env", packages)
+    assert [args[-1] for args in calls] == ["color-matcher==0.5.0"]
+
+
+def test_previous_environment_is_kept_for_the_running_comfyui(tmp_path, monkeypatch):
+    deps = node_deps.NodeDeps(str(tmp_path))
+    for env in ("older", "previous"):
+        os.makedirs(os.path.join(deps.envs_dir, env))
+    deps.save_lock({"version": node_deps.LOCK_VERSION, "hash": "old", "env": "previous", "packages": []})
+    new_env = os.path.join(deps.envs_dir, "new")
+    monkeypatch.setattr(deps, "update", lambda *args: os.makedirs(new_env) or new_env)
+
+    assert deps.current(node_deps.lock_hash({}, CONSTRAINTS)) == (os.path.join(deps.envs_dir, "previous"), False)
+    assert deps.sync({}, CONSTRAINTS) == new_env
+    assert sorted(os.listdir(deps.envs_dir)) == ["new", "previous"]
+
+
+def test_environment_in_use_is_kept_by_a_second_update(tmp_path, monkeypatch):
+    deps = node_deps.NodeDeps(str(tmp_path))
+    for env in ("older", "loaded", "previous"):
+        os.makedirs(os.path.join(deps.envs_dir, env))
+    deps.save_lock({"version": node_deps.LOCK_VERSION, "hash": "old", "env": "previous", "packages": []})
+    new_env = os.path.join(deps.envs_dir, "new")
+    monkeypatch.setattr(deps, "update", lambda *args: os.makedirs(new_env) or new_env)
+
+    assert deps.sync({}, CONSTRAINTS, "loaded") == new_env
+    assert sorted(os.listdir(deps.envs_dir)) == ["loaded", "new", "previous"]
+
+
+def test_conflicting_nodes_are_left_out(tmp_path, monkeypatch):
+    deps = node_deps.NodeDeps(str(tmp_path))
+    requirements = {"a": ["opencv-python"], "b": ["numpy<2"], "c": ["numpy>=2"], "d": ["rembg"]}
+
+    def prepare(env_dir, lines, constraints_path):
+        if "numpy<2" in lines and "numpy>=2" in lines:
+            raise node_deps.DependencyError("ResolutionImpossible")
+        return [{"name": line, "version": "1.0"} for line in lines]
+
+    monkeypatch.setattr(deps, "prepare", prepare)
+
+    packages, nodes, failed = deps.resolve_nodes("env", requirements, "constraints.txt")
+
+    assert nodes == ["a", "b", "d"]
+    assert failed == ["c"]
+    assert [package["name"] for package in packages] == ["opencv-python", "numpy<2", "rembg"]
+
+
+def test_update_without_requirements_creates_an_empty_environment(tmp_path):
+    deps = node_deps.NodeDeps(str(tmp_path))
+
+    env_dir = deps.sync({}, CONSTRAINTS)
+
+    assert os.path.isdir(env_dir)
+    with open(deps.lock_path) as f:
+        lock = json.load(f)
+    assert lock["env"] == os.path.basename(env_dir)
+    assert lock["packages"] == [] and lock["nodes"] == []
+    assert deps.sync({}, CONSTRAINTS) == env_dir
+
+
+def test_activate_adds_the_environment_after_the_image_packages(tmp_path, monkeypatch):
+    env_dir = str(tmp_path / "env")
+    os.makedirs(node_deps.site_packages(env_dir))
+    monkeypatch.setattr(sys, "path", list(sys.path))
+    monkeypatch.setenv("PYTHONPATH", "/opt/extra")
+
+    node_deps.activate(env_dir)
+
+    assert sys.path[-1] == node_deps.site_packages(env_dir)
+    assert os.environ["PYTHONPATH"] == os.pathsep.join(["/opt/extra", node_deps.site_packages(env_dir)])
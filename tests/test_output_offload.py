@@ -0,0 +1,125 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "comfyui_aws_stack", "output_offload"))
+
+import output_offload  # noqa: E402
+
+HOUR = 3600
+NOW = 1_000_000_000
+
+
+class FakeS3:
+    """Records the uploads, optionally failing them."""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.objects = {}
+
+    def upload_file(self, path, bucket, key, ExtraArgs=None, Config=None):
+        if self.fail:
+            raise OSError("upload failed")
+        with open(path, "rb") as f:
+            self.objects[key] = (f.read(), ExtraArgs["ContentType"])
+
+    def put_object(self, Bucket, Key, Body, ContentType):
+        self.objects[Key] = (Body, ContentType)
+
+
+def write_output(output_dir, name, age_hours, size=10):
+    path = os.path.join(output_dir, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(b"\x01" * size)
+    mtime = NOW - age_hours * HOUR
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def offloader(tmp_path, s3=None, retention_hours=168, local_max_bytes=0):
+    return output_offload.Offloader(s3 or FakeS3(), "outputs-bucket", str(tmp_path),
+                                    retention_hours=retention_hours, local_max_bytes=local_max_bytes)
+
+
+def test_new_outputs_are_uploaded_once(tmp_path):
+    write_output(tmp_path, "ComfyUI_00001_.txt", 1)
+    write_output(tmp_path, "videos/clip.bin", 1)
+    s3 = FakeS3()
+
+    assert sorted(offloader(tmp_path, s3).offload(NOW)[0]) == ["ComfyUI_00001_.txt", "videos/clip.bin"]
+    assert s3.objects["outputs/ComfyUI_00001_.txt"] == (b"\x01" * 10, "text/plain")
+    assert "outputs/videos/clip.bin" in s3.objects
+
+    # A restarted sidecar does not upload them again
+    assert offloader(tmp_path, s3).offload(NOW) == ([], [])
+
+
+def test_files_being_written_are_left_for_the_next_scan(tmp_path):
+    path = write_output(tmp_path, "ComfyUI_00001_.txt", 0)
+    os.utime(path, (NOW - 1, NOW - 1))
+
+    assert offloader(tmp_path).offload(NOW) == ([], [])
+    assert offloader(tmp_path).offload(NOW + 10)[0] == ["ComfyUI_00001_.txt"]
+
+
+def test_expired_outputs_are_deleted_after_upload(tmp_path):
+    write_output(tmp_path, "old.txt", 200)
+    write_output(tmp_path, "new.txt", 1)
+
+    uploaded, deleted = offloader(tmp_path).offload(NOW)
+
+    assert sorted(uploaded) == ["new.txt", "old.txt"]
+    assert deleted == ["old.txt"]
+    assert not os.path.exists(tmp_path / "old.txt")
+    assert os.path.exists(tmp_path / "new.txt")
+
+
+def test_outputs_are_never_deleted_before_upload(tmp_path):
+    write_output(tmp_path, "old.txt", 200)
+
+    assert offloader(tmp_path, FakeS3(fail=True)).offload(NOW) == ([], [])
+    assert os.path.exists(tmp_path / "old.txt")
+
+
+def test_size_budget_deletes_oldest_first(tmp_path):
+    for age, name in [(3, "a.txt"), (2, "b.txt"), (1, "c.txt")]:
+        write_output(tmp_path, name, age, size=100)
+
+    _, deleted = offloader(tmp_path, local_max_bytes=150).offload(NOW)
+
+    assert deleted == ["a.txt", "b.txt"]
+    assert sorted(os.listdir(tmp_path)) == [".offload.json", "c.txt"]
+
+
+def test_replaced_outputs_are_uploaded_again(tmp_path):
+    path = write_output(tmp_path, "ComfyUI_00001_.txt", 2)
+    s3 = FakeS3()
+    offloader(tmp_path, s3).offload(NOW)
+
+    with open(path, "wb") as f:
+        f.write(b"\x02" * 5)
+    os.utime(path, (NOW - HOUR, NOW - HOUR))
+
+    assert offloader(tmp_path, s3).offload(NOW)[0] == ["ComfyUI_00001_.txt"]
+    assert s3.objects["outputs/ComfyUI_00001_.txt"][0] == b"\x02" * 5
+
+
+def test_images_get_a_preview_and_a_thumbnail(tmp_path):
+    Image = pytest.importorskip("PIL.Image")
+    path = tmp_path / "ComfyUI_00001_.png"
+    Image.new("RGB", (2048, 1024), "red").save(path)
+    os.utime(path, (NOW - HOUR, NOW - HOUR))
+    s3 = FakeS3()
+
+    offloader(tmp_path, s3).offload(NOW)
+
+    assert s3.objects["outputs/ComfyUI_00001_.png"][1] == "image/png"
+    for key, size in [("previews/ComfyUI_00001_.png.webp", 1024), ("thumbnails/ComfyUI_00001_.png.webp", 256)]:
+        body, content_type = s3.objects[key]
+        assert content_type == "image/webp"
+        preview = tmp_path / "preview.webp"
+        preview.write_bytes(body)
+        with Image.open(preview) as image:
+            assert image.size == (size, size // 2)
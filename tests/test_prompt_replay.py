@@ -0,0 +1,77 @@
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "comfyui_aws_stack", "lambda", "admin_lambda"))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+import prompt_buffer  # noqa: E402
+import prompt_replay  # noqa: E402
+import scaleup_listener  # noqa: E402
+
+TASK_EVENT = {"detail": {"attachments": [{"details": [{"name": "privateIPv4Address", "value": "10.0.0.1"}]}]}}
+
+
+def iso(seconds_ago):
+    return (datetime.now(timezone.utc) - timedelta(seconds=seconds_ago)).isoformat().replace("+00:00", "Z")
+
+
+def test_submit_gives_up_at_the_deadline():
+    start = time.monotonic()
+
+    # Nothing listens on port 1
+    assert not prompt_buffer._submit("http://127.0.0.1:1", "{}", time.monotonic() + 0.5)
+    assert time.monotonic() - start < 5
+
+
+def test_replay_budget_is_within_the_function_timeout():
+    assert prompt_buffer.REPLAY_SECONDS + prompt_buffer.SUBMIT_TIMEOUT_SECONDS < 5 * 60
+
+
+def test_listener_rule_is_switched_when_the_replay_fails(monkeypatch):
+    routed = []
+
+    def replay(comfyui_url):
+        raise RuntimeError("Task timed out")
+
+    monkeypatch.setattr(prompt_replay, "replay", replay)
+    monkeypatch.setattr(prompt_replay, "queued_prompts", lambda: 2)
+    monkeypatch.setattr(prompt_replay, "get_cluster_state", lambda: {"desired_capacity": 1})
+    monkeypatch.setattr(prompt_replay, "route_to_comfyui", lambda: routed.append(True))
+    monkeypatch.setattr(prompt_replay, "update_cluster_state", lambda **fields: None)
+    monkeypatch.setattr(prompt_replay, "record_milestone", lambda milestone: None)
+
+    with pytest.raises(RuntimeError):
+        prompt_replay.handler(TASK_EVENT, None)
+    assert routed == [True]
+
+
+def test_listener_waits_for_the_replay_until_the_deadline(monkeypatch):
+    monkeypatch.setattr(scaleup_listener, "queued_prompts", lambda: 3)
+
+    assert scaleup_listener._waiting_for_replay({"startedAt": iso(60)})
+    assert scaleup_listener._waiting_for_replay({})
+    assert not scaleup_listener._waiting_for_replay({"startedAt": iso(scaleup_listener.REPLAY_WAIT_SECONDS + 60)})
+
+    monkeypatch.setattr(scaleup_listener, "queued_prompts", lambda: 0)
+    assert not scaleup_listener._waiting_for_replay({"startedAt": iso(60)})
+
+
+def test_resubmitted_prompt_is_not_deduplicated(monkeypatch):
+    sent = []
+
+    class FakeSqs:
+        def send_message(self, **kwargs):
+            sent.append(kwargs)
+
+    monkeypatch.setenv("PROMPT_QUEUE_URL", "https://sqs.us-east-1.amazonaws.com/123456789012/prompts.fifo")
+    monkeypatch.setattr(prompt_buffer, "client", lambda name: FakeSqs())
+
+    # Buffered, replayed, then moved back by the Spot drain
+    assert prompt_buffer.enqueue({"prompt": {}, "prompt_id": "p1"}) == "p1"
+    assert prompt_buffer.enqueue({"prompt": {}, "prompt_id": "p1"}) == "p1"
+
+    assert sent[0]["MessageDeduplicationId"] != sent[1]["MessageDeduplicationId"]
@@ -0,0 +1,88 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "comfyui_aws_stack", "lambda", "soci_index_lambda"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "scripts"))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+import benchmark_image_pull  # noqa: E402
+import soci_index  # noqa: E402
+
+IMAGE = "123456789012.dkr.ecr.us-east-1.amazonaws.com/cdk-assets:0123abcd"
+
+
+class FakeCodeBuild:
+    def __init__(self, status="IN_PROGRESS"):
+        self.status = status
+        self.started = []
+
+    def start_build(self, projectName, environmentVariablesOverride):
+        self.started.append((projectName, {variable["name"]: variable["value"]
+                                           for variable in environmentVariablesOverride}))
+        return {"build": {"id": "SociIndexProject:1"}}
+
+    def batch_get_builds(self, ids):
+        return {"builds": [{"id": ids[0], "buildStatus": self.status,
+                            "logs": {"deepLink": "https://console.aws.amazon.com/build-log"}}]}
+
+
+def event(request_type, **kwargs):
+    return {
+        "RequestType": request_type,
+        "ResourceProperties": {"ProjectName": "SociIndexProject", "SourceImage": IMAGE,
+                               "TargetImage": IMAGE + "-soci"},
+        **kwargs,
+    }
+
+
+def test_build_is_started_for_the_image_asset(monkeypatch):
+    codebuild = FakeCodeBuild()
+    monkeypatch.setattr(soci_index, "codebuild", codebuild)
+
+    response = soci_index.on_event(event("Create"), None)
+
+    assert codebuild.started == [("SociIndexProject", {"SOURCE_IMAGE": IMAGE, "TARGET_IMAGE": IMAGE + "-soci"})]
+    assert response["PhysicalResourceId"] == IMAGE + "-soci"
+    assert response["Data"]["BuildId"] == "SociIndexProject:1"
+
+
+def test_build_is_polled_until_it_succeeds(monkeypatch):
+    codebuild = FakeCodeBuild()
+    monkeypatch.setattr(soci_index, "codebuild", codebuild)
+    started = event("Update", **soci_index.on_event(event("Update"), None))
+
+    assert soci_index.is_complete(started, None) == {"IsComplete": False}
+    codebuild.status = "SUCCEEDED"
+    assert soci_index.is_complete(started, None) == {"IsComplete": True}
+    codebuild.status = "FAILED"
+    with pytest.raises(RuntimeError, match="build-log"):
+        soci_index.is_complete(started, None)
+
+
+def test_delete_keeps_the_image(monkeypatch):
+    codebuild = FakeCodeBuild()
+    monkeypatch.setattr(soci_index, "codebuild", codebuild)
+    deleted = event("Delete", PhysicalResourceId=IMAGE + "-soci")
+
+    assert soci_index.on_event(deleted, None) == {"PhysicalResourceId": IMAGE + "-soci"}
+    assert soci_index.is_complete(deleted, None) == {"IsComplete": True}
+    assert codebuild.started == []
+
+
+def test_startup_comparison():
+    results = [
+        {"mode": "full", "pull_seconds": 180, "start_seconds": 20, "ready_seconds": 200},
+        {"mode": "soci", "pull_seconds": 5, "start_seconds": 45, "ready_seconds": 50},
+        {"mode": "full", "pull_seconds": 170, "start_seconds": 20, "ready_seconds": 190},
+        {"mode": "soci", "pull_seconds": 5, "start_seconds": 55, "ready_seconds": 60},
+    ]
+
+    summary = benchmark_image_pull.summarize(results)
+
+    assert summary["full"] == {"pull_seconds": 175, "start_seconds": 20, "ready_seconds": 195}
+    assert summary["soci"]["ready_seconds"] == 55
+    assert summary["speedup"] == 3.5
+    assert "3.5x faster" in benchmark_image_pull.format_summary(summary)
+    assert "speedup" not in benchmark_image_pull.summarize(results[:1])
@@ -0,0 +1,86 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "comfyui_aws_stack", "lambda", "admin_lambda"))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+import spot_drain  # noqa: E402
+
+TASK = {"taskArn": "arn:aws:ecs:us-east-1:123456789012:task/ComfyUICluster/0123"}
+COMFYUI_URL = f"http://10.0.0.1:{spot_drain.COMFYUI_PORT}"
+
+
+def entry(number, prompt_id):
+    return [number, prompt_id, {"3": {"class_type": "KSampler"}}, {"client_id": "c1"}, ["9"]]
+
+
+class FakeComfyUI:
+    def __init__(self, calls, queue):
+        self.calls = calls
+        self.queue = queue
+
+    def __call__(self, url, body=None):
+        path = url[len(COMFYUI_URL):]
+        self.calls.append(("comfyui", path, body))
+        if body is None:
+            return {"queue_running": [e for e in self.queue if e[1] == "running"],
+                    "queue_pending": [e for e in self.queue if e[1] != "running"]}
+        return None
+
+
+class FakeEcs:
+    def __init__(self, calls):
+        self.calls = calls
+
+    def update_container_instances_state(self, cluster, containerInstances, status):
+        self.calls.append(("ecs", status))
+
+
+@pytest.fixture
+def drain(monkeypatch):
+    calls = []
+    queue = [entry(1, "running"), entry(2, "p2"), entry(3, "p3")]
+    monkeypatch.setenv("ECS_CLUSTER_NAME", "ComfyUICluster")
+    monkeypatch.setattr(spot_drain, "_service_tasks", lambda instance_id: ("arn:container-instance", [TASK]))
+    monkeypatch.setattr(spot_drain, "task_private_ip", lambda task: "10.0.0.1")
+    monkeypatch.setattr(spot_drain, "_comfyui", FakeComfyUI(calls, queue))
+    monkeypatch.setattr(spot_drain, "client", lambda name: FakeEcs(calls))
+    monkeypatch.setattr(spot_drain, "enqueue", lambda prompt: calls.append(("enqueue", prompt["prompt_id"])))
+    monkeypatch.setattr(spot_drain, "get_cluster_state", lambda: {"running_count": 1})
+    monkeypatch.setattr(spot_drain, "route_to_admin", lambda: calls.append(("route_to_admin",)))
+    monkeypatch.setattr(spot_drain, "update_cluster_state", lambda **fields: None)
+
+    def run(detail_type):
+        spot_drain.handler({"detail-type": detail_type, "detail": {"instance-id": "i-0123"}}, None)
+        return calls
+
+    run.queue = queue
+    return run
+
+
+def test_interruption_saves_the_queue_before_draining(drain):
+    calls = drain(spot_drain.INTERRUPTION_WARNING)
+
+    assert calls.index(("ecs", "DRAINING")) > calls.index(("enqueue", "p3"))
+    assert [call[1] for call in calls if call[0] == "enqueue"] == ["running", "p2", "p3"]
+    assert calls[-2:] == [("comfyui", "/queue", {"clear": True}), ("comfyui", "/interrupt", {})]
+
+
+def test_prompts_submitted_while_draining_are_saved_once(drain, monkeypatch):
+    # A prompt reaches the task before it is deregistered
+    monkeypatch.setattr(spot_drain, "route_to_admin", lambda: drain.queue.append(entry(4, "p4")))
+
+    calls = drain(spot_drain.INTERRUPTION_WARNING)
+
+    assert [call[1] for call in calls if call[0] == "enqueue"] == ["running", "p2", "p3", "p4"]
+
+
+def test_rebalance_recommendation_keeps_the_running_prompt(drain):
+    calls = drain("EC2 Instance Rebalance Recommendation")
+
+    assert [call[1] for call in calls if call[0] == "enqueue"] == ["p2", "p3"]
+    assert calls[-1] == ("comfyui", "/queue", {"delete": ["p2", "p3"]})
+    assert ("ecs", "DRAINING") not in calls
+    assert not [call for call in calls if call[:2] == ("comfyui", "/interrupt")]
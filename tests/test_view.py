@@ -0,0 +1,98 @@
+import os
+import sys
+import urllib.parse
+
+import pytest
+from botocore.exceptions import ClientError
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "comfyui_aws_stack", "lambda", "admin_lambda"))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+import view  # noqa: E402
+
+BUCKET = "comfyui-outputs"
+PRESIGNED = "https://comfyui-outputs.s3.amazonaws.com/outputs/ComfyUI_00001_.png?X-Amz-Signature=abc"
+
+
+class FakeS3:
+    def __init__(self, keys=(), error_code="404"):
+        self.keys = set(keys)
+        self.error_code = error_code
+        self.presigned = []
+
+    def head_object(self, Bucket, Key):
+        if Key not in self.keys:
+            raise ClientError({"Error": {"Code": self.error_code, "Message": ""}}, "HeadObject")
+        return {}
+
+    def generate_presigned_url(self, method, Params, ExpiresIn):
+        self.presigned.append((method, Params, ExpiresIn))
+        return PRESIGNED
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    def install(**kwargs):
+        fake = FakeS3(**kwargs)
+        monkeypatch.setattr(view, "client", lambda name: fake)
+        return fake
+
+    monkeypatch.setenv("OUTPUT_BUCKET_NAME", BUCKET)
+    return install
+
+
+def request(**params):
+    # ALB passes the query string URL-encoded
+    return {"path": "/api/view", "queryStringParameters": {
+        key: urllib.parse.quote_plus(value) for key, value in params.items()}}
+
+
+def test_object_keys():
+    assert view.object_key({"filename": "a.png", "subfolder": "", "type": "output"}) == "outputs/a.png"
+    assert view.object_key({"filename": "a b.png", "subfolder": "run 1"}) == "outputs/run 1/a b.png"
+    assert view.object_key({"filename": "a.png", "preview": "webp;90"}) == "previews/a.png.webp"
+    assert view.object_key({"filename": "../../etc/passwd"}) is None
+    assert view.object_key({"filename": "/etc/passwd"}) is None
+    assert view.object_key({}) is None
+
+
+def test_offloaded_output_redirects_to_a_presigned_url(s3):
+    fake = s3(keys={"outputs/run 1/ComfyUI_00001_.png"})
+
+    response = view.handler(request(filename="ComfyUI_00001_.png", subfolder="run 1", type="output"), None)
+
+    assert response["statusCode"] == 302
+    assert response["headers"]["Location"] == PRESIGNED
+    assert fake.presigned == [("get_object", {"Bucket": BUCKET, "Key": "outputs/run 1/ComfyUI_00001_.png"},
+                               view.PRESIGNED_URL_SECONDS)]
+    # Cached redirects expire before the presigned URL
+    max_age = int(response["headers"]["Cache-Control"].split("=")[1])
+    assert max_age < view.PRESIGNED_URL_SECONDS
+
+
+def test_output_not_offloaded_yet_falls_back_to_comfyui(s3):
+    fake = s3(keys=set())
+
+    response = view.handler(request(filename="ComfyUI_00002_.png", subfolder="run 1", type="output"), None)
+
+    assert response["statusCode"] == 302
+    assert response["headers"]["Cache-Control"] == "no-store"
+    path, query = response["headers"]["Location"].split("?")
+    assert path == "/api/view"
+    assert urllib.parse.parse_qs(query) == {
+        "filename": ["ComfyUI_00002_.png"], "subfolder": ["run 1"], "type": ["output"], "local": ["1"]}
+    assert fake.presigned == []
+
+
+def test_other_s3_errors_are_raised(s3):
+    s3(error_code="AccessDenied")
+
+    with pytest.raises(ClientError):
+        view.handler(request(filename="ComfyUI_00001_.png", type="output"), None)
+
+
+def test_paths_leaving_the_output_directory_are_rejected(s3):
+    s3()
+
+    assert view.handler(request(filename="../models/checkpoints/model.safetensors", type="output"),
+                        None)["statusCode"] == 400